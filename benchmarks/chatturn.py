@@ -0,0 +1,128 @@
+# Measures the retrieval part of a knowledge-base chat turn (topic check plus search) the
+# way it used to run, embedding the history, the prompt and the merged query as text on
+# every turn, against the current pipeline, which embeds only the prompt, checks it against
+# a running centroid of the conversation and searches by that centroid. The LLM call is
+# left out: it is the same in both.
+#
+#   python benchmarks/chatturn.py --turns 40
+
+import argparse
+import sys
+import time
+
+import numpy as np
+
+sys.path.append("rag/")
+from utils.embeddingbackend import EMBEDDING_BACKEND, EMBEDDING_BACKENDS, ONNX_MODEL_PATH, load_embeddings
+from utils.numpyvectorstore import NUMPY_INDEX_PATH, VECTOR_STORE_CHROMA, VECTOR_STORE_NUMPY, NumpyVectorStore
+from utils.queryvectors import TOPIC_DECAY, TOPIC_THRESHOLD, TopicCentroid, cosine, search_by_vector
+
+CHROMA_PATH = "databases/chroma"
+MODEL_NAME = "all-MiniLM-L6-v2"
+CONTEXT_THRESHOLD = 0.7  # What the text pipeline used
+
+# Two topics, so the conversation has follow-ups and a topic change
+CONVERSATION = [
+    "What is a neural network?",
+    "How is it trained?",
+    "What does backpropagation compute?",
+    "Why do deep networks need so much data?",
+    "Explain the causes of the First World War",
+    "Which alliances were involved?",
+    "How did the war end?",
+    "What were the consequences of the treaty?",
+]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the retrieval part of a knowledge-base chat turn.")
+    parser.add_argument("--turns", type=int, default=40, help="Turns played, cycling through the scripted conversation")
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--threshold", type=float, default=TOPIC_THRESHOLD, help="Topic threshold of the centroid pipeline")
+    parser.add_argument("--decay", type=float, default=TOPIC_DECAY, help="Decay of the centroid pipeline")
+    parser.add_argument("--model", default=MODEL_NAME)
+    parser.add_argument("--embedding-backend", choices=EMBEDDING_BACKENDS, default=EMBEDDING_BACKEND)
+    parser.add_argument("--onnx-model-path", default=ONNX_MODEL_PATH)
+    parser.add_argument("--vector-store", choices=(VECTOR_STORE_CHROMA, VECTOR_STORE_NUMPY), default=VECTOR_STORE_CHROMA)
+    parser.add_argument("--chroma-path", default=CHROMA_PATH)
+    parser.add_argument("--numpy-index-path", default=NUMPY_INDEX_PATH)
+    return parser.parse_args(argv)
+
+
+class CountingEmbeddings:
+    """Counts the texts embedded through it."""
+
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+        self.calls = 0
+
+    def embed_query(self, text):
+        self.calls += 1
+        return self.embeddings.embed_query(text)
+
+    def embed_documents(self, texts):
+        self.calls += len(texts)
+        return self.embeddings.embed_documents(texts)
+
+
+def text_turn(store, embeddings, history, prompt, k):
+    """The previous pipeline: the history included the new prompt and everything was embedded as text."""
+    history = history + [prompt]
+    previous_text = "\n".join(history)
+    merged_query = previous_text + "\n" + prompt
+    similarity = cosine(embeddings.embed_query(previous_text), embeddings.embed_query(prompt))
+    if similarity <= CONTEXT_THRESHOLD:
+        merged_query, history = prompt, []
+    return store.similarity_search_with_relevance_scores(merged_query, k=k), history
+
+
+def centroid_turn(store, state, topic, prompt, k):
+    """The current pipeline, as in knowledgebase.render_knowledge_base_mode."""
+    embeddings, threshold = state
+    vector = np.asarray(embeddings.embed_query(prompt), dtype=np.float32)
+    if topic.is_new_topic(vector, threshold):
+        topic.reset()
+    topic.add(vector)
+    return search_by_vector(store, topic.query_vector(np.linalg.norm(vector)), k), topic
+
+
+def play(turn, store, state, conversation, config):
+    latencies = []
+    for index in range(config.turns):
+        started = time.perf_counter()
+        _, conversation = turn(store, state, conversation, CONVERSATION[index % len(CONVERSATION)], config.k)
+        latencies.append(time.perf_counter() - started)
+    return np.array(latencies) * 1000
+
+
+def main(argv=None):
+    config = parse_args(argv)
+    model = CountingEmbeddings(load_embeddings(config.embedding_backend, config.model, config.onnx_model_path))
+    if config.vector_store == VECTOR_STORE_NUMPY:
+        store = NumpyVectorStore(config.numpy_index_path, embedding_function=model)
+    else:
+        from langchain_chroma import Chroma
+        store = Chroma(persist_directory=config.chroma_path, embedding_function=model)
+    model.embed_query("warm up")
+    print(f"📏 {config.turns} turns on {config.vector_store}, k={config.k}")
+
+    rows = []
+    pipelines = (
+        ("text", text_turn, model, []),
+        ("centroid", centroid_turn, (model, config.threshold), TopicCentroid(config.decay)),
+    )
+    for name, turn, state, conversation in pipelines:
+        calls = model.calls
+        latencies = play(turn, store, state, conversation, config)
+        rows.append((name, latencies, (model.calls - calls) / config.turns))
+
+    print(f"{'pipeline':<9} {'p50 ms':>8} {'p95 ms':>8} {'mean ms':>8} {'embeds/turn':>12}")
+    for name, latencies, embeds in rows:
+        print(
+            f"{name:<9} {np.percentile(latencies, 50):>8.2f} {np.percentile(latencies, 95):>8.2f} "
+            f"{latencies.mean():>8.2f} {embeds:>12.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
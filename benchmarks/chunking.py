@@ -0,0 +1,217 @@
+# Compares chunking configurations (chunk size, overlap, separators, minimum length) on a
+# fixed sample of PDFs. Each configuration is split, embedded and written to a temporary
+# Chroma collection, then measured on chunk count, text and disk size, embedding time,
+# query latency and recall@k / MRR against a labelled question set.
+#
+#   python benchmarks/chunking.py --chunk-sizes 300 600 1000 --overlaps 0 90 180
+#   python benchmarks/chunking.py --input-folder databases/pdfbooksarticles --questions my-questions.json
+#
+# By default it runs on the small corpus and questions in benchmarks/fixtures/chunking. The
+# question file is a JSON list of {"question": "...", "source": "<pdf name without .pdf>",
+# "pages": [<1-based page>, ...]}; a question counts as found when one of the top-k chunks
+# comes from one of its pages. Every question's source must be among the sampled PDFs.
+
+import argparse
+import hashlib
+import itertools
+import json
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import chromadb
+import numpy as np
+
+sys.path.append("rag/")
+sys.path.append("population/")
+from utils.embeddingbackend import EMBEDDING_BACKENDS, ONNX_MODEL_PATH, load_embeddings
+from utils.pagecache import PageCache
+from utils.pdffiles import list_pdfs
+from pdfconversion import MODE_FAST, convert_pdf_cached, pages_to_documents
+from createvectordatabase import (
+    CHUNK_OVERLAP, CHUNK_SIZE, EMBEDDING_BACKEND, EMBEDDING_BATCH_SIZE, INPUT_FOLDER, MIN_CHUNK_LENGTH, MODEL_NAME,
+    SEPARATORS, split_text,
+)
+
+# Separator lists the grid can try, by name
+SEPARATOR_PRESETS = {
+    "sentence": SEPARATORS,  # What the ingestion uses
+    "paragraph": ["\n\n", "\n", ". ", " ", ""],
+    "default": None,  # RecursiveCharacterTextSplitter's own: paragraphs, lines, words, characters
+}
+SAMPLE_PDFS = 20  # PDFs in the sample, the first ones by name so every run sees the same files
+FIXTURE_FOLDER = Path("benchmarks/fixtures/chunking")  # Three short PDFs and questions labelled with their pages
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark chunking configurations for the ingestion.")
+    parser.add_argument("--input-folder", default=str(FIXTURE_FOLDER / "pdfs"), help=f"Folder with the PDFs to sample, e.g. {INPUT_FOLDER}")
+    parser.add_argument("--pdfs", type=int, default=SAMPLE_PDFS, help="PDFs in the sample")
+    parser.add_argument("--questions", default=str(FIXTURE_FOLDER / "questions.json"), help="Labelled question set (JSON) about the sampled PDFs")
+    parser.add_argument("--chunk-sizes", type=int, nargs="+", default=[CHUNK_SIZE])
+    parser.add_argument("--overlaps", type=int, nargs="+", default=[CHUNK_OVERLAP])
+    parser.add_argument("--separators", nargs="+", choices=list(SEPARATOR_PRESETS), default=["sentence"])
+    parser.add_argument("--min-lengths", type=int, nargs="+", default=[MIN_CHUNK_LENGTH])
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--model", default=MODEL_NAME)
+    parser.add_argument("--embedding-backend", choices=EMBEDDING_BACKENDS, default=EMBEDDING_BACKEND)
+    parser.add_argument("--onnx-model-path", default=ONNX_MODEL_PATH)
+    parser.add_argument("--batch-size", type=int, default=EMBEDDING_BATCH_SIZE)
+    parser.add_argument(
+        "--page-cache-path", default=None,
+        help="Page cache to reuse extracted pages from, e.g. the ingestion's; by default a fresh one inside the run's temporary folder",
+    )
+    parser.add_argument("--output", default=None, help="Also write the results to this JSON file")
+    return parser.parse_args(argv)
+
+
+def load_sample(config, page_cache_path):
+    """Extracted pages of the first config.pdfs PDFs, as LangChain Documents."""
+    pdf_files = list_pdfs(config.input_folder)[:config.pdfs]
+    cache = PageCache(page_cache_path)
+    documents = []
+    try:
+        for pdf_file in pdf_files:
+            sha256 = hashlib.sha256(pdf_file.read_bytes()).hexdigest()
+            documents.extend(pages_to_documents(convert_pdf_cached(pdf_file, cache, sha256, MODE_FAST)))
+    finally:
+        cache.close()
+    return pdf_files, documents
+
+
+def load_questions(config, pdf_files):
+    """
+    Return a list of (question, source, set of pages).
+    Raises:
+        ValueError: If the file has no questions or some are about PDFs outside the sample,
+            which would count as misses whatever the chunking
+    """
+    labelled = json.loads(Path(config.questions).read_text(encoding="utf-8"))
+    questions = [(item["question"], item["source"], set(item["pages"])) for item in labelled]
+    if not questions:
+        raise ValueError(f"{config.questions} has no questions")
+    missing = sorted({source for _, source, _ in questions} - {pdf_file.stem for pdf_file in pdf_files})
+    if missing:
+        raise ValueError(f"{config.questions} asks about PDFs that are not in the sample: {', '.join(missing)}")
+    return questions
+
+
+def configurations(config):
+    """Every combination of the grid, skipping overlaps that are not smaller than the chunk."""
+    for size, overlap, separators, min_length in itertools.product(
+        config.chunk_sizes, config.overlaps, config.separators, config.min_lengths
+    ):
+        if overlap < size:
+            yield {"chunk_size": size, "chunk_overlap": overlap, "separators": separators, "min_length": min_length}
+
+
+def folder_mb(path):
+    return sum(file.stat().st_size for file in Path(path).rglob("*") if file.is_file()) / 2**20
+
+
+def run_configuration(settings, documents, embeddings, questions, query_vectors, workdir, k):
+    """Split, embed and index the sample with one configuration, then run the questions."""
+    # split_text edits the chunks' metadata, so every configuration gets its own copies
+    copies = [document.model_copy(deep=True) for document in documents]
+    started = time.perf_counter()
+    chunks = split_text(
+        copies, settings["chunk_size"], settings["chunk_overlap"], settings["min_length"],
+        SEPARATOR_PRESETS[settings["separators"]],
+    )
+    split_seconds = time.perf_counter() - started
+
+    texts = [chunk.page_content for chunk in chunks]
+    started = time.perf_counter()
+    vectors = embeddings.embed_documents(texts)
+    embed_seconds = time.perf_counter() - started
+
+    path = workdir / f"chroma-{settings['chunk_size']}-{settings['chunk_overlap']}-{settings['separators']}-{settings['min_length']}"
+    client = chromadb.PersistentClient(path=str(path))
+    collection = client.create_collection("benchmark")
+    batch_size = client.get_max_batch_size()
+    metadatas = [{"source": chunk.metadata["source"], "page": chunk.metadata["page"]} for chunk in chunks]
+    for start in range(0, len(chunks), batch_size):
+        end = start + batch_size
+        collection.upsert(
+            ids=[str(i) for i in range(start, min(end, len(chunks)))],
+            embeddings=vectors[start:end], documents=texts[start:end], metadatas=metadatas[start:end],
+        )
+
+    latencies, ranks = [], []
+    for (_, source, pages), vector in zip(questions, query_vectors):
+        started = time.perf_counter()
+        result = collection.query(query_embeddings=[vector], n_results=k, include=["metadatas"])
+        latencies.append(time.perf_counter() - started)
+        hits = [rank for rank, metadata in enumerate(result["metadatas"][0], 1) if metadata["source"] == source and metadata["page"] in pages]
+        ranks.append(hits[0] if hits else None)
+
+    latencies_ms = np.array(latencies) * 1000
+    return dict(
+        settings,
+        chunks=len(chunks),
+        text_mb=sum(len(text.encode("utf-8")) for text in texts) / 2**20,
+        disk_mb=folder_mb(path),
+        split_seconds=split_seconds,
+        embed_seconds=embed_seconds,
+        query_ms_p50=float(np.percentile(latencies_ms, 50)),
+        query_ms_p95=float(np.percentile(latencies_ms, 95)),
+        recall=sum(rank is not None for rank in ranks) / len(ranks),
+        mrr=sum(1 / rank for rank in ranks if rank is not None) / len(ranks),
+    )
+
+
+def main(argv=None):
+    config = parse_args(argv)
+    workdir = Path(tempfile.mkdtemp(prefix="chunking-"))
+    results = []
+    try:
+        # Only a cache passed explicitly is shared; by default the run never writes outside its workdir
+        pdf_files, documents = load_sample(config, config.page_cache_path or workdir / "pagecache.sqlite3")
+        if not documents:
+            print(f"❌ No PDFs found in {config.input_folder}")
+            sys.exit(1)
+        try:
+            questions = load_questions(config, pdf_files)
+        except (OSError, ValueError) as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        print(f"📏 {len(pdf_files)} PDFs, {len(documents)} pages, {len(questions)} questions from {config.questions}, k={config.k}")
+
+        embeddings = load_embeddings(config.embedding_backend, config.model, config.onnx_model_path, batch_size=config.batch_size)
+        # Questions are embedded once: their vectors do not depend on the chunking
+        query_vectors = [embeddings.embed_query(question) for question, _, _ in questions]
+
+        for settings in configurations(config):
+            results.append(run_configuration(settings, documents, embeddings, questions, query_vectors, workdir, config.k))
+            result = results[-1]
+            print(f"✅ {result['chunk_size']}/{result['chunk_overlap']}/{result['separators']}/{result['min_length']}: {result['chunks']} chunks")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(
+        f"{'size':>5} {'overlap':>7} {'separators':<10} {'min':>4} {'chunks':>7} {'text MB':>8} {'disk MB':>8} "
+        f"{'embed s':>8} {'p50 ms':>7} {'p95 ms':>7} {f'recall@{config.k}':>9} {'MRR':>6}"
+    )
+    for result in results:
+        print(
+            f"{result['chunk_size']:>5} {result['chunk_overlap']:>7} {result['separators']:<10} {result['min_length']:>4} "
+            f"{result['chunks']:>7} {result['text_mb']:>8.2f} {result['disk_mb']:>8.1f} {result['embed_seconds']:>8.2f} "
+            f"{result['query_ms_p50']:>7.2f} {result['query_ms_p95']:>7.2f} {result['recall']:>9.3f} {result['mrr']:>6.3f}"
+        )
+
+    if config.output:
+        summary = {
+            "pdfs": [pdf_file.name for pdf_file in pdf_files],
+            "pages": len(documents),
+            "questions": config.questions,
+            "k": config.k,
+            "results": results,
+        }
+        with open(config.output, "w", encoding="utf-8") as file:
+            json.dump(summary, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
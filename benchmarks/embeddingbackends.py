@@ -0,0 +1,130 @@
+# Compares the embedding backends (PyTorch vs. exported ONNX) on startup time, memory,
+# single-query latency and batch throughput. Each backend runs in a fresh process so its
+# load time and peak memory are not skewed by the other one.
+#
+#   python benchmarks/embeddingbackends.py --backends torch onnx
+
+import argparse
+import json
+import multiprocessing
+import sys
+import time
+
+import numpy as np
+
+sys.path.append("rag/")
+sys.path.append("population/")
+from utils.embeddingbackend import EMBEDDING_BACKENDS, ONNX_MODEL_PATH, load_embeddings
+from exportonnxmodel import CHROMA_PATH, COLLECTION_NAME, MODEL_NAME, validation_texts
+
+QUERIES = [
+    "What is a neural network?",
+    "Explain the causes of the First World War",
+    "how does garbage collection work in python",
+    "summary of chapter 3",
+    "difference between TCP and UDP",
+]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the embedding backends.")
+    parser.add_argument("--backends", nargs="+", choices=EMBEDDING_BACKENDS, default=list(EMBEDDING_BACKENDS))
+    parser.add_argument("--model", default=MODEL_NAME)
+    parser.add_argument("--onnx-model-path", default=ONNX_MODEL_PATH)
+    parser.add_argument("--threads", type=int, default=None, help="Thread cap for both backends")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--samples", type=int, default=1024, help="Chunks from Chroma to embed in the throughput test")
+    parser.add_argument("--query-runs", type=int, default=200, help="Single-query calls in the latency test")
+    parser.add_argument("--chroma-path", default=CHROMA_PATH)
+    parser.add_argument("--collection", default=COLLECTION_NAME)
+    parser.add_argument("--output", default=None, help="Also write the results to this JSON file")
+    return parser.parse_args(argv)
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Not available on Windows
+        return None
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2**20
+
+
+def run_backend(backend, config, texts):
+    """Measure one backend; runs in its own process."""
+    if config.threads:
+        import torch
+        torch.set_num_threads(config.threads)
+
+    started = time.perf_counter()
+    model = load_embeddings(backend, config.model, config.onnx_model_path, config.threads, config.batch_size)
+    model.embed_query("warm up")
+    load_seconds = time.perf_counter() - started
+
+    latencies = []
+    for run in range(config.query_runs):
+        query = QUERIES[run % len(QUERIES)]
+        started = time.perf_counter()
+        model.embed_query(query)
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    vectors = model.embed_documents(texts)
+    batch_seconds = time.perf_counter() - started
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "backend": backend,
+        "load_seconds": load_seconds,
+        "query_ms_p50": float(np.percentile(latencies_ms, 50)),
+        "query_ms_p95": float(np.percentile(latencies_ms, 95)),
+        "texts_per_second": len(texts) / batch_seconds,
+        "peak_rss_mb": peak_rss_mb(),
+        "vectors": np.asarray(vectors, dtype=np.float32),
+    }
+
+
+def cosine_agreement(a, b):
+    cosine = (a * b).sum(axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+    return {"min_cosine": float(cosine.min()), "mean_cosine": float(cosine.mean())}
+
+
+def main(argv=None):
+    config = parse_args(argv)
+    texts = validation_texts(config)
+    # Repeat short sample lists so the throughput test has enough work
+    texts = (texts * (config.samples // len(texts) + 1))[:config.samples]
+    print(f"📏 {len(texts)} texts, batch size {config.batch_size}, {config.query_runs} single queries")
+
+    ctx = multiprocessing.get_context("spawn")
+    results = []
+    for backend in config.backends:
+        with ctx.Pool(1) as pool:
+            results.append(pool.apply(run_backend, (backend, config, texts)))
+
+    print(f"{'backend':<8} {'load s':>8} {'p50 ms':>8} {'p95 ms':>8} {'texts/s':>9} {'peak MB':>8}")
+    for result in results:
+        rss = f"{result['peak_rss_mb']:.0f}" if result["peak_rss_mb"] else "-"
+        print(
+            f"{result['backend']:<8} {result['load_seconds']:>8.2f} {result['query_ms_p50']:>8.2f} "
+            f"{result['query_ms_p95']:>8.2f} {result['texts_per_second']:>9.1f} {rss:>8}"
+        )
+
+    agreement = None
+    if len(results) == 2:
+        agreement = cosine_agreement(results[0]["vectors"], results[1]["vectors"])
+        print(f"🎯 Cosine agreement: min {agreement['min_cosine']:.4f}, mean {agreement['mean_cosine']:.4f}")
+
+    if config.output:
+        summary = {
+            "texts": len(texts),
+            "batch_size": config.batch_size,
+            "results": [{key: value for key, value in result.items() if key != "vectors"} for result in results],
+            "agreement": agreement,
+        }
+        with open(config.output, "w", encoding="utf-8") as file:
+            json.dump(summary, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+# Compares Chroma with the NumPy index (exact scan with float32, float16 and int8 search
+# copies, and IVF) on build time, disk size, bytes scanned per query, query latency and
+# recall@k against the exact float32 result. Vectors are copied from the existing
+# Chroma collection, or generated as clustered unit vectors when there is none.
+#
+#   python benchmarks/vectorstores.py --synthetic 200000
+
+import argparse
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import chromadb
+import numpy as np
+
+sys.path.append("rag/")
+from utils.numpyvectorstore import NPROBE, STORAGE_FLOAT32, STORAGES, NumpyVectorStore
+
+CHROMA_PATH = "databases/chroma"
+COLLECTION_NAME = "langchain"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Chroma against the NumPy vector index.")
+    parser.add_argument("--synthetic", type=int, default=0, help="Use this many synthetic vectors instead of the Chroma collection")
+    parser.add_argument("--dimensions", type=int, default=384, help="Dimensions of the synthetic vectors")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--nprobe", type=int, default=NPROBE)
+    parser.add_argument("--ivf-storage", choices=STORAGES, default=STORAGE_FLOAT32, help="Search copy used with IVF")
+    parser.add_argument("--chroma-path", default=CHROMA_PATH)
+    parser.add_argument("--collection", default=COLLECTION_NAME)
+    return parser.parse_args(argv)
+
+
+def load_vectors(config):
+    """Return (ids, vectors, documents, metadatas, queries)."""
+    rng = np.random.default_rng(0)
+    if not config.synthetic:
+        collection = chromadb.PersistentClient(path=config.chroma_path).get_collection(config.collection)
+        data = collection.get(include=["embeddings", "documents", "metadatas"])
+        vectors = np.asarray(data["embeddings"], dtype=np.float32)
+        # Queries: perturbed copies of stored chunks, like a question close to a passage
+        picks = rng.choice(len(vectors), config.queries)
+        queries = vectors[picks] + rng.normal(scale=0.05, size=(config.queries, vectors.shape[1])).astype(np.float32)
+        return data["ids"], vectors, data["documents"], data["metadatas"], queries
+
+    # Clustered unit vectors behave more like sentence embeddings than uniform noise
+    centers = rng.normal(size=(max(1, config.synthetic // 500), config.dimensions))
+    vectors = centers[rng.integers(len(centers), size=config.synthetic)] + rng.normal(scale=0.6, size=(config.synthetic, config.dimensions))
+    vectors = (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+    queries = vectors[rng.choice(len(vectors), config.queries)] + rng.normal(scale=0.05, size=(config.queries, config.dimensions))
+    ids = [f"chunk-{i}" for i in range(config.synthetic)]
+    metadatas = [{"source": f"book-{i % 100}", "page": i % 400} for i in range(config.synthetic)]
+    documents = [f"synthetic chunk {i}" for i in range(config.synthetic)]
+    return ids, vectors, documents, metadatas, queries.astype(np.float32)
+
+
+def folder_mb(path):
+    return sum(file.stat().st_size for file in Path(path).rglob("*") if file.is_file()) / 2**20
+
+
+def time_queries(search, queries):
+    latencies, results = [], []
+    for query in queries:
+        started = time.perf_counter()
+        results.append(search(query))
+        latencies.append(time.perf_counter() - started)
+    latencies_ms = np.array(latencies) * 1000
+    return results, float(np.percentile(latencies_ms, 50)), float(np.percentile(latencies_ms, 95))
+
+
+def recall(results, exact):
+    return float(np.mean([len(set(found) & set(truth)) / len(truth) for found, truth in zip(results, exact)]))
+
+
+def main(argv=None):
+    config = parse_args(argv)
+    ids, vectors, documents, metadatas, queries = load_vectors(config)
+    print(f"📏 {len(ids)} vectors x {vectors.shape[1]} dims, {len(queries)} queries, k={config.k}")
+    workdir = Path(tempfile.mkdtemp(prefix="vectorstores-"))
+    rows = []
+    try:
+        # Chroma
+        started = time.perf_counter()
+        client = chromadb.PersistentClient(path=str(workdir / "chroma"))
+        collection = client.create_collection("benchmark")
+        batch_size = client.get_max_batch_size()
+        for start in range(0, len(ids), batch_size):
+            end = start + batch_size
+            collection.upsert(ids=ids[start:end], embeddings=vectors[start:end], documents=documents[start:end], metadatas=metadatas[start:end])
+        chroma_build = time.perf_counter() - started
+        chroma_results, chroma_p50, chroma_p95 = time_queries(
+            lambda query: collection.query(query_embeddings=[query], n_results=config.k, include=["distances"])["ids"][0], queries
+        )
+
+        rows = [("chroma", chroma_build, folder_mb(workdir / "chroma"), None, chroma_p50, chroma_p95, chroma_results)]
+
+        # NumPy, exact scan over each kind of search copy
+        started = time.perf_counter()
+        store = NumpyVectorStore(workdir / "numpy", nprobe=config.nprobe)
+        for start in range(0, len(ids), 4096):
+            end = start + 4096
+            store.upsert(ids[start:end], vectors[start:end], documents[start:end], metadatas[start:end])
+        flat_build = time.perf_counter() - started
+        store.close()
+        for storage in STORAGES:
+            started = time.perf_counter()
+            store = NumpyVectorStore(workdir / "numpy", nprobe=config.nprobe, storage=storage)
+            build = flat_build + (time.perf_counter() - started if storage != STORAGE_FLOAT32 else 0)
+            search = lambda query: [document.id for document in store.similarity_search_by_vector(query, config.k)]
+            results, p50, p95 = time_queries(search, queries)
+            rows.append((f"numpy-{storage}", build, folder_mb(workdir / "numpy"), store.footprint()["scanned_mb"], p50, p95, results))
+            store.close()
+
+        # NumPy, IVF
+        started = time.perf_counter()
+        store = NumpyVectorStore(workdir / "numpy", nprobe=config.nprobe, storage=config.ivf_storage)
+        store.train_ivf()
+        build = flat_build + time.perf_counter() - started
+        search = lambda query: [document.id for document in store.similarity_search_by_vector(query, config.k)]
+        results, p50, p95 = time_queries(search, queries)
+        scanned = store.footprint()["scanned_mb"] * config.nprobe / len(store.centroids)
+        rows.append((f"ivf{config.nprobe}-{config.ivf_storage}", build, folder_mb(workdir / "numpy"), scanned, p50, p95, results))
+        store.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    # The exact float32 scan is the reference for recall
+    exact = rows[1][-1]
+    print(f"{'store':<16} {'build s':>8} {'disk MB':>8} {'scan MB':>8} {'p50 ms':>8} {'p95 ms':>8} {f'recall@{config.k}':>9}")
+    for name, build, disk, scanned, p50, p95, results in rows:
+        scanned = f"{scanned:.1f}" if scanned is not None else "-"
+        print(f"{name:<16} {build:>8.2f} {disk:>8.1f} {scanned:>8} {p50:>8.2f} {p95:>8.2f} {recall(results, exact):>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# Detects near-duplicate chunks (repeated headers, footers, copyright pages, reprinted
+# passages) with 64-bit SimHash fingerprints over word shingles. Fingerprints are split into
+# bands so only chunks sharing a band are compared (pigeonhole: two fingerprints within
+# `max_distance` bits of each other agree on at least one of max_distance + 1 bands).
+
+import hashlib
+import re
+
+import numpy as np
+
+SIMHASH_BITS = 64
+SHINGLE_SIZE = 3
+
+_WORD = re.compile(r"\w+")
+
+
+def simhash(text, shingle_size=SHINGLE_SIZE):
+    """64-bit SimHash of the text's lower-cased word shingles."""
+    words = _WORD.findall(text.lower())
+    if not words:
+        return 0
+    shingles = {" ".join(words[i:i + shingle_size]) for i in range(max(1, len(words) - shingle_size + 1))}
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big") for shingle in shingles],
+        dtype=">u8",
+    )
+    # One row of 64 bits per shingle; each fingerprint bit is the majority vote of its column
+    bits = np.unpackbits(hashes.view(np.uint8)).reshape(len(hashes), SIMHASH_BITS)
+    votes = bits.sum(axis=0) * 2 > len(hashes)
+    return int.from_bytes(np.packbits(votes).tobytes(), "big")
+
+
+class NearDuplicateIndex:
+    """Banded SimHash index answering "is there a known chunk within max_distance bits?"."""
+
+    def __init__(self, max_distance=3, fingerprints=()):
+        self.max_distance = max_distance
+        self.bands = max_distance + 1
+        self.band_bits = SIMHASH_BITS // self.bands
+        self.tables = [{} for _ in range(self.bands)]
+        for chunk_id, fingerprint in fingerprints:
+            self.add(chunk_id, fingerprint)
+
+    def _band_keys(self, fingerprint):
+        mask = (1 << self.band_bits) - 1
+        return [(fingerprint >> (band * self.band_bits)) & mask for band in range(self.bands)]
+
+    def add(self, chunk_id, fingerprint):
+        for table, key in zip(self.tables, self._band_keys(fingerprint)):
+            table.setdefault(key, []).append((chunk_id, fingerprint))
+
+    def find(self, chunk_id, fingerprint):
+        """Return the id of an indexed near-duplicate of a different chunk, or None."""
+        for table, key in zip(self.tables, self._band_keys(fingerprint)):
+            for other_id, other in table.get(key, ()):
+                if other_id != chunk_id and (fingerprint ^ other).bit_count() <= self.max_distance:
+                    return other_id
+        return None
+
+    def filter(self, chunks):
+        """
+        Drop chunks that nearly duplicate an indexed chunk (or an earlier chunk of the batch).
+        Args:
+            chunks (list[Document]): Chunks with their ids set
+        Returns:
+            tuple: (kept chunks, [(dropped chunk, id it duplicates)], [(id, fingerprint)] of kept chunks)
+        """
+        kept, dropped, fingerprints = [], [], []
+        for chunk in chunks:
+            fingerprint = simhash(chunk.page_content)
+            original = self.find(chunk.id, fingerprint)
+            if original is not None:
+                dropped.append((chunk, original))
+                continue
+            self.add(chunk.id, fingerprint)
+            kept.append(chunk)
+            fingerprints.append((chunk.id, fingerprint))
+        return kept, dropped, fingerprints
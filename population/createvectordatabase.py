@@ -5,123 +5,407 @@ from langchain.text_splitter import RecursiveCharacterTextSplitter
 # Import the Document schema used to define structured document objects in LangChain.
 from langchain.schema import Document
 
-# Import the Chroma vector store interface from LangChain's integration.
-from langchain_chroma import Chroma
-
-# Import HuggingFace embeddings wrapper to convert text into vector embeddings.
-from langchain_huggingface import HuggingFaceEmbeddings
+# Chroma client used to write precomputed vectors straight into the collection.
+import chromadb
 
 # Built-in Python modules for operating system interaction and file operations.
+import argparse
+import cProfile
+import hashlib
+import os
 import sys
+import time
 
 # Import Path for convenient file path handling (object-oriented interface).
 from pathlib import Path
 
-# PyMuPDF wrapper for LLMs (Apackage that allows extracting or formatting PDF data for use with LLMs).
-import pymupdf4llm
+# Per-page PDF conversion, optionally spread across a pool of worker processes.
+from pdfconversion import MODE_FAST, MODE_MARKDOWN, cache_report, extractor_id, iter_converted_pdfs, pages_to_documents
 
-# Progress bar utility for long-running loops with live terminal updates.
-import alive_progress
+# Embedding worker processes, each with its own model copy, for CPU-only hosts.
+from embeddingpool import EmbeddingWorkerPool
 
-import re
+# SQLite manifest of ingested PDFs (path, size, mtime, content hash, status, chunk ids).
+from ingestionmanifest import IngestionManifest
 
-#Creates a vector database with Chroma for querying its documents.
+# SimHash near-duplicate detection across the whole corpus.
+from chunkdedup import NearDuplicateIndex
 
-CHROMA_PATH = "databases/chroma"
-INPUT_FOLDER="databases/pdfbooksarticles"
-PROCESSED_FILES_ARCHIVE="processedfiles.txt"
-def main():
-    generate_data_store()
+# Per-stage timings, throughput and peak memory, written as a JSON report after each run.
+from ingestionreport import (
+    build_report, default_report_path, new_stats, print_stage_report, save_profile, timed, write_report
+)
 
+# Runs each ingestion stage in its own thread behind a bounded queue.
+from streaming import run_in_thread
 
-def generate_data_store():
-    documents = load_documents()
-    chunks = split_text(documents)
-    save_to_chroma(chunks)
+# Persistent embedding cache shared with the knowledge base app.
+sys.path.append("rag/")
+from utils.embeddingcache import CachedEmbeddings, EmbeddingCache, EMBEDDING_CACHE_PATH
 
-def remove_processed_files(pdf_files):
-    
-    archive_path = Path(PROCESSED_FILES_ARCHIVE)
+# PyTorch or int8-quantized ONNX embedding model (see population/exportonnxmodel.py).
+from utils.embeddingbackend import EMBEDDING_BACKENDS, BACKEND_TORCH, ONNX_MODEL_PATH, embedding_model_id, load_embeddings
 
-    if not archive_path.exists():
-        archive_path.write_text("", encoding="utf-8")  # create empty file
-        
-    with open(PROCESSED_FILES_ARCHIVE, "r", encoding="utf-8") as file:
-        processed_filenames = [line.strip().replace("\\", "/") for line in file]
+# In-process NumPy flat/IVF index, an alternative to Chroma.
+from utils.numpyvectorstore import (
+    NUMPY_INDEX_PATH, SERVING_PATH, STORAGE_FLOAT32, STORAGES, VECTOR_STORE_CHROMA, VECTOR_STORE_NUMPY, VECTOR_STORES,
+    NumpyVectorStore, current_generation,
+)
 
-    # Remove processed files
-    remaining_pdf_files = [f for f in pdf_files if f.as_posix() not in processed_filenames]
-    return remaining_pdf_files
-    
+# HNSW settings of the Chroma collection (see population/hnswmaintenance.py to tune and rebuild it).
+from hnswmaintenance import describe_hnsw, hnsw_configuration
 
-def add_processed_files(pdf_files):
-    with open(PROCESSED_FILES_ARCHIVE, "a", encoding="utf-8") as file:
-        for pdf in pdf_files:
-            file.write(f"{pdf}\n")  
-    
-def load_documents():
-    #Path(OUTPUT_FOLDER).mkdir(parents=True, exist_ok=True)
-    pdf_files = list(Path(INPUT_FOLDER).glob("*.pdf"))
-    
-    pdf_files=remove_processed_files(pdf_files)
-    
-    add_processed_files(pdf_files)
-    
-    total_files=len(pdf_files)
-    
-    if( total_files==0):
-        print("There are no new archives to process.")
-        sys.exit(0)
-
-    all_documents = []
-
-    with alive_progress.alive_bar(total_files, title="📄 Converting PDFs", bar="classic") as bar:
-        for file_path in pdf_files:
-            try:
-                # Extract per-page Markdown chunks with metadata
-                pages = pymupdf4llm.to_markdown(
-                    str(file_path),
-                    page_chunks=True,
-                    ignore_images=True,
-                    ignore_graphics=True,
-                    force_text=True,
-                )
+# One Chroma collection per source (or group of sources), searched in parallel.
+from utils.shardedvectorstore import SHARD_GROUPS_PATH, VECTOR_STORE_SHARDED, ShardedVectorStore
 
-                # Convert each page into a LangChain Document
-                for page in pages:
-                    content = page["text"]
-                    metadata = page["metadata"]
-                    metadata["file_path"] = str(file_path)  #For traceability
-                    metadata["source"] = f"{file_path.stem}"  # The name of the doucument
+# Extracted pages, shared with the app's book summaries, so no PDF is parsed twice.
+from utils.pagecache import PAGE_CACHE_PATH, PageCache
 
-                    doc = Document(page_content=content, metadata=metadata)
-                    all_documents.append(doc)
+# Generation counter the app watches to reopen its vector store after a run.
+from utils.indexgeneration import INDEX_GENERATION_PATH, bump_index_generation
 
-                bar()
+# Which files in the input folder are PDFs, the same test as watch mode and the app
+from utils.pdffiles import list_pdfs
 
-            except Exception as e:
-                print(f"\n⚠️ Failed to convert {file_path.name}: {str(e)}")
-                continue
+# BM25 keyword index over the same chunk ids, fused with vector search by the app.
+from utils.keywordindex import KEYWORD_INDEX_PATH, KeywordIndexWriter, current_keyword_index
 
-    print(f"\n✅ Processed {total_files} PDFs -> {len(all_documents)} pages as documents")
-    return all_documents
+# Continuous ingestion of new and changed PDFs.
+from watchmode import WATCH_DEBOUNCE, WATCH_INTERVAL, watch_library
 
+# Progress bar utility for long-running loops with live terminal updates.
+import alive_progress
 
+import re
+
+#Creates a vector database with Chroma for querying its documents.
 
-def split_text(documents: list[Document]) -> list[Document]:
+CHROMA_PATH = "databases/chroma"
+INPUT_FOLDER="databases/pdfbooksarticles"
+MANIFEST_PATH = "databases/ingestionmanifest.sqlite3"
+CONVERSION_WORKERS = os.cpu_count() or 1  # Worker processes converting PDFs in parallel
+CONVERSION_TIMEOUT = 600  # Seconds a single PDF may take before it is abandoned
+EXTRACTION_MODE = MODE_FAST  # MODE_FAST: raw text, Markdown only where tables/columns are detected
+MODEL_NAME = "all-MiniLM-L6-v2"
+EMBEDDING_BACKEND = BACKEND_TORCH  # "onnx" runs the exported int8 model from ONNX_MODEL_PATH instead
+COLLECTION_NAME = "langchain"  # langchain_chroma's default collection, read by knowledgebase.py
+VECTOR_STORE = VECTOR_STORE_CHROMA  # VECTOR_STORE_NUMPY writes to the NumPy index at NUMPY_INDEX_PATH instead; VECTOR_STORE_SHARDED to per-source collections
+IVF_LISTS = None  # IVF lists for the NumPy index; None uses the square root of the chunk count
+VECTOR_STORAGE = None  # NumPy index first-pass copy: "float16"/"int8" (re-scored exactly), None keeps the current one
+HNSW_M = None  # HNSW settings for a new Chroma collection; None keeps Chroma's defaults
+HNSW_EF_CONSTRUCTION = None
+HNSW_EF_SEARCH = None
+PUBLISH_INDEX = False  # Publish a read-only generation of the NumPy index for the app (VECTOR_STORE=serving)
+KEYWORD_INDEX = True  # Update the BM25 keyword index with the chunks every run adds and deletes
+EMBEDDING_BATCH_SIZE = 64  # Chunks sent to the embedding model at once (per embedding worker)
+EMBEDDING_WORKERS = 1  # Embedding processes; 1 embeds in the main process
+EMBEDDING_THREADS = None  # Threads per embedding worker; None shares the cores evenly
+UPSERT_BATCH_SIZE = 256  # Chunks written to Chroma per upsert call
+DEDUP_CHUNKS = False  # Drop chunks that nearly duplicate a chunk already in the index
+DEDUP_MAX_DISTANCE = 3  # Max differing SimHash bits (of 64) for two chunks to count as duplicates
+CHUNK_SIZE = 600
+CHUNK_OVERLAP = 180
+MIN_CHUNK_LENGTH = 50  # Shorter chunks are dropped
+SEPARATORS = [".", "!", "?"]  # Split first by sentence-ending punctuation, then fall back to characters
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Ingest the PDF library into the Chroma vector database.")
+    paths = parser.add_argument_group("paths")
+    paths.add_argument("--input-folder", default=INPUT_FOLDER, help="Folder with the PDFs to ingest")
+    paths.add_argument("--chroma-path", default=CHROMA_PATH, help="Chroma persist directory")
+    paths.add_argument("--collection", default=COLLECTION_NAME, help="Chroma collection name")
+    paths.add_argument("--vector-store", choices=VECTOR_STORES + (VECTOR_STORE_SHARDED,), default=VECTOR_STORE)
+    paths.add_argument("--shard-groups", default=SHARD_GROUPS_PATH, help="JSON file grouping sources into shared shards")
+    paths.add_argument("--numpy-index-path", default=NUMPY_INDEX_PATH, help="Directory of the NumPy index")
+    paths.add_argument("--serving-path", default=SERVING_PATH, help="Where --publish writes read-only index generations")
+    paths.add_argument("--manifest-path", default=MANIFEST_PATH, help="SQLite ingestion manifest")
+    paths.add_argument("--embedding-cache-path", default=EMBEDDING_CACHE_PATH, help="SQLite embedding cache")
+    paths.add_argument("--page-cache-path", default=PAGE_CACHE_PATH, help="SQLite cache of extracted PDF pages")
+    paths.add_argument("--index-generation-path", default=INDEX_GENERATION_PATH, help="File bumped after every run that changed the index")
+    paths.add_argument("--keyword-index-path", default=KEYWORD_INDEX_PATH, help="Directory of the BM25 keyword index")
+    paths.add_argument("--report", default=None, help="Where to write the JSON run report (default: timestamped file)")
+
+    model = parser.add_argument_group("model and chunking")
+    model.add_argument("--model", default=MODEL_NAME, help="HuggingFace embedding model")
+    model.add_argument("--embedding-backend", choices=EMBEDDING_BACKENDS, default=EMBEDDING_BACKEND)
+    model.add_argument("--onnx-model-path", default=ONNX_MODEL_PATH, help="Exported ONNX model used by the onnx backend")
+    model.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    model.add_argument("--chunk-overlap", type=int, default=CHUNK_OVERLAP)
+    model.add_argument("--min-chunk-length", type=int, default=MIN_CHUNK_LENGTH)
+    model.add_argument("--dedup", action="store_true", default=DEDUP_CHUNKS, help="Drop near-duplicate chunks")
+    model.add_argument("--dedup-max-distance", type=int, default=DEDUP_MAX_DISTANCE)
+
+    throughput = parser.add_argument_group("throughput")
+    throughput.add_argument("--workers", type=int, default=CONVERSION_WORKERS, help="PDF conversion processes")
+    throughput.add_argument("--timeout", type=float, default=CONVERSION_TIMEOUT, help="Seconds allowed per PDF (0: no limit)")
+    throughput.add_argument("--extraction-mode", choices=(MODE_FAST, MODE_MARKDOWN), default=EXTRACTION_MODE)
+    throughput.add_argument("--embedding-batch-size", type=int, default=EMBEDDING_BATCH_SIZE, help="Chunks per embedding call, per worker")
+    throughput.add_argument("--embedding-workers", type=int, default=EMBEDDING_WORKERS, help="Embedding processes, each with its own model copy")
+    throughput.add_argument("--embedding-threads", type=int, default=EMBEDDING_THREADS, help="Threads per embedding worker")
+    throughput.add_argument("--upsert-batch-size", type=int, default=UPSERT_BATCH_SIZE)
+    throughput.add_argument("--ivf", action="store_true", help="(Re)train the NumPy index's IVF lists when it has grown")
+    throughput.add_argument("--ivf-lists", type=int, default=IVF_LISTS)
+    throughput.add_argument("--vector-storage", choices=STORAGES, default=VECTOR_STORAGE, help="Compress the NumPy index's search copy")
+    throughput.add_argument("--hnsw-m", type=int, default=HNSW_M, help="HNSW neighbours per node, for a new Chroma collection")
+    throughput.add_argument("--hnsw-ef-construction", type=int, default=HNSW_EF_CONSTRUCTION, help="HNSW build candidate list, for a new Chroma collection")
+    throughput.add_argument("--hnsw-ef-search", type=int, default=HNSW_EF_SEARCH, help="HNSW search candidate list, for a new Chroma collection")
+    throughput.add_argument("--publish", action="store_true", default=PUBLISH_INDEX, help="Publish the NumPy index to the app's serving processes")
+    throughput.add_argument("--keyword-index", action=argparse.BooleanOptionalAction, default=KEYWORD_INDEX, help="Maintain the BM25 keyword index")
+
+    parser.add_argument("--profile", action="store_true", help="Run every stage under cProfile and save the profile next to the report")
+    watch = parser.add_argument_group("watch mode")
+    watch.add_argument("--watch", action="store_true", help="Keep running and ingest PDFs as they are added, changed or removed")
+    watch.add_argument("--watch-interval", type=float, default=WATCH_INTERVAL, help="Seconds between polls of the input folder")
+    watch.add_argument("--watch-debounce", type=float, default=WATCH_DEBOUNCE, help="Seconds the folder must be quiet before a run")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    config = parse_args(argv)
+    if config.watch:
+        watch_library(config, generate_data_store, config.watch_interval, config.watch_debounce)
+    else:
+        generate_data_store(config)
+
+
+def generate_data_store(config):
+    started = time.perf_counter()
+    profiles = [] if config.profile else None
+    if profiles is not None:
+        profiles.append(cProfile.Profile())
+        profiles[0].enable()
+
+    stats = new_stats()
+    cache_stats = None
+    manifest = IngestionManifest(config.manifest_path)
+    collection, max_batch_size = open_collection(config)
+    keyword_writer = KeywordIndexWriter(config.keyword_index_path) if config.keyword_index else None
+    try:
+        states = plan_ingestion(config, manifest, collection, max_batch_size, stats, keyword_writer)
+        if not states:
+            print("There are no new archives to process.")
+            maintain_numpy_index(config, collection, stats)
+            # Nothing added: only publish if chunks were removed or there is nothing to serve yet
+            changed = bool(stats["removed_chunks"])
+            if stats["removed_chunks"] or current_generation(config.serving_path) is None:
+                changed |= publish_numpy_index(config, collection)
+            # A no-op unless chunks were removed or the keyword index is missing or behind
+            changed |= update_chunk_keyword_index(collection, keyword_writer)
+            # Running apps reopen their indexes, including ones built here for the first time
+            if changed:
+                announce_index_change(config, stats)
+            return
+
+        # Unchanged chunk texts (e.g. after re-chunking or rebuilding Chroma) come from the cache
+        embedding_cache = EmbeddingCache(config.embedding_cache_path)
+        model = create_embedding_model(config)
+        embeddings = CachedEmbeddings(
+            model, embedding_model_id(config.embedding_backend, config.model, config.onnx_model_path), embedding_cache
+        )
+        stats["files"] = len(states)
+
+        # Fingerprints of everything already indexed, so duplicates are caught across runs
+        dedup_index = NearDuplicateIndex(config.dedup_max_distance, manifest.fingerprints()) if config.dedup else None
+
+        # convert -> split -> embed -> upsert, each stage streaming into the next through a
+        # bounded queue, so memory use does not grow with the size of the backlog and chunks
+        # become searchable as soon as their batch is written
+        documents = run_in_thread(load_documents(config, states, stats, manifest), profiles=profiles)
+        chunks = run_in_thread(split_documents(config, documents, stats, manifest, collection, dedup_index, keyword_writer), profiles=profiles)
+        # Every embedding worker gets a full batch per call
+        batch_size = config.embedding_batch_size * config.embedding_workers
+        batches = run_in_thread(embed_chunks(chunks, embeddings, batch_size, stats), profiles=profiles)
+        try:
+            save_to_chroma(config, batches, collection, max_batch_size, manifest, stats, keyword_writer)
+        finally:
+            if isinstance(model, EmbeddingWorkerPool):
+                model.close()
+        maintain_numpy_index(config, collection, stats)
+        publish_numpy_index(config, collection)
+        update_chunk_keyword_index(collection, keyword_writer)
+        announce_index_change(config, stats)
+
+        print(f"\n✅ Processed {stats['files'] - stats['failed']}/{stats['files']} PDFs -> {stats['pages']} pages -> {stats['chunks']} chunks")
+        print_extraction_report(stats)
+        if dedup_index is not None:
+            print_dedup_report(stats)
+        if stats["resumed_chunks"]:
+            print(f"⏩ Resumed {stats['resumed_chunks']} chunks already saved by an interrupted run")
+
+        cache_stats = embedding_cache.stats()
+        print(
+            f"🗃️ Embedding cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+            f"({cache_stats['hit_rate']:.0%} hit rate), {cache_stats['evictions']} evicted, {cache_stats['entries']} entries"
+        )
+        embedding_cache.close()
+    finally:
+        manifest.close()
+        if isinstance(collection, (NumpyVectorStore, ShardedVectorStore)):
+            collection.close()
+
+        if profiles is not None:
+            profiles[0].disable()
+        report = build_report(config, stats, time.perf_counter() - started, cache_stats)
+        report_path = write_report(report, config.report or default_report_path())
+        print_stage_report(report)
+        print(f"📊 Report written to {report_path}")
+        if profiles is not None:
+            print(f"🔬 Profile written to {save_profile(profiles, report_path)}")
+
+
+def create_embedding_model(config):
+    """A single in-process model, or a pool of worker processes with one model copy each."""
+    if config.embedding_workers > 1:
+        return EmbeddingWorkerPool(
+            config.model, config.embedding_workers, config.embedding_threads, config.embedding_batch_size,
+            config.embedding_backend, config.onnx_model_path,
+        )
+    return load_embeddings(
+        config.embedding_backend, config.model, config.onnx_model_path, config.embedding_threads, config.embedding_batch_size
+    )
+
+
+def plan_ingestion(config, manifest, collection, max_batch_size, stats, keyword_writer=None):
+    """
+    Work out which PDFs need ingesting and remove chunks that no longer belong in the index;
+    keyword_writer, if given, is told which.
+    Returns:
+        list[FileState]: New, changed or resumed PDFs, recorded as pending in the manifest
+    """
+    plan = manifest.scan(list_pdfs(config.input_folder))
+    print(
+        f"🔎 {len(plan.new)} new, {len(plan.changed)} changed, {len(plan.resumed)} resumed, "
+        f"{len(plan.deleted)} deleted, {plan.unchanged} unchanged PDFs"
+    )
+
+    # Chunks of changed or deleted files
+    for path, stale_ids in plan.stale_ids.items():
+        target = source_collection(collection, Path(path).stem)
+        for start in range(0, len(stale_ids) if target is not None else 0, max_batch_size):
+            target.delete(ids=stale_ids[start:start + max_batch_size])
+        if keyword_writer is not None:
+            keyword_writer.delete(stale_ids)
+
+    # Files unknown to the manifest may still have chunks from before it existed
+    for state in plan.new:
+        target = source_collection(collection, state.path.stem)
+        leftover_ids = target.get(where={"file_path": str(state.path)}, include=[])["ids"] if target is not None else []
+        if leftover_ids:
+            target.delete(where={"file_path": str(state.path)})
+            if keyword_writer is not None:
+                keyword_writer.delete(leftover_ids)
+
+    removed_chunks = sum(len(stale_ids) for stale_ids in plan.stale_ids.values())
+    if removed_chunks:
+        stats["removed_chunks"] = removed_chunks
+        print(f"🧹 Removed {removed_chunks} stale chunks")
+    manifest.forget(plan.deleted)
+
+    for state in plan.new + plan.changed:
+        manifest.begin(state)
+    return plan.new + plan.changed + plan.resumed
+
+
+def source_collection(collection, source):
+    """
+    Where a source's chunks are stored: with the sharded store only its own shard (None if it
+    has none yet), so deleting or looking up one file's chunks opens a single collection.
+    """
+    if isinstance(collection, ShardedVectorStore):
+        return collection.shard_of(source)
+    return collection
+
+
+def load_documents(config, states, stats, manifest):
+    """
+    Yield (FileState, page Documents) for each PDF as soon as its conversion finishes.
+    PDFs already in the page cache (converted by an earlier run, or by the app) come first.
+    """
+    by_path = {state.path: state for state in states}
+    stage = stats["stages"]["convert"]
+    page_cache = PageCache(config.page_cache_path)
+    extractor = extractor_id(config.extraction_mode)
+    try:
+        to_convert = []
+        for state in states:
+            with timed(stage):
+                cached = page_cache.get(state.sha256, extractor, state.path)
+                if cached is None:
+                    to_convert.append(state.path)
+                    continue
+                documents = pages_to_documents(cached[0])
+                stats["pages"] += len(documents)
+                stats["cached_pages"] += len(documents)
+                stage["items"] += len(documents)
+            yield state, documents
+
+        converted = iter_converted_pdfs(to_convert, config.workers, config.timeout or None, config.extraction_mode)
+        while True:
+            # Busy time is time spent waiting on the workers, not time blocked on the next stage
+            with timed(stage):
+                result = next(converted, None)
+                if result is None:
+                    return
+                file_path, pages, report, error = result
+                if error is not None:
+                    print(f"\n⚠️ Failed to convert {file_path.name}: {error}")
+                    stats["failed"] += 1
+                    manifest.mark_failed(file_path, error)
+                    continue
+
+                for page, path, seconds in report["timings"]:
+                    stats[f"{path}_pages"] += 1
+                    stats[f"{path}_seconds"] += seconds
+                    if stats["slowest_page"] is None or seconds > stats["slowest_page"][0]:
+                        stats["slowest_page"] = (seconds, file_path.name, page)
+                page_cache.put(by_path[file_path].sha256, extractor, pages, cache_report(report))
+
+                # Convert each page into a LangChain Document
+                documents = pages_to_documents(pages)
+                stats["pages"] += len(documents)
+                stage["items"] += len(documents)
+            yield by_path[file_path], documents
+    finally:
+        page_cache.close()
+
+
+def print_extraction_report(stats):
+    """Show how many pages took the plain-text and the Markdown path, and what they cost."""
+    if stats["cached_pages"]:
+        print(f"🗂️ Page cache: {stats['cached_pages']} pages extracted earlier were reused")
+    for path, label in (("text", "⚡ Plain text"), ("markdown", "📐 Markdown")):
+        pages = stats[f"{path}_pages"]
+        if pages:
+            print(f"{label}: {pages} pages, {stats[f'{path}_seconds']:.1f}s total, {1000 * stats[f'{path}_seconds'] / pages:.1f} ms/page")
+    if stats["slowest_page"]:
+        seconds, name, page = stats["slowest_page"]
+        print(f"🐢 Slowest page: {name} p.{page} ({seconds:.2f}s)")
+
+
+def print_dedup_report(stats):
+    """Show how many near-duplicate chunks were dropped and roughly how much index they saved."""
+    vector_bytes = stats["duplicate_chunks"] * stats["dimensions"] * 4
+    print(
+        f"🧬 Dropped {stats['duplicate_chunks']} near-duplicate chunks, saving "
+        f"{stats['duplicate_bytes'] / 1024:.1f} KB of text and ~{vector_bytes / 1024:.1f} KB of float32 vectors"
+    )
+
+
+def split_text(documents: list[Document], chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, min_length=MIN_CHUNK_LENGTH,
+               separators=SEPARATORS) -> list[Document]:
     text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=600,
-        chunk_overlap=180,
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
         length_function=len,
         add_start_index=True,
-        # Try to split first by sentence-ending punctuation, then fallback to spaces, then characters
-        separators=[".","!", "?"]
+        # None uses the splitter's own defaults (paragraphs, lines, words, characters)
+        separators=separators
     )
 
     chunks = text_splitter.split_documents(documents)
     
     # Filter out short chunks
-    min_length = 50  
     filtered_chunks = [chunk for chunk in chunks if len(chunk.page_content.strip()) >= min_length]
 
     for i, chunk in enumerate(filtered_chunks):
@@ -135,37 +419,242 @@ def split_text(documents: list[Document]) -> list[Document]:
         if "file_path" not in chunk.metadata:
             chunk.metadata["file_path"] = "unknown"
 
-    print(f"✅ Split {len(documents)} pages into {len(filtered_chunks)} text chunks.")
     return filtered_chunks
 
 
-def save_to_chroma(chunks: list[Document]):
-    
-    # Initialize Chroma
-    
-    embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-    
-    # Track embedding generation 
-    print("🔧 Generating embeddings...")
-    with alive_progress.alive_bar(len(chunks), title="Embedding chunks", bar="smooth", spinner="dots_waves") as bar:
-        # Wrap embedding generation in progress bar
-        embeddings_with_progress = []
-        for chunk in chunks:
-            embedding = embeddings.embed_documents([chunk.page_content])[0]
-            embeddings_with_progress.append(embedding)
-            bar()
-            
-            
-    print("💾 Saving to Chroma...")
-    with alive_progress.alive_bar(1, title="Persisting database", spinner="dots") as bar:
-        db = Chroma.from_documents(
-            documents=chunks,
-            embedding=embeddings, 
-            persist_directory=CHROMA_PATH
-        )
-        bar()
+def chunk_id(file_sha256, chunk: Document) -> str:
+    """Stable id: the same span of the same file content always gets the same id."""
+    # The path is part of the id too, so identical copies of a PDF never share chunk ids
+    path_hash = hashlib.sha256(Path(chunk.metadata["file_path"]).as_posix().encode("utf-8")).hexdigest()
+    return f"{file_sha256[:16]}-{path_hash[:8]}-{chunk.metadata.get('page', 0)}-{chunk.metadata['start_index']}"
+
+
+def split_documents(config, documents, stats, manifest, collection, dedup_index=None, keyword_writer=None):
+    """Split each PDF's pages into chunks, one PDF at a time, skipping chunks already saved."""
+    stage = stats["stages"]["split"]
+    for state, file_documents in documents:
+        with timed(stage):
+            chunks = split_text(file_documents, config.chunk_size, config.chunk_overlap, config.min_chunk_length)
+            for chunk in chunks:
+                chunk.id = chunk_id(state.sha256, chunk)
+
+            if dedup_index is not None:
+                chunks, duplicates, fingerprints = dedup_index.filter(chunks)
+                manifest.record_dedup(state.path, fingerprints, [(chunk.id, original) for chunk, original in duplicates])
+                stats["duplicate_chunks"] += len(duplicates)
+                stats["duplicate_bytes"] += sum(len(chunk.page_content.encode("utf-8")) for chunk, _ in duplicates)
+
+            ids = [chunk.id for chunk in chunks]
+            stats["chunks"] += len(chunks)
+            stage["items"] += len(chunks)
+
+            # Recorded before anything is written, so an interrupted file can be resumed
+            previous_ids = manifest.set_chunks(state.path, ids)
+
+            # Chunks left over from an earlier layout of this file are no longer produced
+            target = source_collection(collection, state.path.stem)
+            obsolete_ids = list(set(previous_ids) - set(ids))
+            if obsolete_ids and target is not None:
+                target.delete(ids=obsolete_ids)
+                if keyword_writer is not None:
+                    keyword_writer.delete(obsolete_ids)
+
+            # Checkpoint: chunks an interrupted run already persisted are not embedded again
+            saved_ids = set(target.get(ids=ids, include=[])["ids"]) if ids and target is not None else set()
+            if saved_ids:
+                manifest.chunks_saved([chunk for chunk in chunks if chunk.id in saved_ids])
+                stats["resumed_chunks"] += len(saved_ids)
+                # The interrupted run stopped before updating the keyword index
+                if keyword_writer is not None:
+                    keyword_writer.add(keyword_entries(chunk for chunk in chunks if chunk.id in saved_ids))
+                chunks = [chunk for chunk in chunks if chunk.id not in saved_ids]
+
+        if chunks:
+            yield chunks
+
+
+def embed_chunks(chunks, embeddings, batch_size, stats):
+    """Embed every chunk exactly once, yielding (chunks, vectors) batch by batch."""
+    stage = stats["stages"]["embed"]
+
+    def embed(batch):
+        with timed(stage):
+            vectors = embeddings.embed_documents([chunk.page_content for chunk in batch])
+        stage["items"] += len(batch)
+        return batch, vectors
+
+    pending = []
+    for file_chunks in chunks:
+        pending.extend(file_chunks)
+        while len(pending) >= batch_size:
+            batch, pending = pending[:batch_size], pending[batch_size:]
+            yield embed(batch)
+    if pending:
+        yield embed(pending)
+
+
+def open_collection(config):
+    """
+    Open (or create) the Chroma collection and return it with Chroma's maximum batch size.
+    The NumPy index offers the same upsert/get/delete calls and has no batch limit of its own.
+    """
+    if config.vector_store == VECTOR_STORE_NUMPY:
+        return NumpyVectorStore(config.numpy_index_path, storage=config.vector_storage), sys.maxsize
+    if config.vector_store == VECTOR_STORE_SHARDED:
+        store = ShardedVectorStore(config.chroma_path, groups_path=config.shard_groups)
+        return store, store.max_batch_size()
+    client = chromadb.PersistentClient(path=config.chroma_path)
+    # The HNSW settings only apply when the collection is created; hnswmaintenance.py rebuilds an existing one
+    collection = client.get_or_create_collection(
+        config.collection,
+        configuration=hnsw_configuration(config.hnsw_m, config.hnsw_ef_construction, config.hnsw_ef_search),
+    )
+    print(f"🧭 HNSW: {describe_hnsw(collection)}")
+    return collection, client.get_max_batch_size()
+
+
+def maintain_numpy_index(config, collection, stats):
+    """
+    Train the NumPy index's IVF lists if requested and missing or outgrown, and report what
+    the approximate search (IVF lists, compressed storage) saves and costs in recall.
+    """
+    if not isinstance(collection, NumpyVectorStore):
+        return
+    if config.ivf and collection.ivf_needs_training():
+        started = time.perf_counter()
+        collection.train_ivf(config.ivf_lists)
+        print(f"🧭 Trained {len(collection.centroids)} IVF lists over {collection.count()} chunks in {time.perf_counter() - started:.1f}s")
+
+    if collection.storage == STORAGE_FLOAT32 and collection.centroids is None:
+        return
+    footprint = collection.footprint()
+    recall = collection.measure_recall()
+    stats["vector_index"] = {
+        **footprint,
+        "ivf_lists": None if collection.centroids is None else len(collection.centroids),
+        "recall_at_3": recall,
+    }
+    print(
+        f"🗜️ {footprint['storage']} search copy: {footprint['scanned_mb']:.1f} MB scanned instead of "
+        f"{footprint['full_precision_mb']:.1f} MB; recall@3 against an exact scan: {recall:.3f}"
+    )
+
+
+def publish_numpy_index(config, collection):
+    """
+    Publish the NumPy index as a new read-only generation; the app's serving processes
+    switch to it on their next query, without a restart.
+    Returns:
+        bool: Whether a generation was published
+    """
+    if not config.publish or not isinstance(collection, NumpyVectorStore):
+        return False
+    started = time.perf_counter()
+    generation = collection.publish(config.serving_path)
+    print(f"📤 Published {collection.count()} chunks as generation {generation.name} in {time.perf_counter() - started:.1f}s")
+    return True
+
+
+def iter_indexed_chunks(collection, page_size=5000):
+    """
+    Every (id, document, metadata) in the vector store. The ids are listed first and then
+    read a page of ids at a time, so chunks written or deleted meanwhile cannot shift pages.
+    """
+    parts = [collection]
+    if isinstance(collection, ShardedVectorStore):
+        collection.count()  # Refreshes the list of shards
+        parts = list(collection.shards.values())
+    for part in parts:
+        ids = sorted(part.get(include=[])["ids"])
+        for start in range(0, len(ids), page_size):
+            page = part.get(ids=ids[start:start + page_size], include=["documents", "metadatas"])
+            yield from zip(page["ids"], page["documents"], page["metadatas"])
+
+
+def keyword_entries(chunks):
+    """Chunks as the (id, text, metadata) triples the keyword index takes."""
+    return [(chunk.id, chunk.page_content, chunk.metadata) for chunk in chunks]
+
+
+def update_chunk_keyword_index(collection, keyword_writer):
+    """
+    Publish the chunks this run added to and deleted from the vector store as a new
+    generation of the BM25 keyword index, which the app opens with the next index
+    generation. The index is rebuilt from the vector store if it is missing or behind.
+    Returns:
+        bool: Whether a generation was published
+    """
+    if keyword_writer is None:
+        return False
+    started = time.perf_counter()
+    path = keyword_writer.commit(collection.count(), lambda: iter_indexed_chunks(collection))
+    if path is None:
+        return False
+    index = current_keyword_index(keyword_writer.root)
+    if keyword_writer.rebuilt:
+        change = "rebuilt"
+    else:
+        change = f"+{keyword_writer.chunks_added} -{keyword_writer.chunks_deleted} chunks"
+        if keyword_writer.segments_merged:
+            change += f", {keyword_writer.segments_merged} segments merged"
+    print(
+        f"🔤 Keyword index: {len(index)} chunks in {len(index.segments)} segments, {change} "
+        f"in {time.perf_counter() - started:.1f}s ({path.name})"
+    )
+    return True
+
+
+def announce_index_change(config, stats):
+    """Bump the index generation, so running apps reopen their vector store and see the changes."""
+    generation = bump_index_generation(
+        config.index_generation_path, chunks=stats["chunks"], removed_chunks=stats["removed_chunks"]
+    )
+    print(f"📣 Index generation {generation}")
+
+
+def upsert_chunks(collection, chunks: list[Document], vectors):
+    """Write chunks with their precomputed vectors into the Chroma collection."""
+    collection.upsert(
+        ids=[chunk.id for chunk in chunks],
+        embeddings=vectors,
+        documents=[chunk.page_content for chunk in chunks],
+        metadatas=[chunk.metadata for chunk in chunks],
+    )
+
+
+def save_to_chroma(config, batches, collection, max_batch_size, manifest, stats, keyword_writer=None):
+    """Persist embedded batches, grouped into bounded-size upserts."""
+    # Chroma rejects calls above its own maximum batch size
+    batch_size = min(config.upsert_batch_size, max_batch_size)
+    stage = stats["stages"]["upsert"]
+
+    pending_chunks, pending_vectors = [], []
+    saved = 0
+
+    def flush(count):
+        with timed(stage):
+            upsert_chunks(collection, pending_chunks[:count], pending_vectors[:count])
+            # A file only counts as done once every one of its chunks is persisted
+            manifest.chunks_saved(pending_chunks[:count])
+            if keyword_writer is not None:
+                keyword_writer.add(keyword_entries(pending_chunks[:count]))
+        stage["items"] += count
+        del pending_chunks[:count], pending_vectors[:count]
+        bar(count)
+        return count
+
+    print(f"🔧 Generating embeddings and saving to {config.vector_store}...")
+    with alive_progress.alive_bar(title="💾 Chunks saved", bar="smooth", spinner="dots_waves") as bar:
+        for chunks, vectors in batches:
+            stats["dimensions"] = len(vectors[0])
+            pending_chunks.extend(chunks)
+            pending_vectors.extend(vectors)
+            while len(pending_chunks) >= batch_size:
+                saved += flush(batch_size)
+        if pending_chunks:
+            saved += flush(len(pending_chunks))
         
-    print(f"✅ Saved {len(chunks)} chunks using HuggingFace embeddings")
+    print(f"✅ Saved {saved} chunks using {config.embedding_backend} embeddings")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
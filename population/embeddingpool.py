@@ -0,0 +1,75 @@
+# A pool of embedding worker processes for CPU-only ingestion hosts. Each worker loads its
+# own copy of the model and is capped to a few threads, so throughput grows with the number
+# of cores instead of being bound by one process.
+
+import math
+import multiprocessing
+import os
+import sys
+
+# LangChain's embeddings interface, so the pool can stand in for HuggingFaceEmbeddings.
+from langchain_core.embeddings import Embeddings
+
+# The torch / onnx embedding backends, also used by the knowledge base app.
+sys.path.append("rag/")
+from utils.embeddingbackend import BACKEND_TORCH, ONNX_MODEL_PATH, load_embeddings
+
+_model = None  # The worker process' own model copy
+
+
+def _init_worker(backend, model_name, onnx_path, threads, batch_size):
+    # Thread caps must be in place before torch is imported in the worker
+    for variable in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[variable] = str(threads)
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+
+    if backend == BACKEND_TORCH:
+        import torch
+        torch.set_num_threads(threads)
+
+    global _model
+    _model = load_embeddings(backend, model_name, onnx_path, threads, batch_size)
+
+
+def _embed_documents(texts):
+    return _model.embed_documents(texts)
+
+
+def _embed_query(text):
+    return _model.embed_query(text)
+
+
+class EmbeddingWorkerPool(Embeddings):
+    """
+    Embeddings backed by `workers` processes, each holding its own copy of the model.
+    A call to embed_documents is split into contiguous shards, one per worker, and the
+    vectors come back in the order of the input texts.
+    Args:
+        model_name (str): HuggingFace model name or local model directory
+        workers (int): Number of worker processes
+        threads (int | None): Threads per worker; defaults to an even share of the cores
+        batch_size (int): Encoding batch size inside each worker
+        backend (str): "torch" or "onnx", see utils.embeddingbackend
+        onnx_path (str): Exported model directory for the onnx backend
+    """
+
+    def __init__(self, model_name, workers, threads=None, batch_size=64, backend=BACKEND_TORCH, onnx_path=ONNX_MODEL_PATH):
+        self.workers = workers
+        self.threads = threads or max(1, (os.cpu_count() or 1) // workers)
+        # spawn: forking a process that already initialised torch's thread pools can hang
+        ctx = multiprocessing.get_context("spawn")
+        self.pool = ctx.Pool(workers, initializer=_init_worker, initargs=(backend, model_name, onnx_path, self.threads, batch_size))
+
+    def embed_documents(self, texts):
+        if not texts:
+            return []
+        shard_size = math.ceil(len(texts) / self.workers)
+        shards = [texts[start:start + shard_size] for start in range(0, len(texts), shard_size)]
+        return [vector for shard in self.pool.map(_embed_documents, shards) for vector in shard]
+
+    def embed_query(self, text):
+        return self.pool.apply(_embed_query, (text,))
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
@@ -0,0 +1,182 @@
+# Exports the sentence-transformers embedding model to ONNX, quantizes its weights to int8
+# and checks the quantized vectors against the PyTorch ones before putting the model in
+# place for the "onnx" embedding backend (rag/utils/embeddingbackend.py).
+
+# Built-in Python modules for command-line parsing and file operations.
+import argparse
+import json
+import shutil
+import sys
+import tempfile
+
+# Import Path for convenient file path handling (object-oriented interface).
+from pathlib import Path
+
+import numpy as np
+
+# Output layout and runtime of the onnx backend.
+sys.path.append("rag/")
+from utils.embeddingbackend import ONNX_CONFIG_FILE, ONNX_MODEL_FILE, ONNX_MODEL_PATH, ONNX_TOKENIZER_FILE, OnnxEmbeddings
+
+CHROMA_PATH = "databases/chroma"
+COLLECTION_NAME = "langchain"
+MODEL_NAME = "all-MiniLM-L6-v2"
+MIN_COSINE = 0.99  # Every validation text must embed this close to its PyTorch vector
+VALIDATION_SAMPLES = 512  # Chunks taken from the Chroma collection to validate on
+OPSET_VERSION = 17
+
+# Used when there is no Chroma collection to take real chunks from
+SAMPLE_TEXTS = [
+    "What is the difference between a process and a thread?",
+    "Gradient descent updates the parameters in the direction of the negative gradient.",
+    "The French Revolution began in 1789 and ended with the rise of Napoleon.",
+    "Photosynthesis converts light energy into chemical energy stored in glucose.",
+    "Table 3: Results on the validation set, accuracy and F1 score per class.",
+    "In a relational database, a foreign key references the primary key of another table.",
+    "Chapter 1 Introduction",
+    "The quick brown fox jumps over the lazy dog.",
+    "Supply and demand determine the market price of a good in a competitive market.",
+    "def fibonacci(n): return n if n < 2 else fibonacci(n - 1) + fibonacci(n - 2)",
+]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Export the embedding model to an int8-quantized ONNX model.")
+    parser.add_argument("--model", default=MODEL_NAME, help="sentence-transformers model name or local directory")
+    parser.add_argument("--output", default=ONNX_MODEL_PATH, help="Directory to write the exported model to")
+    parser.add_argument("--no-quantize", action="store_true", help="Keep float32 weights")
+    parser.add_argument("--min-cosine", type=float, default=MIN_COSINE, help="Agreement required with the PyTorch vectors")
+    parser.add_argument("--samples", type=int, default=VALIDATION_SAMPLES, help="Chunks from Chroma to validate on")
+    parser.add_argument("--chroma-path", default=CHROMA_PATH)
+    parser.add_argument("--collection", default=COLLECTION_NAME)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    config = parse_args(argv)
+    sys.exit(0 if export_model(config) else 1)
+
+
+def export_model(config):
+    """
+    Export, quantize and validate; the output directory is only replaced if validation passes.
+    Returns:
+        bool: Whether the exported model was accepted
+    """
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.models import Normalize, Pooling
+
+    model = SentenceTransformer(config.model, device="cpu")
+    pooling = next(module for module in model if isinstance(module, Pooling))
+    if not pooling.pooling_mode_mean_tokens:
+        print(f"❌ {config.model} does not use mean pooling, which is all the onnx backend implements")
+        return False
+
+    output = Path(config.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    staging = Path(tempfile.mkdtemp(prefix=f".{output.name}-", dir=output.parent))
+    try:
+        print(f"📦 Exporting {config.model} to ONNX...")
+        export_transformer(model, staging)
+        if not config.no_quantize:
+            print("🗜️ Quantizing weights to int8...")
+            quantize(staging)
+
+        model.tokenizer.backend_tokenizer.save(str(staging / ONNX_TOKENIZER_FILE))
+        embedding_config = {
+            "source_model": config.model,
+            "max_length": model.max_seq_length,
+            "pad_id": model.tokenizer.pad_token_id,
+            "pad_token": model.tokenizer.pad_token,
+            "normalize": any(isinstance(module, Normalize) for module in model),
+            "dimensions": model.get_sentence_embedding_dimension(),
+            "quantization": None if config.no_quantize else "dynamic int8",
+        }
+        write_config(staging, embedding_config)
+
+        texts = validation_texts(config)
+        print(f"🔍 Validating on {len(texts)} texts...")
+        agreement = validate(model, OnnxEmbeddings(staging), texts)
+        print(
+            f"   cosine to PyTorch: min {agreement['min_cosine']:.4f}, "
+            f"mean {agreement['mean_cosine']:.4f}, 1st percentile {agreement['p1_cosine']:.4f}"
+        )
+        if agreement["min_cosine"] < config.min_cosine:
+            print(f"❌ Below the required {config.min_cosine}; {output} was left as it was")
+            return False
+
+        write_config(staging, {**embedding_config, "validation": agreement})
+        if output.exists():
+            shutil.rmtree(output)
+        staging.rename(output)
+        print(f"✅ ONNX model written to {output}")
+        return True
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+def export_transformer(model, folder):
+    """Trace the transformer (without pooling) with dynamic batch and sequence axes."""
+    import torch
+
+    transformer = model[0].auto_model.eval()
+    sample = model.tokenizer(["an example input", "another one"], padding=True, return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names + ["last_hidden_state"]}
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer,
+            tuple(sample[name] for name in input_names),
+            str(folder / ONNX_MODEL_FILE),
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=OPSET_VERSION,
+            dynamo=False,
+        )
+
+
+def quantize(folder):
+    """Dynamic quantization: int8 weights, activations quantized on the fly."""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    fp32_path = folder / "model-fp32.onnx"
+    (folder / ONNX_MODEL_FILE).rename(fp32_path)
+    quantize_dynamic(str(fp32_path), str(folder / ONNX_MODEL_FILE), weight_type=QuantType.QInt8)
+    fp32_path.unlink()
+
+
+def write_config(folder, embedding_config):
+    (folder / ONNX_CONFIG_FILE).write_text(json.dumps(embedding_config, indent=2), encoding="utf-8")
+
+
+def validation_texts(config):
+    """Real chunks from the vector store when there are any, the built-in samples otherwise."""
+    if not Path(config.chroma_path).exists():
+        return SAMPLE_TEXTS
+    try:
+        import chromadb
+        collection = chromadb.PersistentClient(path=config.chroma_path).get_collection(config.collection)
+        documents = collection.get(limit=config.samples, include=["documents"])["documents"]
+    except Exception:
+        documents = []
+    return documents or SAMPLE_TEXTS
+
+
+def validate(model, onnx_embeddings, texts):
+    """Cosine similarity between each text's PyTorch and ONNX vectors."""
+    reference = model.encode(texts, convert_to_numpy=True)
+    candidate = np.array(onnx_embeddings.embed_documents(texts))
+    cosine = (reference * candidate).sum(axis=1) / (
+        np.linalg.norm(reference, axis=1) * np.linalg.norm(candidate, axis=1)
+    )
+    return {
+        "texts": len(texts),
+        "min_cosine": float(cosine.min()),
+        "mean_cosine": float(cosine.mean()),
+        "p1_cosine": float(np.percentile(cosine, 1)),
+    }
+
+
+if __name__ == "__main__":
+    main()
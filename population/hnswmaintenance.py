@@ -0,0 +1,293 @@
+# Shows, tunes and rebuilds the HNSW index behind the Chroma collection.
+#
+#   python population/hnswmaintenance.py info
+#   python population/hnswmaintenance.py sweep --m 16 32 --ef-construction 100 200 --ef-search 10 50 100
+#   python population/hnswmaintenance.py rebuild --m 32 --ef-construction 200 --ef-search 50
+#   python population/hnswmaintenance.py tune --ef-search 50
+#
+# sweep holds out a sample of the stored chunks as queries, builds a scratch copy of the
+# collection for every M / ef_construction pair and reports recall@k against a brute-force
+# search, p50/p95 query latency, build time and index size for every ef_search.
+# rebuild copies the collection into a new, compact HNSW index with the chosen settings
+# and swaps it in under the original name; incremental additions and deletions leave the
+# old graph fragmented. tune only changes ef_search, which needs no rebuild. Chroma reads
+# the settings when it loads the index: restart the app after either, and stop it during
+# a rebuild.
+
+# Built-in Python modules for command-line parsing and file operations.
+import argparse
+import json
+import shutil
+import sqlite3
+import tempfile
+import time
+
+# Import Path for convenient file path handling (object-oriented interface).
+from pathlib import Path
+
+import chromadb
+import numpy as np
+
+CHROMA_PATH = "databases/chroma"
+COLLECTION_NAME = "langchain"
+PAGE_SIZE = 4096  # Records copied at once
+SWEEP_QUERIES = 200  # Chunks held out of the scratch indexes and used as queries
+SWEEP_K = 3  # What the knowledge base retrieves per question
+BRUTE_FORCE_BLOCK = 8192  # Stored vectors compared with the queries at once
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect, benchmark and rebuild the Chroma collection's HNSW index.")
+    parser.add_argument("--chroma-path", default=CHROMA_PATH)
+    parser.add_argument("--collection", default=COLLECTION_NAME)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("info", help="Show the HNSW settings, chunk count and index size")
+
+    rebuild = commands.add_parser("rebuild", help="Rebuild the collection into a compact index with new HNSW settings")
+    rebuild.add_argument("--m", type=int, default=None, help="Graph neighbours per node (default: keep the current one)")
+    rebuild.add_argument("--ef-construction", type=int, default=None, help="Candidate list size while building")
+    rebuild.add_argument("--ef-search", type=int, default=None, help="Candidate list size while searching")
+    rebuild.add_argument("--vacuum", action="store_true", help="Also VACUUM chroma.sqlite3 and remove orphaned index files")
+
+    tune = commands.add_parser("tune", help="Change ef_search without rebuilding")
+    tune.add_argument("--ef-search", type=int, required=True)
+
+    sweep = commands.add_parser("sweep", help="Measure recall and latency over a grid of HNSW settings")
+    sweep.add_argument("--m", type=int, nargs="+", default=[16, 32])
+    sweep.add_argument("--ef-construction", type=int, nargs="+", default=[100, 200])
+    sweep.add_argument("--ef-search", type=int, nargs="+", default=[10, 25, 50, 100, 200])
+    sweep.add_argument("--queries", type=int, default=SWEEP_QUERIES)
+    sweep.add_argument("--k", type=int, default=SWEEP_K)
+    sweep.add_argument("--output", default=None, help="Also write the results to this JSON file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    config = parse_args(argv)
+    client = chromadb.PersistentClient(path=config.chroma_path)
+    collection = client.get_collection(config.collection)
+    if config.command == "info":
+        print_info(client, collection, config.chroma_path)
+    elif config.command == "rebuild":
+        rebuild(client, collection, config)
+    elif config.command == "tune":
+        collection.modify(configuration={"hnsw": {"ef_search": config.ef_search}})
+        print(f"🧭 HNSW: {describe_hnsw(client.get_collection(config.collection))}")
+    else:
+        sweep(collection, config)
+
+
+def hnsw_configuration(m=None, ef_construction=None, ef_search=None):
+    """Chroma collection configuration for the given HNSW settings; None keeps Chroma's default."""
+    hnsw = {"max_neighbors": m, "ef_construction": ef_construction, "ef_search": ef_search}
+    hnsw = {key: value for key, value in hnsw.items() if value is not None}
+    return {"hnsw": hnsw} if hnsw else None
+
+
+def describe_hnsw(collection):
+    hnsw = collection.configuration["hnsw"] or {}
+    return (
+        f"M={hnsw.get('max_neighbors')}, ef_construction={hnsw.get('ef_construction')}, "
+        f"ef_search={hnsw.get('ef_search')}, space={hnsw.get('space')}"
+    )
+
+
+def folder_mb(path):
+    return sum(file.stat().st_size for file in Path(path).rglob("*") if file.is_file()) / 2**20
+
+
+def vector_segments(chroma_path, collection=None):
+    """Ids of the HNSW segments (one folder each) of a collection, or of every collection."""
+    connection = sqlite3.connect(Path(chroma_path) / "chroma.sqlite3")
+    try:
+        query = "SELECT id FROM segments WHERE scope = 'VECTOR'"
+        params = ()
+        if collection is not None:
+            query += " AND collection = ?"
+            params = (str(collection.id),)
+        return [segment for (segment,) in connection.execute(query, params)]
+    finally:
+        connection.close()
+
+
+def index_mb(chroma_path, collection):
+    """Size of the collection's HNSW files; metadata and documents live in the shared chroma.sqlite3."""
+    folders = [Path(chroma_path) / segment for segment in vector_segments(chroma_path, collection)]
+    return sum(folder_mb(folder) for folder in folders if folder.exists())
+
+
+def print_info(client, collection, chroma_path):
+    print(f"📚 {collection.name}: {collection.count()} chunks")
+    print(f"🧭 HNSW: {describe_hnsw(collection)}")
+    print(
+        f"💾 HNSW index {index_mb(chroma_path, collection):.1f} MB, "
+        f"chroma.sqlite3 {(Path(chroma_path) / 'chroma.sqlite3').stat().st_size / 2**20:.1f} MB"
+    )
+
+
+def read_records(collection, include=("embeddings", "documents", "metadatas")):
+    """Every record of the collection, page by page."""
+    for offset in range(0, collection.count(), PAGE_SIZE):
+        yield collection.get(limit=PAGE_SIZE, offset=offset, include=list(include))
+
+
+def copy_records(source, target, batch_size):
+    copied = 0
+    for page in read_records(source):
+        for start in range(0, len(page["ids"]), batch_size):
+            end = start + batch_size
+            target.add(
+                ids=page["ids"][start:end],
+                embeddings=page["embeddings"][start:end],
+                documents=page["documents"][start:end],
+                metadatas=page["metadatas"][start:end],
+            )
+        copied += len(page["ids"])
+    return copied
+
+
+def rebuild(client, collection, config):
+    """
+    Copy the collection into a new one with the chosen HNSW settings, then swap names:
+    the original is renamed aside, the copy takes its name and the original is deleted.
+    """
+    current = collection.configuration["hnsw"] or {}
+    settings = {
+        "max_neighbors": config.m or current.get("max_neighbors"),
+        "ef_construction": config.ef_construction or current.get("ef_construction"),
+        "ef_search": config.ef_search or current.get("ef_search"),
+        "space": current.get("space"),
+    }
+    size_before = index_mb(config.chroma_path, collection)
+    print(f"🧭 Current: {describe_hnsw(collection)}, {size_before:.1f} MB")
+
+    started = time.perf_counter()
+    suffix = time.strftime("%Y%m%d%H%M%S")
+    rebuilt = client.create_collection(
+        f"{collection.name}-rebuild-{suffix}",
+        configuration={"hnsw": {key: value for key, value in settings.items() if value is not None}},
+        # Legacy "hnsw:*" metadata keys would conflict with the configuration
+        metadata={key: value for key, value in (collection.metadata or {}).items() if not key.startswith("hnsw:")} or None,
+    )
+    try:
+        copied = copy_records(collection, rebuilt, client.get_max_batch_size())
+        if copied != collection.count() or rebuilt.count() != copied:
+            raise RuntimeError(f"The collection changed during the rebuild ({collection.count()} chunks, {rebuilt.count()} copied)")
+    except BaseException:
+        client.delete_collection(rebuilt.name)
+        raise
+
+    name = collection.name
+    collection.modify(name=f"{name}-old-{suffix}")
+    rebuilt.modify(name=name)
+    client.delete_collection(f"{name}-old-{suffix}")
+    print(f"♻️ Rebuilt {copied} chunks in {time.perf_counter() - started:.1f}s")
+
+    if config.vacuum:
+        client.clear_system_cache()
+        connection = sqlite3.connect(Path(config.chroma_path) / "chroma.sqlite3")
+        connection.execute("VACUUM")
+        connection.close()
+        # Index folders of deleted collections that Chroma left behind
+        live = set(vector_segments(config.chroma_path))
+        for folder in Path(config.chroma_path).iterdir():
+            if folder.is_dir() and (folder / "header.bin").exists() and folder.name not in live:
+                shutil.rmtree(folder)
+
+    client = chromadb.PersistentClient(path=config.chroma_path)
+    rebuilt = client.get_collection(name)
+    print(f"🧭 Now: {describe_hnsw(rebuilt)}, {index_mb(config.chroma_path, rebuilt):.1f} MB (was {size_before:.1f} MB)")
+
+
+def brute_force(vectors, queries, k):
+    """Exact top-k rows by squared L2 distance, in blocks of stored vectors."""
+    best_rows = np.empty((len(queries), 0), dtype=np.int64)
+    best_distances = np.empty((len(queries), 0), dtype=np.float32)
+    query_norms = (queries ** 2).sum(axis=1)[:, None]
+    for start in range(0, len(vectors), BRUTE_FORCE_BLOCK):
+        block = vectors[start:start + BRUTE_FORCE_BLOCK]
+        distances = query_norms - 2 * queries @ block.T + (block ** 2).sum(axis=1)[None, :]
+        rows = np.concatenate([best_rows, np.arange(start, start + len(block))[None, :].repeat(len(queries), axis=0)], axis=1)
+        distances = np.concatenate([best_distances, distances], axis=1)
+        keep = np.argsort(distances, axis=1)[:, :k]
+        best_rows = np.take_along_axis(rows, keep, axis=1)
+        best_distances = np.take_along_axis(distances, keep, axis=1)
+    return best_rows
+
+
+def sweep(collection, config):
+    """Build a scratch index per M / ef_construction and measure every ef_search on it."""
+    ids, vectors = [], []
+    for page in read_records(collection, include=("embeddings",)):
+        ids.extend(page["ids"])
+        vectors.append(np.asarray(page["embeddings"], dtype=np.float32))
+    vectors = np.concatenate(vectors)
+
+    # Held-out chunks: searched for, but not in the scratch indexes
+    rng = np.random.default_rng(0)
+    held_out = rng.choice(len(ids), min(config.queries, len(ids) // 10 or 1), replace=False)
+    indexed = np.setdiff1d(np.arange(len(ids)), held_out)
+    queries = vectors[held_out]
+    truth = brute_force(vectors[indexed], queries, config.k)
+    print(f"📏 {len(indexed)} indexed chunks, {len(queries)} held-out queries, k={config.k}")
+
+    workdir = Path(tempfile.mkdtemp(prefix="hnswsweep-"))
+    results = []
+    try:
+        for m in config.m:
+            for ef_construction in config.ef_construction:
+                client = chromadb.PersistentClient(path=str(workdir / f"m{m}-efc{ef_construction}"))
+                scratch = client.create_collection(
+                    "sweep", configuration=hnsw_configuration(m, ef_construction, max(config.ef_search))
+                )
+                started = time.perf_counter()
+                batch_size = client.get_max_batch_size()
+                for start in range(0, len(indexed), batch_size):
+                    rows = indexed[start:start + batch_size]
+                    scratch.add(ids=[str(row) for row in rows], embeddings=vectors[rows])
+                build_seconds = time.perf_counter() - started
+                size = folder_mb(workdir / f"m{m}-efc{ef_construction}")
+
+                for ef_search in config.ef_search:
+                    scratch.modify(configuration={"hnsw": {"ef_search": ef_search}})
+                    # ef_search is only read when the index is loaded
+                    client.clear_system_cache()
+                    client = chromadb.PersistentClient(path=str(workdir / f"m{m}-efc{ef_construction}"))
+                    scratch = client.get_collection("sweep")
+                    scratch.query(query_embeddings=[queries[0]], n_results=config.k)  # Loads the index
+                    latencies, hits = [], 0
+                    for query, expected in zip(queries, truth):
+                        started = time.perf_counter()
+                        found = scratch.query(query_embeddings=[query], n_results=config.k, include=[])["ids"][0]
+                        latencies.append(time.perf_counter() - started)
+                        hits += len({int(row) for row in found} & set(indexed[expected].tolist()))
+                    latencies_ms = np.array(latencies) * 1000
+                    results.append({
+                        "m": m,
+                        "ef_construction": ef_construction,
+                        "ef_search": ef_search,
+                        "recall": hits / (len(queries) * config.k),
+                        "p50_ms": float(np.percentile(latencies_ms, 50)),
+                        "p95_ms": float(np.percentile(latencies_ms, 95)),
+                        "build_seconds": build_seconds,
+                        "disk_mb": size,
+                    })
+                del scratch, client
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{'M':>4} {'ef_c':>6} {'ef_s':>6} {f'recall@{config.k}':>9} {'p50 ms':>8} {'p95 ms':>8} {'build s':>8} {'disk MB':>8}")
+    for result in results:
+        print(
+            f"{result['m']:>4} {result['ef_construction']:>6} {result['ef_search']:>6} {result['recall']:>9.3f} "
+            f"{result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} {result['build_seconds']:>8.1f} {result['disk_mb']:>8.1f}"
+        )
+    if config.output:
+        with open(config.output, "w", encoding="utf-8") as file:
+            json.dump({"queries": len(queries), "indexed": len(indexed), "k": config.k, "results": results}, file, indent=2)
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+# Keeps track of which PDFs have been ingested, keyed by path, size, mtime and content
+# hash, together with the status of each file and the ids of the chunks it produced.
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from pathlib import Path
+
+STATUS_PENDING = "pending"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+# A PDF as found on disk
+FileState = namedtuple("FileState", "path size mtime sha256")
+
+# What a run has to do: files to (re)ingest, and chunks that no longer belong in the index
+IngestionPlan = namedtuple("IngestionPlan", "new changed resumed deleted unchanged stale_ids")
+
+
+def file_sha256(path, block_size=1 << 20):
+    """Hash a file's content without loading it into memory at once."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def manifest_key(path):
+    """Paths are stored in POSIX form so the manifest is portable across platforms."""
+    return Path(path).as_posix()
+
+
+class IngestionManifest:
+    """SQLite-backed record of ingested PDFs, safe to share between pipeline threads."""
+
+    def __init__(self, db_path):
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.remaining = {}  # Chunks of in-flight files not persisted yet
+        with self.lock, self.conn:
+            self.conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS files (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime REAL NOT NULL,
+                    sha256 TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    chunk_ids TEXT NOT NULL DEFAULT '[]',
+                    error TEXT,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+            # SimHash fingerprints of stored chunks, for near-duplicate detection
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS fingerprints (chunk_id TEXT PRIMARY KEY, path TEXT NOT NULL, simhash INTEGER NOT NULL)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS fingerprints_path ON fingerprints (path)")
+            # Chunks dropped as near-duplicates, and the chunk they duplicate
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS duplicates (chunk_id TEXT PRIMARY KEY, path TEXT NOT NULL, duplicate_of TEXT NOT NULL)"
+            )
+
+    def scan(self, pdf_files):
+        """
+        Compare the PDFs on disk with the manifest.
+        Files whose size and mtime are unchanged are not re-hashed; a file that was only
+        touched (same content hash) is kept as it is. A pending or failed file whose content
+        did not change is resumed: the chunks it already wrote stay in the index. So is a
+        file that had chunks dropped as near-duplicates of chunks that are now going away.
+        Args:
+            pdf_files (list[Path]): PDFs currently in the input folder
+        Returns:
+            IngestionPlan: new, changed and resumed FileStates, deleted paths, the number
+            of unchanged files and the chunk ids to remove from the vector store, by path
+        """
+        with self.lock:
+            rows = {
+                path: (size, mtime, sha256, status, json.loads(chunk_ids))
+                for path, size, mtime, sha256, status, chunk_ids in self.conn.execute(
+                    "SELECT path, size, mtime, sha256, status, chunk_ids FROM files"
+                )
+            }
+            duplicates = self.conn.execute("SELECT path, duplicate_of FROM duplicates").fetchall()
+        all_rows = dict(rows)
+
+        new, changed, resumed, stale_ids = [], [], [], {}
+        unchanged = 0
+        for pdf in pdf_files:
+            stat = pdf.stat()
+            row = rows.pop(manifest_key(pdf), None)
+
+            if row and row[3] == STATUS_DONE and row[0] == stat.st_size and row[1] == stat.st_mtime:
+                unchanged += 1
+                continue
+
+            state = FileState(pdf, stat.st_size, stat.st_mtime, file_sha256(pdf))
+            if row and row[3] == STATUS_DONE and row[2] == state.sha256:
+                self._touch(state)
+                unchanged += 1
+                continue
+
+            if row and row[2] == state.sha256:
+                # Interrupted or failed with the same content: chunk ids are deterministic,
+                # so the chunks it already wrote can be kept
+                resumed.append(state)
+            elif row:
+                # Changed content: whatever it left in the index is stale
+                changed.append(state)
+                stale_ids[manifest_key(pdf)] = row[4]
+            else:
+                new.append(state)
+
+        deleted = list(rows)
+        for path in deleted:
+            stale_ids[path] = rows[path][4]
+
+        # Unchanged files whose dropped duplicates pointed at stale chunks get those chunks back
+        stale = {chunk_id for ids in stale_ids.values() for chunk_id in ids}
+        planned = {manifest_key(state.path) for state in new + changed + resumed} | set(deleted)
+        for path in sorted({path for path, original in duplicates if original in stale} - planned):
+            size, mtime, sha256 = all_rows[path][:3]
+            resumed.append(FileState(Path(path), size, mtime, sha256))
+            with self.lock, self.conn:
+                self._set_status(path, STATUS_PENDING)
+
+        return IngestionPlan(new, changed, resumed, deleted, unchanged, stale_ids)
+
+    def _touch(self, state):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "UPDATE files SET size = ?, mtime = ?, updated_at = ? WHERE path = ?",
+                (state.size, state.mtime, time.time(), manifest_key(state.path)),
+            )
+
+    def begin(self, state):
+        """Record a file as pending, before any of its chunks are written."""
+        with self.lock, self.conn:
+            self._forget_chunks(manifest_key(state.path))
+            self.conn.execute(
+                """
+                INSERT OR REPLACE INTO files (path, size, mtime, sha256, status, chunk_ids, error, updated_at)
+                VALUES (?, ?, ?, ?, ?, '[]', NULL, ?)
+                """,
+                (manifest_key(state.path), state.size, state.mtime, state.sha256, STATUS_PENDING, time.time()),
+            )
+
+    def set_chunks(self, path, chunk_ids):
+        """
+        Record the chunk ids a file is about to write; a file without chunks is done at once.
+        Returns:
+            list[str]: The chunk ids previously recorded for the file
+        """
+        key = manifest_key(path)
+        with self.lock, self.conn:
+            row = self.conn.execute("SELECT chunk_ids FROM files WHERE path = ?", (key,)).fetchone()
+            self.conn.execute(
+                "UPDATE files SET chunk_ids = ?, updated_at = ? WHERE path = ?",
+                (json.dumps(chunk_ids), time.time(), key),
+            )
+            if chunk_ids:
+                self.remaining[key] = len(chunk_ids)
+            else:
+                self._set_status(key, STATUS_DONE)
+        return json.loads(row[0]) if row else []
+
+    def chunks_saved(self, chunks):
+        """Count persisted chunks against their files and mark files done once complete."""
+        with self.lock, self.conn:
+            for chunk in chunks:
+                key = manifest_key(chunk.metadata["file_path"])
+                self.remaining[key] -= 1
+                if self.remaining[key] == 0:
+                    del self.remaining[key]
+                    self._set_status(key, STATUS_DONE)
+
+    def mark_failed(self, path, error):
+        with self.lock, self.conn:
+            self._set_status(manifest_key(path), STATUS_FAILED, error)
+
+    def forget(self, paths):
+        """Drop files that no longer exist on disk."""
+        with self.lock, self.conn:
+            for path in paths:
+                self._forget_chunks(path)
+            self.conn.executemany("DELETE FROM files WHERE path = ?", [(path,) for path in paths])
+
+    def _forget_chunks(self, key):
+        self.conn.execute("DELETE FROM fingerprints WHERE path = ?", (key,))
+        self.conn.execute("DELETE FROM duplicates WHERE path = ?", (key,))
+
+    def fingerprints(self):
+        """Yield (chunk_id, simhash) for every fingerprinted chunk."""
+        with self.lock:
+            rows = self.conn.execute("SELECT chunk_id, simhash FROM fingerprints").fetchall()
+        for chunk_id, fingerprint in rows:
+            yield chunk_id, fingerprint & 0xFFFFFFFFFFFFFFFF
+
+    def record_dedup(self, path, fingerprints, duplicates):
+        """
+        Store a file's chunk fingerprints and the chunks it had dropped as near-duplicates.
+        Args:
+            path (Path): The file
+            fingerprints (list): (chunk_id, simhash) of the chunks kept
+            duplicates (list): (chunk_id, duplicate_of) of the chunks dropped
+        """
+        key = manifest_key(path)
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM duplicates WHERE path = ?", (key,))
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO fingerprints (chunk_id, path, simhash) VALUES (?, ?, ?)",
+                # SQLite integers are signed 64-bit
+                [(chunk_id, key, fingerprint - (1 << 64) if fingerprint >= 1 << 63 else fingerprint)
+                 for chunk_id, fingerprint in fingerprints],
+            )
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO duplicates (chunk_id, path, duplicate_of) VALUES (?, ?, ?)",
+                [(chunk_id, key, original) for chunk_id, original in duplicates],
+            )
+
+    def _set_status(self, key, status, error=None):
+        self.conn.execute(
+            "UPDATE files SET status = ?, error = ?, updated_at = ? WHERE path = ?",
+            (status, error, time.time(), key),
+        )
+
+    def close(self):
+        self.conn.close()
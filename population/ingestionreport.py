@@ -0,0 +1,124 @@
+# Per-stage timing, throughput and memory figures for an ingestion run, written out as a
+# machine-readable JSON report so regressions can be tracked from run to run.
+
+import cProfile
+import json
+import pstats
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+REPORTS_FOLDER = "databases/ingestionreports"
+
+# Pipeline stages and the unit their throughput is measured in
+STAGES = (("convert", "pages"), ("split", "chunks"), ("embed", "embeddings"), ("upsert", "chunks"))
+
+
+def new_stats(files=0):
+    """Counters shared by the ingestion stages."""
+    return {
+        "files": files, "failed": 0, "pages": 0, "chunks": 0, "resumed_chunks": 0, "removed_chunks": 0,
+        "text_pages": 0, "text_seconds": 0.0, "markdown_pages": 0, "markdown_seconds": 0.0, "cached_pages": 0,
+        "slowest_page": None, "duplicate_chunks": 0, "duplicate_bytes": 0, "dimensions": 0,
+        "vector_index": None,
+        "stages": {stage: {"unit": unit, "items": 0, "seconds": 0.0} for stage, unit in STAGES},
+    }
+
+
+@contextmanager
+def timed(stage):
+    """Add the time spent inside the block to a stage's busy time."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stage["seconds"] += time.perf_counter() - start
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process and of its finished children (e.g. conversion workers)."""
+    try:
+        import resource
+    except ImportError:  # Not available on Windows
+        return None
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    scale = 1 if sys.platform == "darwin" else 1024
+    return {
+        "main": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2**20,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale / 2**20,
+    }
+
+
+def build_report(config, stats, wall_seconds, cache_stats=None):
+    stages = {}
+    for name, stage in stats["stages"].items():
+        stages[name] = {
+            "unit": stage["unit"],
+            "items": stage["items"],
+            "busy_seconds": round(stage["seconds"], 4),
+            f"{stage['unit']}_per_second": stage["items"] / stage["seconds"] if stage["seconds"] else None,
+        }
+    # Conversion runs in worker processes; this is the CPU time they spent on pages
+    stages["convert"]["worker_seconds"] = round(stats["text_seconds"] + stats["markdown_seconds"], 4)
+
+    return {
+        "finished_at": datetime.now(timezone.utc).isoformat(),
+        "config": {key: value for key, value in vars(config).items()},
+        "wall_seconds": round(wall_seconds, 4),
+        "files": {"processed": stats["files"] - stats["failed"], "failed": stats["failed"]},
+        "pages": stats["pages"],
+        "chunks": stats["chunks"],
+        "resumed_chunks": stats["resumed_chunks"],
+        "removed_chunks": stats["removed_chunks"],
+        "duplicate_chunks": stats["duplicate_chunks"],
+        "extraction": {
+            "text_pages": stats["text_pages"],
+            "markdown_pages": stats["markdown_pages"],
+            "cached_pages": stats["cached_pages"],
+            "slowest_page": stats["slowest_page"],
+        },
+        "throughput": {
+            "pages_per_second": stats["pages"] / wall_seconds if wall_seconds else None,
+            "chunks_per_second": stats["chunks"] / wall_seconds if wall_seconds else None,
+            "embeddings_per_second": stats["stages"]["embed"]["items"] / wall_seconds if wall_seconds else None,
+        },
+        "stages": stages,
+        "embedding_cache": cache_stats,
+        "vector_index": stats["vector_index"],
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def default_report_path():
+    return Path(REPORTS_FOLDER) / f"ingestion-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+
+
+def write_report(report, path):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(report, indent=2, default=str), encoding="utf-8")
+    return path
+
+
+def print_stage_report(report):
+    print(f"⏱️ {report['wall_seconds']:.1f}s wall time")
+    for name, stage in report["stages"].items():
+        rate = stage[f"{stage['unit']}_per_second"]
+        rate_text = f"{rate:.1f} {stage['unit']}/s" if rate else "-"
+        print(f"   {name:<8} {stage['items']:>8} {stage['unit']:<10} {stage['busy_seconds']:>9.2f}s busy   {rate_text}")
+    if report["peak_rss_mb"]:
+        print(f"🧠 Peak RSS: {report['peak_rss_mb']['main']:.0f} MB (workers: {report['peak_rss_mb']['children']:.0f} MB)")
+
+
+def save_profile(profiles, report_path, top=25):
+    """Merge the per-thread profiles, dump them next to the report and print the hot spots."""
+    profiles = [profile for profile in profiles if isinstance(profile, cProfile.Profile)]
+    if not profiles:
+        return None
+    stats = pstats.Stats(*profiles)
+    profile_path = Path(report_path).with_suffix(".prof")
+    stats.dump_stats(profile_path)
+    stats.sort_stats("cumulative").print_stats(top)
+    return profile_path
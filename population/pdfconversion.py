@@ -0,0 +1,245 @@
+# Converts PDFs into per-page LangChain Documents, either in-process or across a pool of
+# worker processes with a per-file timeout.
+
+# Process pool primitives; every worker talks to the parent through its own pipe so a
+# killed worker can never corrupt the channel of another one.
+import multiprocessing
+import multiprocessing.connection
+
+import time
+from collections import deque
+from pathlib import Path
+
+# PyMuPDF for raw page text and layout inspection.
+import fitz
+
+# PyMuPDF wrapper for LLMs (A package that allows extracting or formatting PDF data for use with LLMs).
+import pymupdf4llm
+
+# Import the Document schema used to define structured document objects in LangChain.
+from langchain.schema import Document
+
+MODE_FAST = "fast"  # Raw page text, Markdown only for pages that look like tables or columns
+MODE_MARKDOWN = "markdown"  # Markdown layout analysis for every page
+
+MARKDOWN_OPTIONS = dict(ignore_images=True, ignore_graphics=True, force_text=True)
+EXTRACTOR_REVISION = 1  # Bump whenever convert_pdf's output changes, so cached pages are extracted again
+
+
+def extractor_id(mode=MODE_FAST):
+    """Names what produced a set of pages, for the page cache: the mode and the library versions."""
+    return f"{mode}/pymupdf-{fitz.VersionBind}/pymupdf4llm-{pymupdf4llm.version}/r{EXTRACTOR_REVISION}"
+
+
+def convert_pdf(file_path, mode=MODE_FAST):
+    """
+    Convert one PDF into per-page (text, metadata) pairs.
+    Args:
+        file_path (Path): PDF to convert
+        mode (str): MODE_FAST or MODE_MARKDOWN
+    Returns:
+        tuple: (list of (text, metadata), report) where report counts the pages that took
+        each extraction path and lists (page, path, seconds) timings for every page
+    """
+    file_path = Path(file_path)
+    report = {"text_pages": 0, "markdown_pages": 0, "timings": []}
+    converted = []
+
+    with fitz.open(file_path) as doc:
+        if mode == MODE_MARKDOWN:
+            start = time.perf_counter()
+            # Extract per-page Markdown chunks with metadata
+            pages = [(page["text"], page["metadata"]) for page in pymupdf4llm.to_markdown(doc, page_chunks=True, **MARKDOWN_OPTIONS)]
+            elapsed = time.perf_counter() - start
+            report["markdown_pages"] = len(pages)
+            report["timings"] = [(metadata["page"], MODE_MARKDOWN, elapsed / len(pages)) for _, metadata in pages]
+        else:
+            pages = []
+            for page in doc:
+                start = time.perf_counter()
+                if needs_layout_analysis(page):
+                    text = pymupdf4llm.to_markdown(doc, pages=[page.number], **MARKDOWN_OPTIONS)
+                    path = MODE_MARKDOWN
+                else:
+                    text = page.get_text("text", sort=True)
+                    path = "text"
+                report[f"{path}_pages"] += 1
+                # Same metadata layout as pymupdf4llm's page chunks
+                metadata = dict(doc.metadata, file_path=doc.name, page_count=doc.page_count, page=page.number + 1)
+                pages.append((text, metadata))
+                report["timings"].append((page.number + 1, path, time.perf_counter() - start))
+
+    for text, metadata in pages:
+        metadata["file_path"] = str(file_path)  # For traceability
+        metadata["source"] = f"{file_path.stem}"  # The name of the document
+        converted.append((text, metadata))
+    return converted, report
+
+
+def convert_pdf_cached(file_path, cache, sha256, mode=MODE_FAST):
+    """
+    convert_pdf through a PageCache (rag/utils/pagecache.py): a PDF with the same content
+    and extractor is only converted once, whoever asks for it first.
+    Returns:
+        list: (text, metadata) pairs, one per page
+    """
+    extractor = extractor_id(mode)
+    cached = cache.get(sha256, extractor, file_path)
+    if cached is not None:
+        return cached[0]
+    pages, report = convert_pdf(file_path, mode)
+    cache.put(sha256, extractor, pages, cache_report(report))
+    return pages
+
+
+def cache_report(report):
+    """What is kept of a conversion report in the page cache; per-page timings only matter once."""
+    return {"text_pages": report["text_pages"], "markdown_pages": report["markdown_pages"]}
+
+
+def needs_layout_analysis(page, min_table_rows=3):
+    """
+    Cheap layout heuristics deciding whether a page deserves Markdown conversion.
+    A page qualifies when its text lines form a grid (at least `min_table_rows` rows
+    holding three or more separate cells) or when it is laid out in several columns.
+    """
+    width = page.rect.width
+    lines = [
+        line["bbox"]
+        for block in page.get_text("dict")["blocks"]
+        if block.get("type") == 0
+        for line in block["lines"]
+        if any(span["text"].strip() for span in line["spans"])
+    ]
+    if not lines:
+        return False
+
+    # Tables: several rows in which three or more lines share the same baseline
+    rows = {}
+    for x0, y0, x1, y1 in lines:
+        rows.setdefault(round(y1 / 3), []).append(x0)
+    if sum(1 for cells in rows.values() if len(cells) >= 3) >= min_table_rows:
+        return True
+
+    # Columns: most lines are narrow and a substantial share starts in the right half
+    narrow = [(x0, x1) for x0, y0, x1, y1 in lines if x1 - x0 < width * 0.45]
+    right = [x0 for x0, x1 in narrow if x0 > width * 0.45]
+    return len(narrow) > 0.6 * len(lines) and len(right) > 0.25 * len(lines)
+
+
+def pages_to_documents(pages):
+    """Wrap converted (text, metadata) pairs into LangChain Documents."""
+    return [Document(page_content=text, metadata=metadata) for text, metadata in pages]
+
+
+def _conversion_worker(conn):
+    """Worker loop: receive (path, mode), send back (pages, report, error) until told to stop."""
+    while True:
+        task = conn.recv()
+        if task is None:
+            break
+        try:
+            conn.send((*convert_pdf(*task), None))
+        except Exception as e:
+            conn.send((None, None, str(e)))
+    conn.close()
+
+
+class _Worker:
+    """A conversion process plus the file it is currently working on."""
+
+    def __init__(self, ctx):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_conversion_worker, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.file_path = None
+        self.started = None
+
+    def submit(self, file_path, mode):
+        self.file_path = file_path
+        self.started = time.monotonic()
+        self.conn.send((file_path, mode))
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.conn.close()
+
+    def kill(self):
+        self.process.terminate()
+        self.process.join()
+        self.conn.close()
+
+
+def iter_converted_pdfs(pdf_files, workers=1, timeout=None, mode=MODE_FAST):
+    """
+    Convert PDFs and yield (file_path, pages, report, error) as each file finishes.
+    Args:
+        pdf_files (list[Path]): PDFs to convert
+        workers (int): Number of worker processes; 1 without a timeout converts in-process
+        timeout (float | None): Seconds a single file may take before its worker is killed
+        mode (str): MODE_FAST or MODE_MARKDOWN, see convert_pdf
+    Yields:
+        tuple: (file_path, list of (text, metadata) or None, report or None, error message or None)
+    """
+    if workers <= 1 and timeout is None:
+        for file_path in pdf_files:
+            try:
+                yield file_path, *convert_pdf(file_path, mode), None
+            except Exception as e:
+                yield file_path, None, None, str(e)
+        return
+
+    # Spawned, not forked: this runs in a pipeline stage thread next to other threads, with
+    # torch and tokenizers possibly loaded, and forking such a process can deadlock the child
+    ctx = multiprocessing.get_context("spawn")
+    pending = deque(pdf_files)
+    idle = [_Worker(ctx) for _ in range(max(1, min(workers, len(pending))))]
+    busy = {}
+
+    try:
+        while pending or busy:
+            while pending and idle:
+                worker = idle.pop()
+                worker.submit(pending.popleft(), mode)
+                busy[worker.conn] = worker
+
+            wait_for = None
+            if timeout is not None:
+                deadline = min(worker.started for worker in busy.values()) + timeout
+                wait_for = max(0.0, deadline - time.monotonic())
+
+            for conn in multiprocessing.connection.wait(list(busy), wait_for):
+                worker = busy.pop(conn)
+                file_path = worker.file_path
+                try:
+                    pages, report, error = conn.recv()
+                    idle.append(worker)
+                except (EOFError, ConnectionResetError):
+                    # The worker died (e.g. a crash inside MuPDF); reap it so its exit code is known, and replace it
+                    worker.kill()
+                    pages, report, error = None, None, f"worker exited with code {worker.process.exitcode}"
+                    if pending:
+                        idle.append(_Worker(ctx))
+                yield file_path, pages, report, error
+
+            if timeout is not None:
+                now = time.monotonic()
+                for conn, worker in list(busy.items()):
+                    if now - worker.started >= timeout:
+                        del busy[conn]
+                        worker.kill()
+                        if pending:
+                            idle.append(_Worker(ctx))
+                        yield worker.file_path, None, None, f"timed out after {timeout}s"
+    finally:
+        for worker in idle:
+            worker.stop()
+        for worker in busy.values():
+            worker.kill()
@@ -0,0 +1,76 @@
+# Runs ingestion stages in background threads connected by bounded queues, so a fast
+# stage can never run further ahead of the next one than the queue allows.
+
+import cProfile
+import queue
+import threading
+
+QUEUE_SIZE = 4  # Items a stage may buffer before it blocks
+
+_DONE = object()
+
+
+class _Failure:
+    """Carries an exception raised by a stage over to the consuming thread."""
+
+    def __init__(self, error):
+        self.error = error
+
+
+def run_in_thread(iterable, maxsize=QUEUE_SIZE, profiles=None):
+    """
+    Iterate `iterable` in a background thread and yield its items through a bounded queue.
+    Args:
+        iterable: Generator or iterable producing the stage's items
+        maxsize (int): Maximum number of items waiting in the queue
+        profiles (list | None): If given, the stage thread runs under cProfile and its
+            profile is appended to this list
+    Yields:
+        The items of `iterable`, in order. Exceptions raised by the stage are re-raised here.
+    """
+    items = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+
+    def put(item):
+        # Block while the queue is full, but give up once the consumer has gone away
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        profile = None
+        if profiles is not None:
+            profile = cProfile.Profile()
+            profiles.append(profile)
+            profile.enable()
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+            put(_DONE)
+        except BaseException as e:
+            put(_Failure(e))
+        finally:
+            # Closing an upstream generator stops its own thread in turn
+            close = getattr(iterable, "close", None)
+            if close is not None:
+                close()
+            if profile is not None:
+                profile.disable()
+
+    threading.Thread(target=produce, daemon=True).start()
+
+    try:
+        while True:
+            item = items.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
@@ -0,0 +1,355 @@
+# Exports the vector index (Chroma collection or NumPy index) to a self-contained snapshot
+# and imports it on another machine, so a new serving node is provisioned by bulk-loading
+# the snapshot instead of copying databases/chroma or re-running the ingestion.
+#
+#   python population/vectorsnapshot.py export databases/snapshots/library
+#   python population/vectorsnapshot.py import databases/snapshots/library --target numpy --publish
+#
+# Snapshot layout:
+#   vectors.npy        float32 vectors, one contiguous row per chunk
+#   chunks.parquet     chunk ids, texts and metadata (as JSON), in the same row order
+#   verification.npy   query vectors searched on export and again after import
+#   ingestionmanifest.sqlite3   optional, so later ingestion runs skip the PDFs already in it
+#   manifest.json      counts, dimensions, embedding model, expected results and a SHA-256 per file
+
+# Built-in Python modules for command-line parsing and file operations.
+import argparse
+import hashlib
+import json
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+# Import Path for convenient file path handling (object-oriented interface).
+from pathlib import Path
+
+import numpy as np
+
+# Where the index lives and which embedding model built it.
+sys.path.append("rag/")
+from utils.embeddingbackend import BACKEND_TORCH, EMBEDDING_BACKENDS, ONNX_MODEL_PATH, embedding_model_id
+from utils.numpyvectorstore import (
+    NUMPY_INDEX_PATH, SERVING_PATH, STORAGES, VECTOR_STORE_CHROMA, VECTOR_STORE_NUMPY, VECTOR_STORES, NumpyVectorStore,
+)
+
+CHROMA_PATH = "databases/chroma"
+COLLECTION_NAME = "langchain"
+MANIFEST_PATH = "databases/ingestionmanifest.sqlite3"
+MODEL_NAME = "all-MiniLM-L6-v2"
+SNAPSHOT_FORMAT = 1
+VECTORS_FILE = "vectors.npy"
+CHUNKS_FILE = "chunks.parquet"
+VERIFICATION_FILE = "verification.npy"
+MANIFEST_FILE = "manifest.json"
+INGESTION_MANIFEST_FILE = "ingestionmanifest.sqlite3"
+PAGE_SIZE = 4096  # Chunks read from the source, or loaded into the target, at once
+VERIFY_QUERIES = 50  # Perturbed stored vectors searched before export and after import
+VERIFY_K = 5
+MIN_AGREEMENT = 0.95  # Share of the exported top-k results the imported index must return
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Export or import a snapshot of the vector index.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="Write the index to a snapshot folder")
+    export.add_argument("snapshot", help="Folder to write the snapshot to (must not exist)")
+    export.add_argument("--source", choices=VECTOR_STORES, default=VECTOR_STORE_CHROMA)
+    export.add_argument("--model", default=MODEL_NAME, help="Embedding model the index was built with, recorded in the manifest")
+    export.add_argument("--embedding-backend", choices=EMBEDDING_BACKENDS, default=BACKEND_TORCH)
+    export.add_argument("--onnx-model-path", default=ONNX_MODEL_PATH)
+    export.add_argument("--no-ingestion-manifest", action="store_true", help="Leave the ingestion manifest out")
+
+    load = commands.add_parser("import", help="Load a snapshot into an empty index")
+    load.add_argument("snapshot", help="Snapshot folder written by export")
+    load.add_argument("--target", choices=VECTOR_STORES, default=VECTOR_STORE_CHROMA)
+    load.add_argument("--replace", action="store_true", help="Overwrite a target index that already has chunks")
+    load.add_argument("--vector-storage", choices=STORAGES, default=None, help="Search copy of the NumPy index")
+    load.add_argument("--ivf", action="store_true", help="Train IVF lists on the NumPy index after loading")
+    load.add_argument("--publish", action="store_true", help="Publish the NumPy index for VECTOR_STORE=serving after loading")
+
+    for command in (export, load):
+        command.add_argument("--chroma-path", default=CHROMA_PATH)
+        command.add_argument("--collection", default=COLLECTION_NAME)
+        command.add_argument("--numpy-index-path", default=NUMPY_INDEX_PATH)
+        command.add_argument("--manifest-path", default=MANIFEST_PATH, help="SQLite ingestion manifest")
+    load.add_argument("--serving-path", default=SERVING_PATH)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    config = parse_args(argv)
+    if config.command == "export":
+        export_snapshot(config)
+        sys.exit(0)
+    sys.exit(0 if import_snapshot(config) else 1)
+
+
+class ChromaIndex:
+    """The Chroma collection behind the small interface export and import need."""
+
+    def __init__(self, config, create=False):
+        import chromadb
+
+        self.client = chromadb.PersistentClient(path=config.chroma_path)
+        self.name = config.collection
+        if create:
+            self.collection = self.client.get_or_create_collection(self.name)
+        else:
+            self.collection = self.client.get_collection(self.name)
+        self.batch_size = self.client.get_max_batch_size()
+
+    def count(self):
+        return self.collection.count()
+
+    def pages(self):
+        for offset in range(0, self.count(), PAGE_SIZE):
+            yield self.collection.get(limit=PAGE_SIZE, offset=offset, include=["embeddings", "documents", "metadatas"])
+
+    def search(self, vector, k):
+        return self.collection.query(query_embeddings=[vector], n_results=k, include=[])["ids"][0]
+
+    def clear(self):
+        self.client.delete_collection(self.name)
+        self.collection = self.client.get_or_create_collection(self.name)
+
+    def add(self, ids, vectors, documents, metadatas):
+        for start in range(0, len(ids), self.batch_size):
+            end = start + self.batch_size
+            self.collection.upsert(
+                ids=ids[start:end], embeddings=vectors[start:end], documents=documents[start:end], metadatas=metadatas[start:end]
+            )
+
+    def close(self):
+        pass
+
+
+class NumpyIndex:
+    """The NumPy index behind the same interface."""
+
+    def __init__(self, config, create=False):
+        path = Path(config.numpy_index_path)
+        if not create and not (path / "metadata.sqlite3").exists():
+            raise FileNotFoundError(f"No NumPy index in {path}")
+        self.store = NumpyVectorStore(path, storage=getattr(config, "vector_storage", None))
+
+    def count(self):
+        return self.store.count()
+
+    def pages(self):
+        for offset in range(0, self.count(), PAGE_SIZE):
+            yield self.store.get(limit=PAGE_SIZE, offset=offset, include=["embeddings", "documents", "metadatas"])
+
+    def search(self, vector, k):
+        return [document.id for document in self.store.similarity_search_by_vector(vector, k)]
+
+    def clear(self):
+        path, storage = self.store.path, self.store.storage
+        self.store.close()
+        shutil.rmtree(path)
+        self.store = NumpyVectorStore(path, storage=storage)
+
+    def add(self, ids, vectors, documents, metadatas):
+        self.store.upsert(ids, vectors, documents, metadatas)
+
+    def close(self):
+        self.store.close()
+
+
+def open_index(config, kind, create=False):
+    return NumpyIndex(config, create) if kind == VECTOR_STORE_NUMPY else ChromaIndex(config, create)
+
+
+def file_sha256(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def export_snapshot(config):
+    """Write the snapshot to a staging folder and move it into place once complete."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    started = time.perf_counter()
+    output = Path(config.snapshot)
+    if output.exists():
+        raise FileExistsError(f"{output} already exists")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    staging = Path(tempfile.mkdtemp(prefix=f".{output.name}-", dir=output.parent))
+    index = open_index(config, config.source)
+    try:
+        count = index.count()
+        if not count:
+            raise ValueError(f"The {config.source} index is empty, there is nothing to export")
+        print(f"📦 Exporting {count} chunks from {config.source}...")
+
+        vectors = None
+        schema = pa.schema([("id", pa.string()), ("document", pa.string()), ("metadata", pa.string())])
+        written = 0
+        with pq.ParquetWriter(staging / CHUNKS_FILE, schema, compression="zstd") as writer:
+            for page in index.pages():
+                page_vectors = np.asarray(page["embeddings"], dtype=np.float32)
+                if vectors is None:
+                    vectors = np.lib.format.open_memmap(
+                        staging / VECTORS_FILE, mode="w+", dtype=np.float32, shape=(count, page_vectors.shape[1])
+                    )
+                vectors[written:written + len(page_vectors)] = page_vectors
+                written += len(page_vectors)
+                writer.write_table(pa.table({
+                    "id": page["ids"],
+                    "document": page["documents"],
+                    "metadata": [json.dumps(metadata or {}, ensure_ascii=False) for metadata in page["metadatas"]],
+                }, schema=schema))
+        if written != count:
+            raise RuntimeError(f"The index changed during the export ({count} chunks counted, {written} read)")
+        vectors.flush()
+
+        # Queries near stored chunks, with the source index's answers, to check the import against
+        rng = np.random.default_rng(0)
+        queries = np.asarray(vectors[np.sort(rng.choice(count, min(VERIFY_QUERIES, count), replace=False))])
+        queries = queries + rng.normal(scale=0.05 * np.abs(queries).mean(), size=queries.shape).astype(np.float32)
+        np.save(staging / VERIFICATION_FILE, queries)
+        expected = [index.search(query, VERIFY_K) for query in queries]
+        dimensions = vectors.shape[1]
+        del vectors
+
+        if not config.no_ingestion_manifest and Path(config.manifest_path).exists():
+            # The backup API copies a consistent state even while an ingestion is writing
+            source = sqlite3.connect(config.manifest_path)
+            target = sqlite3.connect(staging / INGESTION_MANIFEST_FILE)
+            source.backup(target)
+            target.close()
+            source.close()
+
+        manifest = {
+            "format": SNAPSHOT_FORMAT,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "source": config.source,
+            "chunks": count,
+            "dimensions": dimensions,
+            "dtype": "float32",
+            "embedding_model": embedding_model_id(config.embedding_backend, config.model, config.onnx_model_path),
+            "verification": {"k": VERIFY_K, "expected_ids": expected},
+            "files": {
+                file.name: {"bytes": file.stat().st_size, "sha256": file_sha256(file)}
+                for file in sorted(staging.iterdir())
+            },
+        }
+        (staging / MANIFEST_FILE).write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+        staging.rename(output)
+    finally:
+        index.close()
+        shutil.rmtree(staging, ignore_errors=True)
+
+    size_mb = sum(entry["bytes"] for entry in manifest["files"].values()) / 2**20
+    print(f"✅ Snapshot of {count} chunks ({size_mb:.1f} MB) written to {output} in {time.perf_counter() - started:.1f}s")
+    return manifest
+
+
+def read_manifest(snapshot):
+    """Load the manifest and check every file against its recorded size and checksum."""
+    manifest = json.loads((snapshot / MANIFEST_FILE).read_text(encoding="utf-8"))
+    if manifest["format"] != SNAPSHOT_FORMAT:
+        raise ValueError(f"Unsupported snapshot format {manifest['format']}, expected {SNAPSHOT_FORMAT}")
+    for name, entry in manifest["files"].items():
+        path = snapshot / name
+        if not path.exists() or path.stat().st_size != entry["bytes"] or file_sha256(path) != entry["sha256"]:
+            raise ValueError(f"{path} is missing or does not match the snapshot's checksum")
+    return manifest
+
+
+def import_snapshot(config):
+    """
+    Verify the snapshot, bulk-load it into the target index and re-run the export's queries.
+    Returns:
+        bool: Whether the imported index returns the exported results
+    """
+    import pyarrow.parquet as pq
+
+    started = time.perf_counter()
+    snapshot = Path(config.snapshot)
+    manifest = read_manifest(snapshot)
+    print(
+        f"📦 Importing {manifest['chunks']} chunks ({manifest['dimensions']} dims, {manifest['embedding_model']}) "
+        f"from {snapshot} into {config.target}..."
+    )
+
+    index = open_index(config, config.target, create=True)
+    try:
+        if index.count():
+            if not config.replace:
+                raise FileExistsError(f"The {config.target} index already has {index.count()} chunks; pass --replace to overwrite it")
+            index.clear()
+
+        vectors = np.load(snapshot / VECTORS_FILE, mmap_mode="r")
+        loaded = 0
+        for batch in pq.ParquetFile(snapshot / CHUNKS_FILE).iter_batches(batch_size=PAGE_SIZE):
+            columns = batch.to_pydict()
+            index.add(
+                columns["id"],
+                np.asarray(vectors[loaded:loaded + batch.num_rows]),
+                columns["document"],
+                [json.loads(metadata) or None for metadata in columns["metadata"]],
+            )
+            loaded += batch.num_rows
+        del vectors
+        print(f"⚡ Loaded {loaded} chunks in {time.perf_counter() - started:.1f}s")
+
+        if config.target == VECTOR_STORE_NUMPY:
+            if config.ivf:
+                index.store.train_ivf()
+            if config.publish:
+                generation = index.store.publish(config.serving_path)
+                print(f"📤 Published as generation {generation.name}")
+
+        agreement = verify(index, snapshot, manifest)
+    finally:
+        index.close()
+
+    if (snapshot / INGESTION_MANIFEST_FILE).exists():
+        if Path(config.manifest_path).exists():
+            print(f"ℹ️ Kept the existing ingestion manifest at {config.manifest_path}")
+        else:
+            Path(config.manifest_path).parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(snapshot / INGESTION_MANIFEST_FILE, config.manifest_path)
+
+    print(f"🎯 Top-{manifest['verification']['k']} agreement with the exported index: {agreement:.3f}")
+    if agreement < MIN_AGREEMENT:
+        print(f"❌ Below the required {MIN_AGREEMENT}")
+        return False
+    print(f"✅ Imported in {time.perf_counter() - started:.1f}s")
+    return True
+
+
+def verify(index, snapshot, manifest):
+    """
+    Share of the results the source index returned on export that the imported one returns
+    too. A different chunk at the same distance (a tie) counts as the same result.
+    """
+    import pyarrow.parquet as pq
+
+    queries = np.load(snapshot / VERIFICATION_FILE)
+    vectors = np.load(snapshot / VECTORS_FILE, mmap_mode="r")
+    rows = {chunk_id: row for row, chunk_id in enumerate(pq.read_table(snapshot / CHUNKS_FILE, columns=["id"])["id"].to_pylist())}
+    k = manifest["verification"]["k"]
+
+    def distances(query, ids):
+        return ((np.asarray(vectors[[rows[chunk_id] for chunk_id in ids]]) - query) ** 2).sum(axis=1)
+
+    overlaps = []
+    for query, expected in zip(queries, manifest["verification"]["expected_ids"]):
+        if not expected:
+            continue
+        found = index.search(query, k)
+        worst = distances(query, expected).max() * (1 + 1e-5) + 1e-6
+        hits = sum(chunk_id in expected or distance <= worst for chunk_id, distance in zip(found, distances(query, found)))
+        overlaps.append(min(hits, len(expected)) / len(expected))
+    return float(np.mean(overlaps)) if overlaps else 1.0
+
+if __name__ == "__main__":
+    main()
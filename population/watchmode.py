@@ -0,0 +1,98 @@
+# Watches the PDF folder and runs the ingestion again whenever PDFs are added, changed or
+# removed. Changes are debounced: a run starts once the folder has been quiet for a while,
+# so a batch of files, or one large file still being copied, is ingested in one go.
+# watchdog (inotify on Linux) wakes the loop as soon as something happens; the folder is
+# also polled, which covers platforms and network drives without change notifications.
+
+import os
+import sys
+import threading
+import time
+import traceback
+from pathlib import Path
+
+# Which files are PDFs, the same test as the ingestion and the app
+sys.path.append("rag/")
+from utils.pdffiles import is_pdf
+
+WATCH_INTERVAL = 5.0  # Seconds between polls of the folder
+WATCH_DEBOUNCE = 10.0  # Seconds the folder must stay unchanged before a run starts
+
+
+def scan(folder):
+    """Size and modification time of every PDF in the folder."""
+    snapshot = {}
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if entry.is_file() and is_pdf(entry.name):
+                stat = entry.stat()
+                snapshot[entry.name] = (stat.st_size, stat.st_mtime_ns)
+    return snapshot
+
+
+def start_observer(folder, wake):
+    """Wake the watch loop on file system events, if watchdog is installed."""
+    try:
+        from watchdog.events import FileSystemEventHandler
+        from watchdog.observers import Observer
+    except ImportError:
+        return None
+
+    class Handler(FileSystemEventHandler):
+        def on_any_event(self, event):
+            wake.set()
+
+    observer = Observer()
+    observer.schedule(Handler(), str(folder), recursive=False)
+    observer.daemon = True
+    observer.start()
+    return observer
+
+
+def watch_library(config, ingest, interval=WATCH_INTERVAL, debounce=WATCH_DEBOUNCE):
+    """
+    Run ingest(config) now and again after every settled change to config.input_folder,
+    until interrupted. A failed run is reported and retried after the next change.
+    """
+    folder = Path(config.input_folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    wake = threading.Event()
+    observer = start_observer(folder, wake)
+    print(
+        f"👀 Watching {folder} ({'file system events and ' if observer else ''}polling every {interval:.0f}s, "
+        f"{debounce:.0f}s debounce); Ctrl+C to stop"
+    )
+
+    ingested = None  # Folder contents at the start of the last run
+    last = None
+    changed_at = float("-inf")
+    try:
+        while True:
+            snapshot = scan(folder)
+            now = time.monotonic()
+            if snapshot != last:
+                # Still changing (or a file still being copied): wait for it to settle
+                if last is not None:
+                    changed_at = now
+                last = snapshot
+
+            pending = snapshot != ingested
+            if pending and now - changed_at >= debounce:
+                ingested = snapshot
+                print(f"\n🔄 Change detected in {folder}, ingesting ({time.strftime('%H:%M:%S')})")
+                try:
+                    ingest(config)
+                except Exception:
+                    traceback.print_exc()
+                    print("❌ Ingestion run failed; retrying after the next change")
+                continue
+
+            timeout = interval if not pending else min(interval, max(0.1, debounce - (now - changed_at)))
+            wake.wait(timeout)
+            wake.clear()
+    except KeyboardInterrupt:
+        print("👋 Stopped watching")
+    finally:
+        if observer is not None:
+            observer.stop()
+            observer.join()
@@ -1,57 +1,163 @@
 
 import streamlit as st
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 
 from langchain_chroma import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain.prompts import ChatPromptTemplate
 from utils.utils import call_openrouter_api, display_content_llm
 from utils.highlightviewpdf import highlight_and_view_pdf
+from utils.embeddingcache import CachedEmbeddings, EmbeddingCache
+from utils.embeddingbackend import EMBEDDING_BACKEND, ONNX_MODEL_PATH, embedding_model_id, load_embeddings
+from utils.numpyvectorstore import (
+    NUMPY_INDEX_PATH, SERVING_PATH, VECTOR_STORE, VECTOR_STORE_NUMPY, VECTOR_STORE_SERVING, NumpyVectorStore,
+    ServingVectorStore,
+)
+from utils.shardedvectorstore import SHARD_GROUPS_PATH, VECTOR_STORE_SHARDED, ShardedVectorStore
+from utils.indexgeneration import read_index_generation
+from utils.pdffiles import is_pdf
+from utils.queryvectors import TOPIC_THRESHOLD, TopicCentroid, search_by_vector
+from utils.keywordindex import KEYWORD_INDEX_PATH, current_keyword_index, reciprocal_rank_fusion
+from utils.reranker import RERANK_CANDIDATES, RETRIEVAL_MODE, RETRIEVAL_RERANK, Reranker, select_chunks
+from utils.diversify import (
+    DIVERSITY, DIVERSITY_CANDIDATES, DIVERSITY_MMR, DIVERSITY_NONE, collapse_overlapping, mmr, stored_vectors,
+)
 import os
 import sys
+import time
 sys.path.append("rag/")
 from utils.prompt import const
 
 
 
 CHROMA_PATH = "databases/chroma"  
+PDF_FOLDER = "databases/pdfbooksarticles"
 MODEL_NAME = "all-MiniLM-L6-v2"
+HYBRID_CANDIDATES = 20  # Chunks taken from each of vector and keyword search before fusing them
 
 
-# Initialize embeddings and vector store once
+# Initialize embeddings once
 @st.cache_resource(show_spinner=False)
+def init_embeddings():
+    # EMBEDDING_BACKEND=onnx in the environment serves queries from the int8 ONNX model instead of PyTorch
+    model = load_embeddings(EMBEDDING_BACKEND, MODEL_NAME, ONNX_MODEL_PATH)
+    # Shares the on-disk embedding cache with ingestion
+    return CachedEmbeddings(model, embedding_model_id(EMBEDDING_BACKEND, MODEL_NAME, ONNX_MODEL_PATH), EmbeddingCache())
+
+
+# Open the vector store once per index generation: every ingestion run that changes the
+# index bumps it, and the next rerun reopens the store to see the new chunks
+@st.cache_resource(show_spinner=False, max_entries=1)
+def init_vector_store(generation):
+    embedding_fn = init_embeddings()
+    # The Chroma backends (chroma and sharded) keep serving their in-memory copy of the index
+    # until Chroma's cached clients are dropped. With chromadb 1.0.15, clear_system_cache() only
+    # empties that dict: clients already handed out keep working, the next one reads from disk
+    if generation and VECTOR_STORE not in (VECTOR_STORE_NUMPY, VECTOR_STORE_SERVING):
+        from chromadb.api.client import SharedSystemClient
+        SharedSystemClient.clear_system_cache()
+    # VECTOR_STORE=numpy in the environment searches the NumPy index built with --vector-store numpy
+    if VECTOR_STORE == VECTOR_STORE_NUMPY:
+        chroma_db = NumpyVectorStore(NUMPY_INDEX_PATH, embedding_function=embedding_fn)
+    # VECTOR_STORE=serving maps the generation published with --publish read-only, shared by every app
+    # process, and picks up newly published generations without a restart
+    elif VECTOR_STORE == VECTOR_STORE_SERVING:
+        chroma_db = ServingVectorStore(SERVING_PATH, embedding_function=embedding_fn)
+    # VECTOR_STORE=sharded searches the per-source collections built with --vector-store sharded in parallel
+    elif VECTOR_STORE == VECTOR_STORE_SHARDED:
+        chroma_db = ShardedVectorStore(CHROMA_PATH, embedding_function=embedding_fn, groups_path=SHARD_GROUPS_PATH)
+    else:
+        chroma_db = Chroma(persist_directory=CHROMA_PATH, embedding_function=embedding_fn)
+    return chroma_db
+
+
+# The keyword index is updated by every ingestion run that changes the chunks, so it follows
+# the same generation; None (vector search only) until one has been built
+@st.cache_resource(show_spinner=False, max_entries=1)
+def init_keyword_index(generation):
+    return current_keyword_index(KEYWORD_INDEX_PATH)
+
+
+# RETRIEVAL_MODE=rerank in the environment reranks an over-fetched candidate list with a
+# local cross-encoder and sends only the chunks it scores above RERANK_MIN_SCORE
+@st.cache_resource(show_spinner=False)
+def init_reranker():
+    return Reranker()
+
+
 def init_knowledge_base():
-    embedding_fn = HuggingFaceEmbeddings(model_name=MODEL_NAME)
-    chroma_db = Chroma(persist_directory=CHROMA_PATH, embedding_function=embedding_fn)
-    return embedding_fn, chroma_db
+    generation = read_index_generation()
+    return init_embeddings(), init_vector_store(generation), init_keyword_index(generation)
+
+
+
 
 
+embedding_fn, chroma_db, keyword_index = init_knowledge_base()
 
 
+def topic_centroid():
+    """This session's running centroid of user messages (TOPIC_THRESHOLD and TOPIC_DECAY in the environment)."""
+    if "kb_topic" not in st.session_state:
+        st.session_state.kb_topic = TopicCentroid()
+    return st.session_state.kb_topic
 
-embedding_fn, chroma_db = init_knowledge_base()
 
+def list_sources():
+    """Books and articles a search can be scoped to."""
+    if isinstance(chroma_db, ShardedVectorStore):
+        return chroma_db.sources()
+    if not os.path.isdir(PDF_FOLDER):
+        return []
+    return sorted(os.path.splitext(name)[0] for name in os.listdir(PDF_FOLDER) if is_pdf(name))
 
-def normalize(vec):
-    return vec / np.linalg.norm(vec)
 
+def scope_search(sources):
+    """Search arguments restricting retrieval to the selected sources (none selected: everything)."""
+    if not sources:
+        return {}
+    # Sharded: only the selected books' shards are searched at all
+    if isinstance(chroma_db, ShardedVectorStore):
+        return {"sources": sources}
+    return {"filter": {"source": {"$in": sources}}}
 
-def is_same_context(previous_messages, new_query, threshold=0.7):
-    previous_text = "\n".join(msg["content"] for msg in previous_messages if msg["role"] == "user")
-    if not previous_text.strip():
-        return False
 
-    prev_emb = normalize(embedding_fn.embed_query(previous_text))
-    new_emb = normalize(embedding_fn.embed_query(new_query))
-    similarity = cosine_similarity([prev_emb], [new_emb])[0][0]
-    return similarity > threshold
+def retrieve(query, query_vector, k, sources):
+    """
+    Top-k chunks as (Document, score). Vector search by query_vector, fused by reciprocal
+    rank with a BM25 search for query's exact words (names, identifiers, terms) when the
+    keyword index exists.
+    """
+    search_kwargs = scope_search(sources)
+    if keyword_index is None:
+        return search_by_vector(chroma_db, query_vector, k, **search_kwargs)
 
+    candidates = max(HYBRID_CANDIDATES, k)
+    dense = search_by_vector(chroma_db, query_vector, candidates, **search_kwargs)
+    sparse = keyword_index.search(query, candidates, sources or None)
+    fused = reciprocal_rank_fusion([[doc.id for doc, _ in dense], [chunk_id for chunk_id, _ in sparse]])[:k]
+
+    # Chunks only the keyword search found are read from the vector store
+    documents = {doc.id: doc for doc, _ in dense}
+    missing = [chunk_id for chunk_id, _ in fused if chunk_id not in documents]
+    if missing:
+        documents.update((doc.id, doc) for doc in chroma_db.get_by_ids(missing))
+    return [(documents[chunk_id], score) for chunk_id, score in fused if chunk_id in documents]
+
+
+def diversify(results, query_vector, k):
+    """
+    The k chunks to send out of over-fetched results: neighbouring slices of the same page
+    are collapsed into the best one and, with DIVERSITY=mmr, the rest are picked by maximal
+    marginal relevance over their stored vectors.
+    """
+    if DIVERSITY == DIVERSITY_NONE:
+        return results[:k]
+    results = collapse_overlapping(results)
+    if DIVERSITY != DIVERSITY_MMR or len(results) <= k:
+        return results[:k]
+    vectors = stored_vectors(chroma_db, [doc.id for doc, _ in results])
+    return [results[i] for i in mmr(query_vector, vectors, k)]
 
-def get_chat_history():
-    """Get user-only messages as a merged query string."""
-    user_msgs = [m for m in st.session_state.kb_messages if m["role"] == "user"]
-    return "\n".join(m["content"] for m in user_msgs), user_msgs
 
 def build_sources_chroma(results):
     """Format retrieved sources nicely."""
@@ -83,7 +189,16 @@ def build_response_content(sources):
     return content
 
 def render_knowledge_base_mode():
+    global embedding_fn, chroma_db, keyword_index
+    # Picks up the chunks of ingestion runs finished since the last rerun
+    embedding_fn, chroma_db, keyword_index = init_knowledge_base()
     st.info("💬 Chat with the Knowledge Base")
+    if isinstance(chroma_db, ServingVectorStore) and not chroma_db.published:
+        # Searches find nothing until then; the first generation is picked up without a restart
+        st.warning(
+            f"No index generation has been published in {SERVING_PATH} yet. Run "
+            "`python population/createvectordatabase.py --vector-store numpy --publish` to publish one."
+        )
     
     # Initialize session state variables
     if "pdf_to_open" not in st.session_state:
@@ -93,6 +208,8 @@ def render_knowledge_base_mode():
     if "buttons_citations" not in st.session_state:
         st.session_state.buttons_citations = []
 
+    selected_sources = st.multiselect("📚 Search only in", list_sources(), key="kb_sources", placeholder="All books and articles")
+
     # Handle PDF viewer FIRST (before displaying messages)
     if st.session_state.pdf_to_open:
         pdf_info = st.session_state.pdf_to_open
@@ -158,19 +275,40 @@ def render_knowledge_base_mode():
             st.markdown(prompt)
 
         try:
-            # Merge past user messages + new prompt for context
-            merged_query, user_msgs = get_chat_history()
-            merged_query += "\n" + prompt
-
-            # If new topic detected → clear context
-            if not is_same_context(user_msgs, prompt):
-                merged_query = prompt
-                st.session_state.kb_messages = [m for m in st.session_state.kb_messages if m["role"] != "user"]
+            # The only embedding of the turn; the conversation so far is the running centroid
+            prompt_vector = np.asarray(embedding_fn.embed_query(prompt), dtype=np.float32)
+            topic = topic_centroid()
+
+            # If new topic detected → clear context, keeping the prompt that starts the new one
+            if topic.is_new_topic(prompt_vector, TOPIC_THRESHOLD):
+                topic.reset()
+                st.session_state.kb_messages = [m for m in st.session_state.kb_messages[:-1] if m["role"] != "user"]
+                st.session_state.kb_messages.append({"role": "user", "content": prompt})
                 st.session_state.buttons_citations = []
                 st.info("Context history cleared - new topic detected.")
-
-            # Retrieve top 3 most relevant docs from Chroma
-            results = chroma_db.similarity_search_with_relevance_scores(merged_query, k=3)
+            topic.add(prompt_vector)
+
+            # Retrieve top 3 most relevant docs, searching by the centroid of the conversation
+            # (mostly the new prompt) instead of re-embedding the merged messages, and by the
+            # prompt's own words in the keyword index
+            query_vector = topic.query_vector(np.linalg.norm(prompt_vector))
+            if RETRIEVAL_MODE == RETRIEVAL_RERANK:
+                # Over-fetch, then let the cross-encoder decide how many chunks are worth sending
+                started = time.perf_counter()
+                candidates = retrieve(prompt, query_vector, RERANK_CANDIDATES, selected_sources)
+                if DIVERSITY != DIVERSITY_NONE:
+                    # Overlapping slices would only compete for the same slots
+                    candidates = collapse_overlapping(candidates)
+                retrieval_ms = (time.perf_counter() - started) * 1000
+                reranker = init_reranker()
+                results = select_chunks(reranker.rerank(prompt, candidates))
+                st.caption(
+                    f"🔎 Retrieved {len(candidates)} chunks in {retrieval_ms:.0f} ms, reranked them in "
+                    f"{reranker.last_seconds * 1000:.0f} ms; sending {len(results)}"
+                )
+            else:
+                fetch = 3 if DIVERSITY == DIVERSITY_NONE else DIVERSITY_CANDIDATES
+                results = diversify(retrieve(prompt, query_vector, fetch, selected_sources), query_vector, 3)
             context_text = "\n\n---\n\n".join(doc.page_content for doc, _ in results)
 
             # Build prompt for the LLM
@@ -1,3 +1,4 @@
+import hashlib
 import json
 from pathlib import Path
 import re
@@ -13,8 +14,10 @@ import time
 sys.path.append("rag/")
 from utils.utils import  display_content_llm,call_openrouter_api
 from utils.prompt import  const
+from utils.pagecache import PageCache
 
 max_retries = 10
+PLAIN_TEXT_EXTRACTOR = f"plain/pymupdf-{fitz.VersionBind}"  # page.get_text(), what chapters are summarized from
 
 
 def sanitize_filename(title):
@@ -70,25 +73,47 @@ def summarize_text(text):
     response=call_openrouter_api(prompt)
     return response
 
-def extract_chapter_text(doc, start_page, end_page):
-    """Extract text between pages without file permission issues."""
-    text = ""
-    
-    # Use a context manager for the temporary file
-    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=True) as tmp_file:
-        tmp_path = tmp_file.name
-        
-        # Extract pages to temp file
-        new_doc = fitz.open()
-        new_doc.insert_pdf(doc, from_page=start_page, to_page=end_page)
-        new_doc.save(tmp_path)
-        new_doc.close()
-        
-        # Read text from temp file
-        with fitz.open(tmp_path) as chapter_doc:
-            text = "\n".join(page.get_text() or "" for page in chapter_doc)
-    
-    return text  # Temp file auto-deletes when 'with' block ends
+@st.cache_resource(show_spinner=False)
+def init_page_cache():
+    # The ingestion's page cache, under an extractor id of its own: summaries read plain page text
+    return PageCache()
+
+
+class BookPages:
+    """
+    Plain text of an uploaded book's pages. A book summarized before is read from the page
+    cache; otherwise each chapter's pages are extracted when it is summarized, and the book
+    is written to the cache at the end.
+    Args:
+        doc (fitz.Document): The open book
+        sha256 (str): Hash of the uploaded file
+        cache (PageCache): Where pages are looked up and written back
+    """
+
+    def __init__(self, doc, sha256, cache):
+        self.doc = doc
+        self.sha256 = sha256
+        self.cache = cache
+        cached = cache.get(sha256, PLAIN_TEXT_EXTRACTOR)
+        self.from_cache = cached is not None
+        self.texts = {page_num: text for page_num, (text, _) in enumerate(cached[0])} if cached else {}
+
+    def chapter_text(self, start_page, end_page):
+        """Text of pages start_page..end_page (0-based, inclusive)."""
+        page_nums = range(start_page, min(end_page, self.doc.page_count - 1) + 1)
+        for page_num in page_nums:
+            if page_num not in self.texts:
+                self.texts[page_num] = self.doc[page_num].get_text() or ""
+        return "\n".join(self.texts[page_num] for page_num in page_nums)
+
+    def save(self):
+        """Write the book to the cache, unless it came from there; pages no chapter covered are read now."""
+        if self.from_cache:
+            return
+        self.chapter_text(0, self.doc.page_count - 1)
+        pages = [(self.texts[page_num], {"page": page_num + 1}) for page_num in range(self.doc.page_count)]
+        self.cache.put(self.sha256, PLAIN_TEXT_EXTRACTOR, pages)
+        self.from_cache = True
 
 def save_summary_json(summary, base_name, title):
     """Save chapter summary as JSON file in databases/jsonnotes/"""
@@ -123,12 +148,14 @@ def render_sum_up_book_mode():
             tmp_path = tmp_file.name
             tmp_file.write(uploaded_file.getbuffer())
 
+        book = None
         try:
             doc = fitz.open(tmp_path)
             toc = doc.get_toc()
             if not toc:
                 st.error("The PDF does not contain TOC.")
                 return
+            book = BookPages(doc, hashlib.sha256(uploaded_file.getbuffer()).hexdigest(), init_page_cache())
                 
             chapter_summaries = []
             base_name = uploaded_file.name.replace(".pdf", "")
@@ -142,7 +169,7 @@ def render_sum_up_book_mode():
                     # Ensure end_page is not before start_page
                     end_page = max(start_page, end_page)
 
-                    chapter_text = extract_chapter_text(doc, start_page, end_page)
+                    chapter_text = book.chapter_text(start_page, end_page)
                     
                     if not chapter_text.strip():
                         st.warning(f"Skipping empty chapter: {title}")
@@ -205,6 +232,8 @@ def render_sum_up_book_mode():
                             st.error(f"Failed to generate final summary after {max_retries} attempts: {str(e)}")
 
         finally:
+            if book is not None:
+                book.save()
             doc.close()
             try:
                 os.remove(tmp_path)
@@ -0,0 +1,76 @@
+import os
+
+import numpy as np
+
+# Read from the environment by the knowledge base app
+DIVERSITY_NONE = "none"
+DIVERSITY_COLLAPSE = "collapse"  # Drop chunks overlapping a better one on the same page
+DIVERSITY_MMR = "mmr"  # Collapse, then pick by maximal marginal relevance
+DIVERSITY = os.getenv("DIVERSITY", DIVERSITY_COLLAPSE)
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))  # 1.0 ranks by relevance only, 0.0 by novelty only
+
+DIVERSITY_CANDIDATES = 20  # Chunks retrieved to pick the final ones from
+
+
+def chunk_span(document):
+    """(file, page, start, end) of a chunk, or None if its metadata does not say where it is."""
+    metadata = document.metadata or {}
+    start = metadata.get("start_index")
+    if start is None:
+        return None
+    return metadata.get("file_path"), metadata.get("page"), start, start + len(document.page_content)
+
+
+def collapse_overlapping(results):
+    """
+    Drop every chunk whose character range overlaps a better-ranked chunk of the same page
+    (neighbouring slices share CHUNK_OVERLAP characters), keeping the order of the rest.
+    Args:
+        results (list): (Document, score) pairs, best first
+    """
+    kept, spans = [], []
+    for document, score in results:
+        span = chunk_span(document)
+        if span is not None and any(
+            span[:2] == other[:2] and span[2] < other[3] and other[2] < span[3] for other in spans
+        ):
+            continue
+        kept.append((document, score))
+        if span is not None:
+            spans.append(span)
+    return kept
+
+
+def stored_vectors(store, ids):
+    """The vectors the store holds for ids, in the same order, without embedding anything."""
+    found = store.get(ids=list(ids), include=["embeddings"])
+    by_id = dict(zip(found["ids"], found["embeddings"]))
+    return np.asarray([by_id[chunk_id] for chunk_id in ids], dtype=np.float32)
+
+
+def mmr(query_vector, vectors, k, lambda_mult=MMR_LAMBDA):
+    """
+    Maximal marginal relevance: repeatedly pick the candidate with the best trade-off between
+    similarity to the query and dissimilarity to those already picked. All similarities are
+    computed in one matrix product; each pick is then an O(n) update.
+    Returns:
+        list: Indices of the picked vectors, in pick order
+    """
+    if not len(vectors):
+        return []
+    vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    query = np.asarray(query_vector, dtype=np.float32)
+    relevance = vectors @ (query / np.linalg.norm(query))
+    similarity = vectors @ vectors.T
+
+    picked = [int(np.argmax(relevance))]
+    redundancy = similarity[picked[0]].copy()  # Highest similarity of each candidate to a picked one
+    available = np.ones(len(vectors), dtype=bool)
+    available[picked[0]] = False
+    while len(picked) < min(k, len(vectors)):
+        scores = np.where(available, lambda_mult * relevance - (1 - lambda_mult) * redundancy, -np.inf)
+        best = int(np.argmax(scores))
+        picked.append(best)
+        available[best] = False
+        np.maximum(redundancy, similarity[best], out=redundancy)
+    return picked
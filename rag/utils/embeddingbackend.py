@@ -0,0 +1,115 @@
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+BACKEND_TORCH = "torch"
+BACKEND_ONNX = "onnx"
+EMBEDDING_BACKENDS = (BACKEND_TORCH, BACKEND_ONNX)
+
+# Selected through the environment (or .env) by the knowledge base app
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", BACKEND_TORCH)
+ONNX_MODEL_PATH = os.getenv("ONNX_MODEL_PATH", "databases/models/all-MiniLM-L6-v2-onnx-int8")
+
+# Files written by population/exportonnxmodel.py
+ONNX_MODEL_FILE = "model.onnx"
+ONNX_TOKENIZER_FILE = "tokenizer.json"
+ONNX_CONFIG_FILE = "embeddingconfig.json"
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    Sentence embeddings from an exported (and usually int8-quantized) ONNX transformer.
+    Reproduces the sentence-transformers pipeline: tokenize, run the encoder, mean-pool
+    the token vectors over the attention mask and, if the source model did, L2-normalize.
+    Only onnxruntime and tokenizers are needed at runtime, not torch.
+    Args:
+        model_path (str): Directory written by population/exportonnxmodel.py
+        threads (int | None): Intra-op threads; None lets onnxruntime use every core
+        batch_size (int): Texts per inference call
+    """
+
+    def __init__(self, model_path=ONNX_MODEL_PATH, threads=None, batch_size=64):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        model_path = Path(model_path)
+        if not (model_path / ONNX_MODEL_FILE).exists():
+            raise FileNotFoundError(
+                f"No ONNX model in {model_path}; export one with: python population/exportonnxmodel.py"
+            )
+        self.config = json.loads((model_path / ONNX_CONFIG_FILE).read_text(encoding="utf-8"))
+        self.batch_size = batch_size
+
+        self.tokenizer = Tokenizer.from_file(str(model_path / ONNX_TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(max_length=self.config["max_length"])
+        self.tokenizer.enable_padding(pad_id=self.config["pad_id"], pad_token=self.config["pad_token"])
+
+        options = onnxruntime.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        self.session = onnxruntime.InferenceSession(
+            str(model_path / ONNX_MODEL_FILE), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+    def _encode(self, texts):
+        encodings = self.tokenizer.encode_batch(texts)
+        ids = np.array([encoding.ids for encoding in encodings], dtype=np.int64)
+        mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+        feed = {"input_ids": ids, "attention_mask": mask, "token_type_ids": np.zeros_like(ids)}
+        hidden = self.session.run(None, {name: value for name, value in feed.items() if name in self.input_names})[0]
+
+        weights = mask[..., None].astype(np.float32)
+        vectors = (hidden * weights).sum(axis=1) / np.maximum(weights.sum(axis=1), 1e-9)
+        if self.config["normalize"]:
+            vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        return vectors
+
+    def embed_documents(self, texts):
+        if not texts:
+            return []
+        # Batch texts of similar length together so little compute goes into padding
+        order = sorted(range(len(texts)), key=lambda index: len(texts[index]))
+        vectors = np.empty((len(texts), self.config["dimensions"]), dtype=np.float32)
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            vectors[batch] = self._encode([texts[index] for index in batch])
+        return vectors.tolist()
+
+    def embed_query(self, text):
+        return self._encode([text])[0].tolist()
+
+
+def load_embeddings(backend=EMBEDDING_BACKEND, model_name="all-MiniLM-L6-v2", onnx_path=ONNX_MODEL_PATH,
+                    threads=None, batch_size=64):
+    """
+    Build the embedding model for a backend.
+    Args:
+        backend (str): "torch" (sentence-transformers through HuggingFaceEmbeddings) or "onnx"
+        model_name (str): HuggingFace model name, used by the torch backend
+        onnx_path (str): Exported model directory, used by the onnx backend
+        threads (int | None): Thread cap for the onnx backend
+        batch_size (int): Encoding batch size
+    Returns:
+        Embeddings: A LangChain embeddings object
+    """
+    if backend == BACKEND_ONNX:
+        return OnnxEmbeddings(onnx_path, threads, batch_size)
+    if backend == BACKEND_TORCH:
+        from langchain_huggingface import HuggingFaceEmbeddings
+        return HuggingFaceEmbeddings(model_name=model_name, encode_kwargs={"batch_size": batch_size})
+    raise ValueError(f"Unknown embedding backend {backend!r}, expected one of {EMBEDDING_BACKENDS}")
+
+
+def embedding_model_id(backend=EMBEDDING_BACKEND, model_name="all-MiniLM-L6-v2", onnx_path=ONNX_MODEL_PATH):
+    """
+    Name the embedding cache keys its vectors by. The quantized model's vectors are close
+    to, but not the same as, the PyTorch ones, so each backend gets its own cache entries.
+    """
+    if backend == BACKEND_ONNX:
+        return f"{model_name}@onnx:{Path(onnx_path).name}"
+    return model_name
@@ -0,0 +1,147 @@
+import hashlib
+import sqlite3
+import threading
+import time
+import unicodedata
+from pathlib import Path
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+EMBEDDING_CACHE_PATH = "databases/embeddingcache.sqlite3"
+EMBEDDING_CACHE_MAX_ENTRIES = 1_000_000  # ~770 MB for 384-dim float16 vectors
+
+
+def normalize_text(text):
+    """Normalize text so trivially different spellings of the same chunk share a cache entry."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class EmbeddingCache:
+    """
+    Persistent embedding cache keyed by (model, kind, normalized text hash).
+    Vectors are stored as float16 blobs in SQLite; once the cache grows past
+    max_entries the least recently used entries are evicted.
+    """
+
+    def __init__(self, db_path=EMBEDDING_CACHE_PATH, max_entries=EMBEDDING_CACHE_MAX_ENTRIES):
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # Shared by the Streamlit threads and the ingestion stages, and possibly by
+        # several processes at once, hence WAL and a generous busy timeout
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+            # The entry count is kept by triggers, in the same transaction as every write from any
+            # process, so eviction never works from a stale count. Triggers first: rows another
+            # process inserts before the counter row exists are included in its initial COUNT(*)
+            self.conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            self.conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS embeddings_inserted AFTER INSERT ON embeddings "
+                "BEGIN UPDATE counters SET value = value + 1 WHERE name = 'embeddings'; END"
+            )
+            self.conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS embeddings_deleted AFTER DELETE ON embeddings "
+                "BEGIN UPDATE counters SET value = value - 1 WHERE name = 'embeddings'; END"
+            )
+            self.conn.execute("INSERT OR IGNORE INTO counters (name, value) SELECT 'embeddings', COUNT(*) FROM embeddings")
+
+    def _count(self):
+        return self.conn.execute("SELECT value FROM counters WHERE name = 'embeddings'").fetchone()[0]
+
+    @staticmethod
+    def key(model_name, kind, text):
+        return hashlib.sha256(f"{model_name}\0{kind}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys):
+        """Return {key: float32 vector} for the keys that are cached, refreshing their LRU time."""
+        found = {}
+        with self.lock:
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                for key, blob in self.conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ):
+                    found[key] = np.frombuffer(blob, dtype=np.float16).astype(np.float32)
+            if found:
+                now = time.time()
+                with self.conn:
+                    self.conn.executemany(
+                        "UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, key) for key in found]
+                    )
+            self.hits += sum(1 for key in keys if key in found)
+            self.misses += sum(1 for key in keys if key not in found)
+        return found
+
+    def put_many(self, items):
+        """Store (key, vector) pairs as float16 and evict the oldest entries if over the limit."""
+        now = time.time()
+        rows = [(key, np.asarray(vector, dtype=np.float16).tobytes(), now) for key, vector in items]
+        with self.lock, self.conn:
+            self.conn.executemany("INSERT OR IGNORE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows)
+            # The insert holds the write lock until commit, so the count includes every other writer's rows
+            overflow = self._count() - self.max_entries
+            if overflow > 0:
+                deleted = self.conn.execute(
+                    "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (overflow,),
+                ).rowcount
+                self.evictions += deleted
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        with self.lock:
+            entries = self._count()
+        return {
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def close(self):
+        self.conn.close()
+
+
+class CachedEmbeddings(Embeddings):
+    """LangChain Embeddings wrapper that serves repeated texts from an EmbeddingCache."""
+
+    def __init__(self, embeddings, model_name, cache):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.cache = cache
+
+    def _embed(self, texts, kind, embed_fn):
+        keys = [self.cache.key(self.model_name, kind, text) for text in texts]
+        found = self.cache.get_many(keys)
+
+        # Embed each distinct missing text once, even if it repeats within the batch
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                missing.setdefault(key, text)
+        if missing:
+            vectors = embed_fn(list(missing.values()))
+            self.cache.put_many(zip(missing, vectors))
+            # Round through float16 so results do not depend on whether they were cached
+            for key, vector in zip(missing, vectors):
+                found[key] = np.asarray(vector, dtype=np.float16).astype(np.float32)
+
+        return [found[key].tolist() for key in keys]
+
+    def embed_documents(self, texts):
+        return self._embed(texts, "document", self.embeddings.embed_documents)
+
+    def embed_query(self, text):
+        return self._embed([text], "query", lambda texts: [self.embeddings.embed_query(texts[0])])[0]
@@ -0,0 +1,34 @@
+import json
+import os
+import time
+from pathlib import Path
+
+# Bumped by every ingestion run that changed the index; the app reopens its vector store when it changes
+INDEX_GENERATION_PATH = os.getenv("INDEX_GENERATION_PATH", "databases/indexgeneration.json")
+
+
+def read_index_generation(path=INDEX_GENERATION_PATH):
+    """The current index generation, 0 if no ingestion run has recorded one yet."""
+    try:
+        return json.loads(Path(path).read_text(encoding="utf-8"))["generation"]
+    except (OSError, ValueError, KeyError):
+        return 0
+
+
+def bump_index_generation(path=INDEX_GENERATION_PATH, **details):
+    """
+    Record that the index changed. The file is replaced atomically, so readers never see
+    a half-written one.
+    Returns:
+        int: The new generation
+    """
+    generation = read_index_generation(path) + 1
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    staging = path.with_name(f"{path.name}.tmp")
+    staging.write_text(
+        json.dumps({"generation": generation, "updated_at": time.strftime("%Y-%m-%dT%H:%M:%S"), **details}),
+        encoding="utf-8",
+    )
+    os.replace(staging, path)
+    return generation
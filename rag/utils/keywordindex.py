@@ -0,0 +1,448 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import unicodedata
+import uuid
+from array import array
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+# Read from the environment by the knowledge base app
+KEYWORD_INDEX_PATH = os.getenv("KEYWORD_INDEX_PATH", "databases/keywordindex")
+
+BM25_K1 = 1.2  # Term frequency saturation
+BM25_B = 0.75  # Document length normalization
+MAX_DF_FRACTION = 0.5  # Query terms in more than this share of the chunks are skipped (near-zero weight, longest postings)
+RRF_K = 60  # Reciprocal rank fusion constant: higher flattens the difference between ranks
+GENERATIONS_KEPT = 2  # Built generations kept on disk, so readers can finish with the previous one
+MAX_SEGMENTS = 8  # Past this many segments, all but the largest are merged into one
+MAX_DELETED_FRACTION = 0.2  # Past this share of deleted chunks, every segment is merged without them
+MAX_PENDING_CHUNKS = 100_000  # A run adding more chunks than this rebuilds the index from the vector store instead
+CURRENT_FILE = "CURRENT"
+
+# A segment is an immutable inverted index over the chunks one update added
+TERMS_FILE = "terms.npy"  # Sorted 64-bit term hashes
+OFFSETS_FILE = "offsets.npy"  # Start of each term's postings, plus the end
+DOCS_FILE = "docs.npy"  # Postings: chunk numbers, grouped by term
+FREQUENCIES_FILE = "frequencies.npy"  # Postings: occurrences of the term in the chunk
+LENGTHS_FILE = "lengths.npy"  # Tokens in each chunk number
+IDS_FILE = "ids.npy"  # Chunk id of each chunk number
+SOURCES_FILE = "sources.npy"  # Source number of each chunk number
+INFO_FILE = "info.json"
+# A generation lists its segments and, per segment, which of its chunk numbers were deleted since
+DELETED_FILE = "deleted-{}.npy"
+
+# Words, numbers and identifiers such as "x86-64", "v1.2" or "O'Brien", which are also split into their parts
+TOKEN_PATTERN = re.compile(r"\w+(?:[-_.'’]\w+)*")
+PART_PATTERN = re.compile(r"[^\W_]+")
+
+
+def tokenize(text):
+    tokens = []
+    for token in TOKEN_PATTERN.findall(unicodedata.normalize("NFKC", text).casefold()):
+        tokens.append(token)
+        parts = PART_PATTERN.findall(token)
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+
+def term_hashes(terms):
+    return np.array([int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little") for term in terms], dtype=np.uint64)
+
+
+def _new_name():
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+
+
+def _tokenize_chunks(chunks):
+    """
+    Postings of (chunk id, text, metadata) triples as parallel (term hash, chunk number,
+    frequency) arrays, plus each chunk's length, id and source number, and the source names.
+    """
+    vocabulary = {}
+    terms, docs, frequencies = array("I"), array("I"), array("I")
+    lengths, chunk_ids, chunk_sources = array("I"), [], array("I")
+    sources = {}
+    for number, (chunk_id, text, metadata) in enumerate(chunks):
+        tokens = tokenize(text or "")
+        for term, frequency in Counter(tokens).items():
+            terms.append(vocabulary.setdefault(term, len(vocabulary)))
+            docs.append(number)
+            frequencies.append(frequency)
+        lengths.append(len(tokens))
+        chunk_ids.append(chunk_id)
+        chunk_sources.append(sources.setdefault((metadata or {}).get("source", "Unknown"), len(sources)))
+
+    hashes = term_hashes(vocabulary)[np.frombuffer(terms, dtype=np.uint32)]
+    return (
+        hashes, np.frombuffer(docs, dtype=np.uint32), np.frombuffer(frequencies, dtype=np.uint32),
+        np.frombuffer(lengths, dtype=np.uint32), chunk_ids, np.frombuffer(chunk_sources, dtype=np.uint32), list(sources),
+    )
+
+
+def _write_segment(root, hashes, docs, frequencies, lengths, ids, sources, source_names):
+    """
+    Write postings given as parallel (term hash, chunk number, frequency) arrays as a new
+    segment under root. Terms are looked up by hash with a binary search, so the vocabulary
+    is never stored.
+    Returns:
+        str: The segment's name
+    """
+    order = np.lexsort((docs, hashes))
+    terms, starts = np.unique(hashes[order], return_index=True)
+
+    segments = Path(root) / "segments"
+    segments.mkdir(parents=True, exist_ok=True)
+    name = _new_name()
+    staging = segments / f".{name}"
+    staging.mkdir()
+    np.save(staging / TERMS_FILE, terms.astype(np.uint64))
+    np.save(staging / OFFSETS_FILE, np.append(starts, len(order)).astype(np.int64))
+    np.save(staging / DOCS_FILE, np.asarray(docs, dtype=np.uint32)[order])
+    np.save(staging / FREQUENCIES_FILE, np.asarray(frequencies, dtype=np.uint32)[order])
+    np.save(staging / LENGTHS_FILE, np.asarray(lengths, dtype=np.uint32))
+    np.save(staging / IDS_FILE, np.array(ids, dtype=np.bytes_) if len(ids) else np.empty(0, dtype="S1"))
+    np.save(staging / SOURCES_FILE, np.asarray(sources, dtype=np.uint32))
+    info = {
+        "documents": len(lengths), "terms": len(terms), "postings": len(order),
+        "total_length": int(np.sum(lengths, dtype=np.int64)), "sources": source_names,
+    }
+    (staging / INFO_FILE).write_text(json.dumps(info), encoding="utf-8")
+    staging.rename(segments / name)
+    return name
+
+
+def _merge_segments(root, segments, deleted):
+    """
+    Write the chunks of several segments that are not deleted as one new segment.
+    Args:
+        segments (list[_Segment]): Segments to merge
+        deleted (dict): Segment name -> mask of its deleted chunk numbers
+    Returns:
+        str: The merged segment's name
+    """
+    hashes, docs, frequencies, lengths, ids, sources = [], [], [], [], [], []
+    source_names = {}
+    base = 0
+    for segment in segments:
+        live = ~np.asarray(deleted[segment.name]) if segment.name in deleted else np.ones(len(segment), dtype=bool)
+        numbers = np.cumsum(live) - 1 + base  # Chunk number in the merged segment
+        segment_docs = np.asarray(segment.docs)
+        keep = live[segment_docs]
+        hashes.append(np.repeat(np.asarray(segment.terms), np.diff(segment.offsets))[keep])
+        docs.append(numbers[segment_docs[keep]])
+        frequencies.append(np.asarray(segment.frequencies)[keep])
+        lengths.append(np.asarray(segment.lengths)[live])
+        ids.append(np.asarray(segment.ids)[live])
+        remap = np.array([source_names.setdefault(source, len(source_names)) for source in segment.info["sources"]], dtype=np.uint32)
+        sources.append(remap[np.asarray(segment.sources)[live]])
+        base += int(live.sum())
+    return _write_segment(
+        root, np.concatenate(hashes), np.concatenate(docs), np.concatenate(frequencies), np.concatenate(lengths),
+        np.concatenate(ids), np.concatenate(sources), list(source_names),
+    )
+
+
+def _publish(root, names, deleted, k1, b, keep):
+    """
+    Write a generation over the named segments, minus their deleted chunks, and make it the
+    current one; generations past the last `keep` go, with the segments only they used.
+    Returns:
+        Path: The new generation's directory
+    """
+    root = Path(root)
+    documents = total_length = 0
+    for name in names:
+        segment = _Segment(root / "segments" / name)
+        mask = deleted.get(name)
+        documents += len(segment) - (int(mask.sum()) if mask is not None else 0)
+        total_length += segment.info["total_length"] - (int(np.sum(segment.lengths[mask], dtype=np.int64)) if mask is not None else 0)
+
+    generations = root / "generations"
+    generations.mkdir(parents=True, exist_ok=True)
+    name = _new_name()
+    staging = generations / f".{name}"
+    staging.mkdir()
+    for segment_name, mask in deleted.items():
+        if segment_name in names and mask.any():
+            np.save(staging / DELETED_FILE.format(segment_name), mask)
+    info = {
+        "segments": names, "documents": documents, "average_length": total_length / documents if documents else 0.0,
+        "k1": k1, "b": b, "generation": name,
+    }
+    (staging / INFO_FILE).write_text(json.dumps(info), encoding="utf-8")
+
+    staging.rename(generations / name)
+    # Readers only ever see a complete generation: the pointer is swapped atomically
+    pointer = root / f"{CURRENT_FILE}.tmp"
+    pointer.write_text(name, encoding="utf-8")
+    os.replace(pointer, root / CURRENT_FILE)
+
+    built = sorted(
+        (path for path in generations.iterdir() if not path.name.startswith(".")), key=lambda path: path.stat().st_mtime_ns
+    )
+    # Windows refuses to delete files a reader still maps; they go on the next update
+    for old in built[:-keep]:
+        shutil.rmtree(old, ignore_errors=True)
+    used = {
+        segment_name for path in built[-keep:]
+        for segment_name in json.loads((path / INFO_FILE).read_text(encoding="utf-8"))["segments"]
+    }
+    for segment in (root / "segments").iterdir():
+        if not segment.name.startswith(".") and segment.name not in used:
+            shutil.rmtree(segment, ignore_errors=True)
+    return generations / name
+
+
+def build_keyword_index(chunks, root=KEYWORD_INDEX_PATH, keep=GENERATIONS_KEPT, k1=BM25_K1, b=BM25_B):
+    """
+    Build a BM25 inverted index over (chunk id, text, metadata) triples as a single segment
+    in a new generation under root, and make it the current one.
+    Returns:
+        Path: The new generation's directory
+    """
+    return _publish(root, [_write_segment(root, *_tokenize_chunks(chunks))], {}, k1, b, keep)
+
+
+def current_keyword_index(root=KEYWORD_INDEX_PATH):
+    """The current generation under root, opened read-only, or None if none was built."""
+    pointer = Path(root) / CURRENT_FILE
+    if not pointer.exists():
+        return None
+    return KeywordIndex(Path(root) / "generations" / pointer.read_text(encoding="utf-8").strip())
+
+
+class KeywordIndexWriter:
+    """
+    Keeps the keyword index in step with an ingestion run without rebuilding it: the chunks
+    the run added become a new segment, and the ones it deleted are masked out of the
+    segments holding them. Segments are merged once there are too many of them or too much
+    of them is deleted. With no index yet, or more than max_pending chunks added, the
+    index is rebuilt from the vector store instead.
+    Args:
+        root (str): Directory of the index
+        max_pending (int): Added chunks held in memory until commit
+    """
+
+    def __init__(self, root=KEYWORD_INDEX_PATH, max_pending=MAX_PENDING_CHUNKS):
+        self.root = Path(root)
+        self.max_pending = max_pending
+        self.lock = threading.Lock()  # Chunks are added and deleted from several pipeline stages
+        self.added = {}  # Chunk id -> (text, metadata)
+        self.deleted = set()
+        self.overflowed = False
+        # What the last commit did
+        self.rebuilt = False
+        self.chunks_added = self.chunks_deleted = self.segments_merged = 0
+
+    def add(self, chunks):
+        """Record (chunk id, text, metadata) triples written to the vector store."""
+        with self.lock:
+            if self.overflowed:
+                return
+            for chunk_id, text, metadata in chunks:
+                self.added[chunk_id] = (text, metadata)
+            if len(self.added) > self.max_pending:
+                self.overflowed = True
+                self.added.clear()
+
+    def delete(self, ids):
+        """Record chunk ids deleted from the vector store."""
+        with self.lock:
+            for chunk_id in ids:
+                self.added.pop(chunk_id, None)
+                self.deleted.add(chunk_id)
+
+    def commit(self, chunk_count, read_chunks, keep=GENERATIONS_KEPT, k1=BM25_K1, b=BM25_B):
+        """
+        Publish the recorded changes as a new generation.
+        Args:
+            chunk_count (int): Chunks now in the vector store; an index that would not hold
+                as many is out of step (e.g. after an interrupted run) and is rebuilt
+            read_chunks (callable): Returns every (chunk id, text, metadata) in the vector store
+        Returns:
+            Path | None: The new generation, None if the index was already up to date
+        """
+        with self.lock:
+            added, deleted, overflowed = self.added, self.deleted, self.overflowed
+            self.added, self.deleted, self.overflowed = {}, set(), False
+        self.chunks_added = self.chunks_deleted = self.segments_merged = 0
+
+        current = current_keyword_index(self.root)
+        self.rebuilt = current is None or overflowed
+        if not self.rebuilt:
+            # Chunks added again under an id they already had replace their earlier copy
+            replaced = np.array(sorted(deleted | added.keys()), dtype=np.bytes_)
+            masks = {}
+            for segment, mask in zip(current.segments, current.deleted):
+                mask = np.zeros(len(segment), dtype=bool) if mask is None else np.array(mask)
+                if len(replaced):
+                    removed = np.isin(segment.ids, replaced) & ~mask
+                    self.chunks_deleted += int(removed.sum())
+                    mask |= removed
+                masks[segment.name] = mask
+            self.chunks_added = len(added)
+            if not self.chunks_added and not self.chunks_deleted and len(current) == chunk_count:
+                return None
+            self.rebuilt = len(current) - self.chunks_deleted + self.chunks_added != chunk_count
+
+        if self.rebuilt:
+            self.chunks_added = self.chunks_deleted = 0
+            return build_keyword_index(read_chunks(), self.root, keep, k1, b)
+
+        names = [segment.name for segment in current.segments]
+        if added:
+            names.append(_write_segment(
+                self.root, *_tokenize_chunks((chunk_id, text, metadata) for chunk_id, (text, metadata) in added.items())
+            ))
+        names = self._compact(names, masks)
+        return _publish(self.root, names, masks, k1, b, keep)
+
+    def _compact(self, names, masks):
+        """Merge segments if there are too many or too much of them is deleted; returns the segment names left."""
+        segments = [_Segment(self.root / "segments" / name) for name in names]
+        documents = sum(len(segment) for segment in segments)
+        deleted = sum(int(mask.sum()) for mask in masks.values())
+        if documents and deleted > MAX_DELETED_FRACTION * documents:
+            merged = segments
+        elif len(segments) > MAX_SEGMENTS:
+            merged = sorted(segments, key=len)[:-1]
+        else:
+            return names
+        merged_name = _merge_segments(self.root, merged, masks)
+        self.segments_merged = len(merged)
+        for segment in merged:
+            masks.pop(segment.name, None)
+        return [name for name in names if name not in {segment.name for segment in merged}] + [merged_name]
+
+
+class _Segment:
+    """One segment's memory-mapped arrays."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.name = self.path.name
+        self.info = json.loads((self.path / INFO_FILE).read_text(encoding="utf-8"))
+        load = lambda file: np.load(self.path / file, mmap_mode="r")
+        self.terms, self.offsets = load(TERMS_FILE), load(OFFSETS_FILE)
+        self.docs, self.frequencies = load(DOCS_FILE), load(FREQUENCIES_FILE)
+        self.lengths, self.ids, self.sources = load(LENGTHS_FILE), load(IDS_FILE), load(SOURCES_FILE)
+        self.source_numbers = {source: number for number, source in enumerate(self.info["sources"])}
+
+    def __len__(self):
+        return self.info["documents"]
+
+    def postings(self, hashes):
+        """(query term number, chunk numbers, frequencies) for each of the hashed terms found here."""
+        if not len(self.terms):
+            return
+        positions = np.minimum(np.searchsorted(self.terms, hashes), len(self.terms) - 1)
+        for term, (position, hit) in enumerate(zip(positions, self.terms[positions] == hashes)):
+            if hit:
+                start, end = int(self.offsets[position]), int(self.offsets[position + 1])
+                yield term, np.asarray(self.docs[start:end]), np.asarray(self.frequencies[start:end], dtype=np.float32)
+
+
+class KeywordIndex:
+    """
+    Read-only BM25 index of one generation: its segments, minus the chunks deleted from them
+    since. Every array is memory-mapped: opening it reads little more than the info files,
+    and a query touches only the postings of its own terms. Document frequencies and lengths
+    are those of the generation's chunks, so scores match an index built from scratch.
+    Args:
+        path (str): Generation directory written by build_keyword_index or KeywordIndexWriter
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.info = json.loads((self.path / INFO_FILE).read_text(encoding="utf-8"))
+        self.segments = [_Segment(self.path.parent.parent / "segments" / name) for name in self.info["segments"]]
+        self.deleted = [
+            np.load(self.path / DELETED_FILE.format(segment.name), mmap_mode="r")
+            if (self.path / DELETED_FILE.format(segment.name)).exists() else None
+            for segment in self.segments
+        ]
+        # Chunk numbers across segments: each segment's are offset by the chunks before it
+        self.bases = np.cumsum([0] + [len(segment) for segment in self.segments], dtype=np.int64)
+
+    def __len__(self):
+        return self.info["documents"]
+
+    def search(self, query, k=10, sources=None):
+        """
+        Top-k chunks for query by BM25, as (chunk id, score), best first.
+        Args:
+            query (str): Text to search for
+            k (int): Chunks to return
+            sources (list[str] | None): Only search the chunks of these sources
+        """
+        counts = Counter(tokenize(query))
+        if not counts or not len(self):
+            return []
+        hashes = term_hashes(counts)
+        repeats = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+
+        postings = []  # (query term number, segment number, chunk numbers, frequencies)
+        for number, (segment, deleted) in enumerate(zip(self.segments, self.deleted)):
+            for term, docs, frequencies in segment.postings(hashes):
+                if deleted is not None:
+                    live = ~deleted[docs]
+                    docs, frequencies = docs[live], frequencies[live]
+                if len(docs):
+                    postings.append((term, number, docs, frequencies))
+        if not postings:
+            return []
+
+        document_frequency = np.zeros(len(hashes))
+        for term, _, docs, _ in postings:
+            document_frequency[term] += len(docs)
+        selective = [posting for posting in postings if document_frequency[posting[0]] <= MAX_DF_FRACTION * len(self)]
+        postings = selective or postings  # A query of only very common terms still gets an answer
+        idf = np.log1p((len(self) - document_frequency + 0.5) / (document_frequency + 0.5))
+
+        k1, b, average_length = self.info["k1"], self.info["b"], max(self.info["average_length"], 1e-9)
+        keys, weights = [], []
+        for term, number, docs, frequencies in postings:
+            segment = self.segments[number]
+            if sources is not None:
+                wanted = [segment.source_numbers[source] for source in sources if source in segment.source_numbers]
+                keep = np.isin(segment.sources[docs], wanted)
+                docs, frequencies = docs[keep], frequencies[keep]
+            norm = k1 * (1 - b + b * segment.lengths[docs] / average_length)
+            weights.append(repeats[term] * idf[term] * frequencies * (k1 + 1) / (frequencies + norm))
+            keys.append(self.bases[number] + docs)
+        keys, weights = np.concatenate(keys), np.concatenate(weights)
+        if not len(keys):
+            return []
+
+        unique, inverse = np.unique(keys, return_inverse=True)
+        scores = np.bincount(inverse, weights=weights)
+        top = np.argpartition(-scores, min(k, len(scores)) - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        results = []
+        for i in top:
+            number = int(np.searchsorted(self.bases, unique[i], side="right")) - 1
+            chunk_id = self.segments[number].ids[unique[i] - self.bases[number]]
+            results.append((chunk_id.decode("utf-8"), float(scores[i])))
+        return results
+
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """
+    Fuse ranked lists of ids into one: each id scores the sum of 1 / (k + rank) over the
+    lists it appears in, so ids that several retrievers rank high come first.
+    Returns:
+        list: (id, score) pairs, best first
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, 1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
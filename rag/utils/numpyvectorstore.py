@@ -0,0 +1,750 @@
+import json
+import math
+import os
+import sqlite3
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+VECTOR_STORE_CHROMA = "chroma"
+VECTOR_STORE_NUMPY = "numpy"
+VECTOR_STORE_SERVING = "serving"  # Read-only, published generations of the NumPy index
+VECTOR_STORES = (VECTOR_STORE_CHROMA, VECTOR_STORE_NUMPY)
+
+# Selected through the environment by the knowledge base app
+VECTOR_STORE = os.getenv("VECTOR_STORE", VECTOR_STORE_CHROMA)
+NUMPY_INDEX_PATH = os.getenv("NUMPY_INDEX_PATH", "databases/numpyindex")
+SERVING_PATH = os.getenv("NUMPY_SERVING_PATH", "databases/numpyserving")
+
+VECTORS_FILE = "vectors.npy"
+NORMS_FILE = "norms.npy"
+CENTROIDS_FILE = "centroids.npy"
+METADATA_FILE = "metadata.sqlite3"
+ASSIGNMENTS_FILE = "assignments.npy"  # Published generations: IVF list of each row
+CURRENT_FILE = "CURRENT"  # Published generations: name of the one to serve
+
+# How the first-pass copy of the vectors is stored; the float32 vectors.npy is always kept
+STORAGE_FLOAT32 = "float32"
+STORAGE_FLOAT16 = "float16"
+STORAGE_INT8 = "int8"
+STORAGES = (STORAGE_FLOAT32, STORAGE_FLOAT16, STORAGE_INT8)
+RESCORE_FACTOR = 10  # Compressed storage: candidates per result re-scored with the float32 vectors
+
+INITIAL_CAPACITY = 1024  # Rows allocated when the vector file is created; it doubles when full
+NPROBE = 8  # IVF lists scanned per query
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE = 100_000  # Vectors the IVF centroids are trained on
+BLOCK_ROWS = 16_384  # Rows processed at once when assigning vectors to IVF lists or publishing
+SCAN_BLOCK_ROWS = 1024  # Compressed rows widened to float32 at once; small enough to stay in cache
+GENERATIONS_KEPT = 2  # Published generations kept on disk, so readers can finish with the previous one
+RELOAD_CHECK_SECONDS = 2.0  # How often serving processes look for a newer generation
+
+_OPERATORS = {"$eq": "=", "$ne": "!=", "$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+
+
+def where_to_sql(where):
+    """
+    Translate a Chroma-style metadata filter into a SQL condition over the metadata column.
+    Supports {"field": value}, {"field": {"$op": value}} with $eq, $ne, $gt, $gte, $lt, $lte,
+    $in and $nin, and nested {"$and": [...]} / {"$or": [...]}.
+    Returns:
+        tuple: (SQL condition, parameters)
+    """
+    if not where:
+        return "1", []
+    clauses, params = [], []
+    for key, value in where.items():
+        if key in ("$and", "$or"):
+            parts = [where_to_sql(part) for part in value]
+            clauses.append("(" + f" {key[1:].upper()} ".join(sql for sql, _ in parts) + ")")
+            params.extend(param for _, part_params in parts for param in part_params)
+            continue
+
+        conditions = value if isinstance(value, dict) else {"$eq": value}
+        for operator, operand in conditions.items():
+            field = "json_extract(metadata, ?)"
+            params.append(f'$."{key}"')
+            if operator in ("$in", "$nin"):
+                negate = "NOT " if operator == "$nin" else ""
+                clauses.append(f"{field} {negate}IN ({','.join('?' * len(operand))})")
+                params.extend(operand)
+            elif operator in _OPERATORS:
+                clauses.append(f"{field} {_OPERATORS[operator]} ?")
+                params.append(operand)
+            else:
+                raise ValueError(f"Unsupported filter operator {operator!r}")
+    return "(" + " AND ".join(clauses) + ")", params
+
+
+def quantize_int8(vectors):
+    """Symmetric per-row int8 quantization: vector ~= codes * scale."""
+    scales = np.abs(vectors).max(axis=1) / 127
+    scales[scales == 0] = 1.0
+    codes = np.round(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    Vector store kept in a memory-mapped float32 matrix (vectors.npy) plus a SQLite table
+    with each row's id, text and metadata. Search is an exact, vectorized scan; once
+    train_ivf() has been run, queries only scan the nprobe closest IVF lists.
+    With float16 or int8 storage the scan reads a compressed copy of the vectors (half or a
+    quarter of the bytes) and the best k * rescore candidates are re-scored exactly from the
+    float32 vectors, which stay on disk and are only paged in for those candidates.
+    Distances and relevance scores follow Chroma's defaults (squared L2, 1 - d / sqrt(2)), so
+    it can replace langchain_chroma.Chroma in similarity_search_with_relevance_scores.
+    It also offers the Chroma collection calls ingestion uses: upsert, get, delete and count.
+    Args:
+        path (str): Index directory
+        embedding_function (Embeddings | None): Used to embed queries and added texts
+        nprobe (int): IVF lists scanned per query
+        storage (str | None): "float32", "float16" or "int8"; None keeps the index's current
+            storage. Switching rebuilds the compressed copy from the float32 vectors
+        rescore (int): Candidates per result re-scored exactly with compressed storage; 0 disables
+        read_only (bool): Open a published generation (see publish) without write access
+    """
+
+    def __init__(self, path=NUMPY_INDEX_PATH, embedding_function=None, nprobe=NPROBE, storage=None,
+                 rescore=RESCORE_FACTOR, read_only=False):
+        self.path = Path(path)
+        self.embedding_function = embedding_function
+        self.nprobe = nprobe
+        self.rescore = rescore
+        self.read_only = read_only
+        # Shared by the ingestion stages (and the app's sessions), hence one lock for everything
+        self.lock = threading.RLock()
+
+        if read_only:
+            # Generations never change once published, so SQLite can skip locking altogether
+            uri = f"{(self.path / METADATA_FILE).resolve().as_uri()}?mode=ro&immutable=1"
+            self.conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            self.storage = self.conn.execute("SELECT value FROM info WHERE key = 'storage'").fetchone()[0]
+            self._load_published()
+            return
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(self.path / METADATA_FILE, check_same_thread=False, timeout=30)
+        with self.lock, self.conn:
+            self.conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS chunks (
+                    row INTEGER PRIMARY KEY,
+                    id TEXT UNIQUE NOT NULL,
+                    document TEXT,
+                    metadata TEXT NOT NULL,
+                    list INTEGER
+                )
+                """
+            )
+            self.conn.execute("CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            stored = self.conn.execute("SELECT value FROM info WHERE key = 'storage'").fetchone()
+            self.storage = storage or (stored[0] if stored else STORAGE_FLOAT32)
+            if self.storage not in STORAGES:
+                raise ValueError(f"Unknown storage {self.storage!r}, expected one of {STORAGES}")
+            self.conn.execute("INSERT OR REPLACE INTO info (key, value) VALUES ('storage', ?)", (self.storage,))
+        self._load()
+
+    def _layout(self, dimensions):
+        """(attribute, file, dtype, row shape) of the arrays kept next to vectors.npy."""
+        layout = [("sq_norms", NORMS_FILE, np.float32, ())]
+        if self.storage != STORAGE_FLOAT32:
+            layout.append(("compressed", f"vectors-{self.storage}.npy", np.dtype(self.storage), (dimensions,)))
+        if self.storage == STORAGE_INT8:
+            layout.append(("scales", "scales-int8.npy", np.float32, ()))
+        return layout
+
+    def _load(self):
+        vectors_path = self.path / VECTORS_FILE
+        self.vectors = np.load(vectors_path, mmap_mode="r+") if vectors_path.exists() else None
+        self.sq_norms = self.compressed = self.scales = None
+        capacity = len(self.vectors) if self.vectors is not None else 0
+
+        rows, lists = [], []
+        for row, ivf_list in self.conn.execute("SELECT row, list FROM chunks WHERE row < ?", (capacity,)):
+            rows.append(row)
+            lists.append(-1 if ivf_list is None else ivf_list)
+        self.active = np.zeros(capacity, dtype=bool)
+        self.active[rows] = True
+        self.assignments = np.full(capacity, -1, dtype=np.int32)
+        self.assignments[rows] = lists
+        self.size = max(rows) + 1 if rows else 0  # Rows in use, including deleted ones
+        self.free_rows = np.flatnonzero(~self.active[:self.size]).tolist()
+
+        # Left over from before a storage switch
+        for storage in STORAGES:
+            if storage != self.storage:
+                (self.path / f"vectors-{storage}.npy").unlink(missing_ok=True)
+        if self.storage != STORAGE_INT8:
+            (self.path / "scales-int8.npy").unlink(missing_ok=True)
+
+        if self.vectors is not None:
+            missing = False
+            for attribute, file, dtype, shape in self._layout(self.vectors.shape[1]):
+                if not (self.path / file).exists():
+                    np.lib.format.open_memmap(self.path / file, mode="w+", dtype=dtype, shape=(capacity, *shape)).flush()
+                    missing = True
+                setattr(self, attribute, np.load(self.path / file, mmap_mode="r+"))
+            if missing:
+                # Norms and compressed copy are derived from the float32 vectors
+                for start in range(0, self.size, BLOCK_ROWS):
+                    block = slice(start, min(start + BLOCK_ROWS, self.size))
+                    self._write_derived(block, np.asarray(self.vectors[block]))
+                self._flush()
+
+        centroids_path = self.path / CENTROIDS_FILE
+        self.centroids = np.load(centroids_path) if centroids_path.exists() else None
+        self.lists = None  # Rows grouped by IVF list, rebuilt after changes
+
+    def _load_published(self):
+        """
+        Map a published generation read-only. Every array is a shared mapping of the files,
+        so any number of processes serving it share one copy through the page cache.
+        """
+        self.size = int(self.conn.execute("SELECT value FROM info WHERE key = 'rows'").fetchone()[0])
+        self.vectors = self.sq_norms = self.compressed = self.scales = None
+        if self.size:
+            self.vectors = np.load(self.path / VECTORS_FILE, mmap_mode="r")
+            for attribute, file, _, _ in self._layout(self.vectors.shape[1]):
+                setattr(self, attribute, np.load(self.path / file, mmap_mode="r"))
+        # Generations are compacted: every row is live
+        self.active = np.ones(self.size, dtype=bool)
+        self.free_rows = []
+
+        centroids_path = self.path / CENTROIDS_FILE
+        self.centroids = np.load(centroids_path) if centroids_path.exists() else None
+        self.lists = None
+        if self.centroids is not None:
+            # Rows were written grouped by IVF list, so each list is one contiguous range
+            self.assignments = np.load(self.path / ASSIGNMENTS_FILE, mmap_mode="r")
+            bounds = np.searchsorted(self.assignments, np.arange(len(self.centroids) + 1))
+            self.lists = (np.arange(self.size), bounds)
+
+    def _check_writable(self):
+        if self.read_only:
+            raise PermissionError(f"{self.path} is a published, read-only generation")
+
+    # Collection-style API, as used by population/createvectordatabase.py
+
+    def upsert(self, ids, embeddings, documents=None, metadatas=None):
+        self._check_writable()
+        if len(set(ids)) != len(ids):
+            raise ValueError("Duplicate ids in upsert")
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        documents = documents or [None] * len(ids)
+        metadatas = metadatas or [{}] * len(ids)
+        with self.lock:
+            existing = dict(self._select("SELECT id, row FROM chunks WHERE id IN ({})", ids))
+            rows = [existing[chunk_id] if chunk_id in existing else self._allocate_row() for chunk_id in ids]
+            self._ensure_capacity(max(rows) + 1, embeddings.shape[1])
+
+            # Vectors reach the disk before the rows that point at them are committed
+            self.vectors[rows] = embeddings
+            self._write_derived(rows, embeddings)
+            self._flush()
+            lists = self._nearest_centroids(embeddings) if self.centroids is not None else np.full(len(rows), -1)
+            self.assignments[rows] = lists
+            self.active[rows] = True
+            self.lists = None
+
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO chunks (row, id, document, metadata, list) VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (row, chunk_id, document, json.dumps(metadata), None if ivf_list < 0 else int(ivf_list))
+                        for row, chunk_id, document, metadata, ivf_list in zip(rows, ids, documents, metadatas, lists)
+                    ],
+                )
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=("documents", "metadatas")):
+        """Chroma-style get: {"ids": [...], "documents": [...], "metadatas": [...], "embeddings": ...}."""
+        condition, params = where_to_sql(where)
+        query = f"SELECT row, id, document, metadata FROM chunks WHERE {condition}"
+        with self.lock:
+            if ids is not None:
+                found = {
+                    entry[1]: entry
+                    for entry in self._select(f"SELECT row, id, document, metadata FROM chunks WHERE id IN ({{}}) AND {condition}", ids, params)
+                }
+                entries = [found[chunk_id] for chunk_id in ids if chunk_id in found]
+            else:
+                query += " ORDER BY row LIMIT ? OFFSET ?"
+                entries = self.conn.execute(query, params + [-1 if limit is None else limit, offset or 0]).fetchall()
+
+            result = {"ids": [entry[1] for entry in entries]}
+            if "documents" in include:
+                result["documents"] = [entry[2] for entry in entries]
+            if "metadatas" in include:
+                result["metadatas"] = [json.loads(entry[3]) for entry in entries]
+            if "embeddings" in include:
+                result["embeddings"] = np.asarray(self.vectors[[entry[0] for entry in entries]]) if entries else []
+        return result
+
+    def delete(self, ids=None, where=None, **kwargs):
+        self._check_writable()
+        with self.lock:
+            if ids is not None:
+                rows = [row for (row,) in self._select("SELECT row FROM chunks WHERE id IN ({})", ids)]
+            elif where:
+                condition, params = where_to_sql(where)
+                rows = [row for (row,) in self.conn.execute(f"SELECT row FROM chunks WHERE {condition}", params)]
+            else:
+                return
+            with self.conn:
+                self.conn.executemany("DELETE FROM chunks WHERE row = ?", [(row,) for row in rows])
+            self.active[rows] = False
+            self.free_rows.extend(rows)
+            self.lists = None
+
+    def count(self):
+        with self.lock:
+            return int(self.active.sum())
+
+    def _select(self, query, values, params=(), batch_size=500):
+        """Run a query with an `IN ({})` placeholder over values, in batches."""
+        entries = []
+        for start in range(0, len(values), batch_size):
+            batch = list(values[start:start + batch_size])
+            entries.extend(self.conn.execute(query.format(",".join("?" * len(batch))), batch + list(params)))
+        return entries
+
+    def _allocate_row(self):
+        if self.free_rows:
+            return self.free_rows.pop()
+        self.size += 1
+        return self.size - 1
+
+    def _write_derived(self, rows, embeddings):
+        """Update the norms and the compressed copy of rows whose float32 vectors changed."""
+        self.sq_norms[rows] = np.einsum("ij,ij->i", embeddings, embeddings)
+        if self.storage == STORAGE_FLOAT16:
+            self.compressed[rows] = embeddings.astype(np.float16)
+        elif self.storage == STORAGE_INT8:
+            self.compressed[rows], self.scales[rows] = quantize_int8(embeddings)
+
+    def _flush(self):
+        for array in (self.vectors, self.sq_norms, self.compressed, self.scales):
+            if array is not None:
+                array.flush()
+
+    def _ensure_capacity(self, rows, dimensions):
+        if self.vectors is not None and self.vectors.shape[1] != dimensions:
+            raise ValueError(f"Index holds {self.vectors.shape[1]}-dim vectors, got {dimensions}-dim ones")
+        capacity = len(self.vectors) if self.vectors is not None else 0
+        if rows <= capacity:
+            return
+
+        new_capacity = max(rows, 2 * capacity, INITIAL_CAPACITY)
+        for attribute, file, dtype, shape in [("vectors", VECTORS_FILE, np.float32, (dimensions,))] + self._layout(dimensions):
+            self._grow(attribute, file, dtype, shape, new_capacity)
+
+        extra = new_capacity - capacity
+        self.active = np.concatenate([self.active, np.zeros(extra, dtype=bool)])
+        self.assignments = np.concatenate([self.assignments, np.full(extra, -1, dtype=np.int32)])
+
+    def _grow(self, attribute, file, dtype, shape, capacity):
+        """Copy a memory-mapped array into a larger file and swap it in."""
+        grown_path = self.path / f"{file}.tmp"
+        grown = np.lib.format.open_memmap(grown_path, mode="w+", dtype=dtype, shape=(capacity, *shape))
+        old = getattr(self, attribute)
+        if old is not None:
+            grown[:len(old)] = old
+        grown.flush()
+        del grown, old
+        setattr(self, attribute, None)  # Windows will not replace a file that is still mapped
+        os.replace(grown_path, self.path / file)
+        setattr(self, attribute, np.load(self.path / file, mmap_mode="r+"))
+
+    # IVF
+
+    def train_ivf(self, nlist=None, iterations=KMEANS_ITERATIONS, sample_size=KMEANS_SAMPLE, seed=0):
+        """
+        Cluster the vectors with k-means into nlist lists (default: sqrt of the row count)
+        and assign every row to its closest centroid. Rows added later join the closest
+        existing list; retrain once the index has grown a lot.
+        """
+        self._check_writable()
+        with self.lock:
+            rows = np.flatnonzero(self.active[:self.size])
+            if not len(rows):
+                return
+            nlist = min(nlist or max(1, round(math.sqrt(len(rows)))), len(rows))
+            rng = np.random.default_rng(seed)
+            sample = np.sort(rng.choice(rows, min(len(rows), sample_size), replace=False))
+            data = np.asarray(self.vectors[sample])
+
+            centroids = data[rng.choice(len(data), nlist, replace=False)].copy()
+            for _ in range(iterations):
+                nearest = self._nearest_centroids(data, centroids)
+                counts = np.bincount(nearest, minlength=nlist)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, nearest, data)
+                filled = counts > 0  # Empty lists keep their previous centroid
+                centroids[filled] = sums[filled] / counts[filled, None]
+
+            self.centroids = centroids
+            np.save(self.path / f"{CENTROIDS_FILE}.tmp.npy", centroids)
+            os.replace(self.path / f"{CENTROIDS_FILE}.tmp.npy", self.path / CENTROIDS_FILE)
+            for start in range(0, len(rows), BLOCK_ROWS):
+                block = rows[start:start + BLOCK_ROWS]
+                self.assignments[block] = self._nearest_centroids(np.asarray(self.vectors[block]))
+            with self.conn:
+                self.conn.executemany(
+                    "UPDATE chunks SET list = ? WHERE row = ?",
+                    [(int(self.assignments[row]), int(row)) for row in rows],
+                )
+                self.conn.execute("INSERT OR REPLACE INTO info (key, value) VALUES ('ivf_trained_rows', ?)", (str(len(rows)),))
+            self.lists = None
+
+    def ivf_needs_training(self, growth=2.0):
+        """True if there is no IVF index yet, or the index has grown `growth` times since training."""
+        row = self.conn.execute("SELECT value FROM info WHERE key = 'ivf_trained_rows'").fetchone()
+        return self.centroids is None or not row or self.count() > growth * int(row[0])
+
+    def _nearest_centroids(self, data, centroids=None):
+        centroids = self.centroids if centroids is None else centroids
+        distances = np.einsum("ij,ij->i", centroids, centroids)[None, :] - 2 * data @ centroids.T
+        return distances.argmin(axis=1).astype(np.int32)
+
+    def _probe(self, vector):
+        """Rows in the nprobe IVF lists closest to the vector."""
+        if self.lists is None:
+            rows = np.flatnonzero(self.active[:self.size] & (self.assignments[:self.size] >= 0))
+            order = np.argsort(self.assignments[rows], kind="stable")
+            rows = rows[order]
+            bounds = np.searchsorted(self.assignments[rows], np.arange(len(self.centroids) + 1))
+            self.lists = (rows, bounds)
+        rows, bounds = self.lists
+        distances = np.einsum("ij,ij->i", self.centroids, self.centroids) - 2 * self.centroids @ vector
+        probed = np.argsort(distances)[:self.nprobe]
+        return np.concatenate([rows[bounds[ivf_list]:bounds[ivf_list + 1]] for ivf_list in probed])
+
+    # Search
+
+    def _dots(self, selection, vector, exact=False):
+        """Dot products of the query with a slice or an array of rows, from the first-pass copy."""
+        if self.storage == STORAGE_FLOAT32 or exact:
+            return self.vectors[selection] @ vector
+
+        count = selection.stop - selection.start if isinstance(selection, slice) else len(selection)
+        dots = np.empty(count, dtype=np.float32)
+        # Block by block, so each block is only widened to float32 while it is in cache
+        for start in range(0, count, SCAN_BLOCK_ROWS):
+            end = min(start + SCAN_BLOCK_ROWS, count)
+            if isinstance(selection, slice):
+                block = slice(selection.start + start, selection.start + end)
+            else:
+                block = selection[start:end]
+            dots[start:end] = self.compressed[block].astype(np.float32) @ vector
+        if self.storage == STORAGE_INT8:
+            dots *= self.scales[selection]
+        return dots
+
+    def _search(self, vector, k, filter=None, exact=False):
+        """
+        Top-k rows as (Document, squared L2 distance). exact=True bypasses the IVF lists and
+        the compressed copy; it is the reference measure_recall compares against.
+        """
+        vector = np.asarray(vector, dtype=np.float32)
+        with self.lock:
+            if self.vectors is None:
+                return []
+            candidates = None
+            if filter:
+                condition, params = where_to_sql(filter)
+                candidates = np.array(
+                    [row for (row,) in self.conn.execute(f"SELECT row FROM chunks WHERE {condition}", params)], dtype=np.int64
+                )
+                candidates = candidates[candidates < self.size]
+            if self.centroids is not None and self.nprobe and not exact:
+                probed = self._probe(vector)
+                if candidates is not None:
+                    probed = np.intersect1d(probed, candidates, assume_unique=True)
+                # Too few rows in the probed lists: fall back to an exact scan
+                if len(probed) >= k:
+                    candidates = probed
+
+            if candidates is None:
+                rows = np.flatnonzero(self.active[:self.size])
+                # Every row is live: scan one contiguous range instead of gathering rows
+                selection = slice(0, self.size) if len(rows) == self.size else rows
+            else:
+                rows = selection = np.sort(candidates)
+            if not len(rows):
+                return []
+            distances = self.sq_norms[selection] - 2 * self._dots(selection, vector, exact)
+
+            if self.storage != STORAGE_FLOAT32 and self.rescore and not exact:
+                shortlist = min(k * self.rescore, len(rows))
+                shortlist = np.sort(np.argpartition(distances, shortlist - 1)[:shortlist])
+                rows = rows[shortlist]
+                distances = self.sq_norms[rows] - 2 * (self.vectors[rows] @ vector)
+            distances = np.maximum(distances + vector @ vector, 0.0)
+
+            k = min(k, len(rows))
+            top = np.argpartition(distances, k - 1)[:k]
+            top = top[np.argsort(distances[top])]
+            found = {
+                row: (chunk_id, document, metadata)
+                for row, chunk_id, document, metadata in self._select(
+                    "SELECT row, id, document, metadata FROM chunks WHERE row IN ({})", [int(rows[i]) for i in top]
+                )
+            }
+        results = []
+        for i in top:
+            chunk_id, document, metadata = found[int(rows[i])]
+            results.append((Document(id=chunk_id, page_content=document or "", metadata=json.loads(metadata)), float(distances[i])))
+        return results
+
+    # Publishing
+
+    def publish(self, root=SERVING_PATH, keep=GENERATIONS_KEPT):
+        """
+        Write a compacted, read-only copy of the index as a new generation under root and make
+        it the current one. Serving processes (ServingVectorStore) switch to it on their next
+        query; the previous generations stay on disk until `keep` newer ones exist.
+        Returns:
+            Path: The new generation's directory
+        """
+        self._check_writable()
+        root = Path(root)
+        generations = root / "generations"
+        generations.mkdir(parents=True, exist_ok=True)
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        staging = generations / f".{name}"
+
+        with self.lock:
+            rows = np.flatnonzero(self.active[:self.size])
+            if self.centroids is not None:
+                # Group rows by IVF list so that probing a list reads one contiguous range
+                rows = rows[np.argsort(self.assignments[rows], kind="stable")]
+            staging.mkdir()
+
+            if len(rows):
+                dimensions = self.vectors.shape[1]
+                for attribute, file, dtype, shape in [("vectors", VECTORS_FILE, np.float32, (dimensions,))] + self._layout(dimensions):
+                    source = getattr(self, attribute)
+                    target = np.lib.format.open_memmap(staging / file, mode="w+", dtype=dtype, shape=(len(rows), *shape))
+                    for start in range(0, len(rows), BLOCK_ROWS):
+                        target[start:start + BLOCK_ROWS] = source[rows[start:start + BLOCK_ROWS]]
+                    target.flush()
+                    del target
+            if self.centroids is not None:
+                np.save(staging / CENTROIDS_FILE, self.centroids)
+                np.save(staging / ASSIGNMENTS_FILE, self.assignments[rows])
+
+            # Row numbers follow the new order
+            new_row = np.empty(self.size, dtype=np.int64)
+            new_row[rows] = np.arange(len(rows))
+            published = sqlite3.connect(staging / METADATA_FILE)
+            with published:
+                published.execute(
+                    "CREATE TABLE chunks (row INTEGER PRIMARY KEY, id TEXT UNIQUE NOT NULL, document TEXT, metadata TEXT NOT NULL, list INTEGER)"
+                )
+                published.execute("CREATE TABLE info (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+                published.executemany(
+                    "INSERT INTO chunks (row, id, document, metadata, list) VALUES (?, ?, ?, ?, ?)",
+                    (
+                        (int(new_row[row]), chunk_id, document, metadata, ivf_list)
+                        for row, chunk_id, document, metadata, ivf_list in self.conn.execute(
+                            "SELECT row, id, document, metadata, list FROM chunks"
+                        )
+                    ),
+                )
+                published.executemany(
+                    "INSERT INTO info (key, value) VALUES (?, ?)",
+                    [("storage", self.storage), ("rows", str(len(rows))), ("generation", name)],
+                )
+            published.close()
+
+        staging.rename(generations / name)
+        # Readers only ever see a complete generation: the pointer is swapped atomically
+        pointer = root / f"{CURRENT_FILE}.tmp"
+        pointer.write_text(name, encoding="utf-8")
+        os.replace(pointer, root / CURRENT_FILE)
+
+        published = sorted(
+            (path for path in generations.iterdir() if not path.name.startswith(".")), key=lambda path: path.stat().st_mtime_ns
+        )
+        for old in published[:-keep]:
+            # Windows refuses to delete files a reader still maps; they go on the next publish
+            shutil.rmtree(old, ignore_errors=True)
+        return generations / name
+
+    # Reporting
+
+    def footprint(self):
+        """MB each full scan reads (first-pass copy plus norms) against the float32 vectors."""
+        dimensions = self.vectors.shape[1] if self.vectors is not None else 0
+        row_bytes = {STORAGE_FLOAT32: 4 * dimensions, STORAGE_FLOAT16: 2 * dimensions, STORAGE_INT8: dimensions + 4}
+        return {
+            "storage": self.storage,
+            "scanned_mb": self.size * (row_bytes[self.storage] + 4) / 2**20,
+            "full_precision_mb": self.size * (4 * dimensions + 4) / 2**20,
+        }
+
+    def measure_recall(self, k=3, queries=100, noise=0.05, seed=0):
+        """
+        recall@k of the configured search (IVF lists, compressed storage) against an exact
+        float32 scan, with perturbed copies of stored vectors as queries.
+        """
+        rng = np.random.default_rng(seed)
+        with self.lock:
+            rows = np.flatnonzero(self.active[:self.size])
+            if not len(rows):
+                return None
+            picked = np.asarray(self.vectors[np.sort(rng.choice(rows, min(queries, len(rows)), replace=False))])
+        picked = picked + rng.normal(scale=noise * np.abs(picked).mean(), size=picked.shape).astype(np.float32)
+
+        hits = 0.0
+        for vector in picked:
+            found = {document.id for document, _ in self._search(vector, k)}
+            expected = [document.id for document, _ in self._search(vector, k, exact=True)]
+            hits += len(found.intersection(expected)) / len(expected)
+        return hits / len(picked)
+
+    # LangChain VectorStore API
+
+    @property
+    def embeddings(self):
+        return self.embedding_function
+
+    def _select_relevance_score_fn(self):
+        return self._euclidean_relevance_score_fn
+
+    def similarity_search_with_score(self, query, k=4, filter=None, **kwargs):
+        return self._search(self.embedding_function.embed_query(query), k, filter)
+
+    def similarity_search(self, query, k=4, filter=None, **kwargs):
+        return [document for document, _ in self.similarity_search_with_score(query, k, filter)]
+
+    def similarity_search_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        return [document for document, _ in self._search(embedding, k, filter)]
+
+    def similarity_search_by_vector_with_score(self, embedding, k=4, filter=None, **kwargs):
+        return self._search(embedding, k, filter)
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        texts = list(texts)
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+        self.upsert(ids, self.embedding_function.embed_documents(texts), texts, metadatas)
+        return ids
+
+    def get_by_ids(self, ids):
+        found = self.get(ids=list(ids))
+        return [
+            Document(id=chunk_id, page_content=document or "", metadata=metadata)
+            for chunk_id, document, metadata in zip(found["ids"], found["documents"], found["metadatas"])
+        ]
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, ids=None, path=NUMPY_INDEX_PATH, **kwargs):
+        store = cls(path, embedding, **kwargs)
+        store.add_texts(texts, metadatas, ids)
+        return store
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+            self.vectors = self.sq_norms = self.compressed = self.scales = None
+
+
+def current_generation(root=SERVING_PATH):
+    """Directory of the generation currently published under root, or None."""
+    pointer = Path(root) / CURRENT_FILE
+    if not pointer.exists():
+        return None
+    return Path(root) / "generations" / pointer.read_text(encoding="utf-8").strip()
+
+
+class ServingVectorStore(VectorStore):
+    """
+    Read-only view of the generation currently published under root. Meant for running the
+    app in several processes: they all map the same generation files, so the page cache
+    holds one copy of the index for all of them. Every RELOAD_CHECK_SECONDS a query checks
+    whether a newer generation was published and, if so, switches to it; searches already
+    running finish on the generation they started with. Until a first generation is
+    published the store is empty and checks for one on every query.
+    Args:
+        root (str): Folder NumpyVectorStore.publish writes generations to
+        embedding_function (Embeddings): Used to embed queries
+        nprobe (int): IVF lists scanned per query
+        check_interval (float): Seconds between checks for a newer generation
+    """
+
+    def __init__(self, root=SERVING_PATH, embedding_function=None, nprobe=NPROBE, check_interval=RELOAD_CHECK_SECONDS):
+        self.root = Path(root)
+        self.embedding_function = embedding_function
+        self.nprobe = nprobe
+        self.check_interval = check_interval
+        self.lock = threading.Lock()
+        self.generation = None
+        self.store = None
+        self.checked_at = 0.0
+        self._current()
+
+    def _current(self):
+        """The store of the current generation, switching to a newer one if it was published; None before the first."""
+        now = time.monotonic()
+        if self.store is not None and now - self.checked_at < self.check_interval:
+            return self.store
+        with self.lock:
+            self.checked_at = now
+            generation = current_generation(self.root)
+            if generation is not None and generation != self.generation:
+                # The old store is closed by garbage collection once in-flight searches drop it
+                self.store = NumpyVectorStore(generation, self.embedding_function, self.nprobe, read_only=True)
+                self.generation = generation
+        return self.store
+
+    @property
+    def embeddings(self):
+        return self.embedding_function
+
+    @property
+    def published(self):
+        """Whether a generation has been published to serve from."""
+        return self._current() is not None
+
+    def _select_relevance_score_fn(self):
+        return self._euclidean_relevance_score_fn
+
+    def similarity_search_with_score(self, query, k=4, filter=None, **kwargs):
+        return self.similarity_search_by_vector_with_score(self.embedding_function.embed_query(query), k, filter)
+
+    def similarity_search(self, query, k=4, filter=None, **kwargs):
+        return [document for document, _ in self.similarity_search_with_score(query, k, filter)]
+
+    def similarity_search_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        return [document for document, _ in self.similarity_search_by_vector_with_score(embedding, k, filter)]
+
+    def similarity_search_by_vector_with_score(self, embedding, k=4, filter=None, **kwargs):
+        store = self._current()
+        return store._search(embedding, k, filter) if store is not None else []
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=("documents", "metadatas")):
+        store = self._current()
+        if store is None:
+            return {"ids": [], **{field: [] for field in include}}
+        return store.get(ids, where, limit, offset, include)
+
+    def get_by_ids(self, ids):
+        store = self._current()
+        return store.get_by_ids(ids) if store is not None else []
+
+    def count(self):
+        store = self._current()
+        return store.count() if store is not None else 0
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        raise PermissionError("The serving index is read-only; ingest into the NumPy index and publish it")
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, **kwargs):
+        raise PermissionError("The serving index is read-only; ingest into the NumPy index and publish it")
@@ -0,0 +1,109 @@
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+
+PAGE_CACHE_PATH = "databases/pagecache.sqlite3"
+PAGE_CACHE_MAX_DOCUMENTS = 10_000  # PDFs kept; the least recently used ones are evicted past this
+
+# Set per file on read, so one entry serves the same PDF wherever it lives
+LOCATION_KEYS = ("file_path", "source")
+
+
+class PageCache:
+    """
+    Persistent cache of extracted PDF pages, keyed by the PDF's content hash and by the
+    extractor (mode and library versions) that produced them. Shared by the ingestion and
+    the app, so a PDF is parsed once whichever of them sees it first. Page texts are stored
+    zlib-compressed in SQLite, one row per page.
+    """
+
+    def __init__(self, db_path=PAGE_CACHE_PATH, max_documents=PAGE_CACHE_MAX_DOCUMENTS):
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.max_documents = max_documents
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        # Written by the ingestion while the app reads it, hence WAL and a generous busy timeout
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS documents ("
+                "sha256 TEXT NOT NULL, extractor TEXT NOT NULL, page_count INTEGER NOT NULL, report TEXT, "
+                "last_used REAL NOT NULL, PRIMARY KEY (sha256, extractor))"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                "sha256 TEXT NOT NULL, extractor TEXT NOT NULL, page INTEGER NOT NULL, text BLOB NOT NULL, "
+                "metadata TEXT NOT NULL, PRIMARY KEY (sha256, extractor, page))"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS documents_last_used ON documents (last_used)")
+
+    def get(self, sha256, extractor, file_path=None):
+        """
+        Return (pages, report) for a cached PDF, or None. pages are (text, metadata) pairs in
+        page order; file_path, if given, is set in their metadata as the extractor would have.
+        """
+        with self.lock:
+            document = self.conn.execute(
+                "SELECT page_count, report FROM documents WHERE sha256 = ? AND extractor = ?", (sha256, extractor)
+            ).fetchone()
+            if document is None:
+                self.misses += 1
+                return None
+            rows = self.conn.execute(
+                "SELECT text, metadata FROM pages WHERE sha256 = ? AND extractor = ? ORDER BY page", (sha256, extractor)
+            ).fetchall()
+            with self.conn:
+                self.conn.execute(
+                    "UPDATE documents SET last_used = ? WHERE sha256 = ? AND extractor = ?", (time.time(), sha256, extractor)
+                )
+            self.hits += 1
+
+        pages = []
+        for text, metadata in rows:
+            metadata = json.loads(metadata)
+            if file_path is not None:
+                metadata["file_path"] = str(file_path)
+                metadata["source"] = Path(file_path).stem
+            pages.append((zlib.decompress(text).decode("utf-8"), metadata))
+        return pages, json.loads(document[1]) if document[1] else None
+
+    def put(self, sha256, extractor, pages, report=None):
+        """Store a PDF's extracted (text, metadata) pages and evict the oldest PDFs if over the limit."""
+        rows = [
+            (
+                sha256, extractor, number, zlib.compress(text.encode("utf-8")),
+                json.dumps({key: value for key, value in metadata.items() if key not in LOCATION_KEYS}),
+            )
+            for number, (text, metadata) in enumerate(pages)
+        ]
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM pages WHERE sha256 = ? AND extractor = ?", (sha256, extractor))
+            self.conn.executemany(
+                "INSERT INTO pages (sha256, extractor, page, text, metadata) VALUES (?, ?, ?, ?, ?)", rows
+            )
+            # Written last, in the same transaction: a document row means every page is there
+            self.conn.execute(
+                "INSERT OR REPLACE INTO documents (sha256, extractor, page_count, report, last_used) VALUES (?, ?, ?, ?, ?)",
+                (sha256, extractor, len(pages), json.dumps(report) if report is not None else None, time.time()),
+            )
+
+            count = self.conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+            if count > self.max_documents:
+                evicted = self.conn.execute(
+                    "SELECT sha256, extractor FROM documents ORDER BY last_used LIMIT ?", (count - self.max_documents,)
+                ).fetchall()
+                self.conn.executemany("DELETE FROM pages WHERE sha256 = ? AND extractor = ?", evicted)
+                self.conn.executemany("DELETE FROM documents WHERE sha256 = ? AND extractor = ?", evicted)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0}
+
+    def close(self):
+        self.conn.close()
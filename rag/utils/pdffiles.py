@@ -0,0 +1,12 @@
+from pathlib import Path
+
+
+# The one definition of which files are PDFs, shared by the ingestion, its watch mode and the app
+def is_pdf(name):
+    """Whether a file name is a PDF of the library (the extension in any case, as on Windows)."""
+    return name.lower().endswith(".pdf")
+
+
+def list_pdfs(folder):
+    """The PDFs in the folder, sorted."""
+    return sorted(path for path in Path(folder).iterdir() if path.is_file() and is_pdf(path.name))
@@ -0,0 +1,73 @@
+import math
+import os
+
+import numpy as np
+
+# Read from the environment by the knowledge base app
+TOPIC_THRESHOLD = float(os.getenv("TOPIC_THRESHOLD", "0.7"))  # At or below this similarity to the conversation, a prompt starts a new topic
+TOPIC_DECAY = float(os.getenv("TOPIC_DECAY", "0.5"))  # Weight left to earlier messages at each new one; 1.0 is a plain running mean
+
+
+class TopicCentroid:
+    """
+    Running centroid of a conversation's user messages: an exponentially decayed sum of
+    their normalized embeddings. Each turn embeds only the new prompt; checking it against
+    the conversation and updating the centroid are O(d), however long the conversation is.
+    The centroid, weighted towards the latest messages, is also what retrieval searches by.
+    Args:
+        decay (float): Weight left to the earlier messages each time one is added
+    """
+
+    def __init__(self, decay=TOPIC_DECAY):
+        self.decay = decay
+        self.total = None
+        self.messages = 0
+
+    def similarity(self, vector):
+        """Cosine similarity between vector and the conversation so far, None before any message."""
+        if self.total is None:
+            return None
+        return cosine(self.total, vector)
+
+    def is_new_topic(self, vector, threshold=TOPIC_THRESHOLD):
+        similarity = self.similarity(vector)
+        return similarity is not None and similarity <= threshold
+
+    def add(self, vector):
+        unit = np.asarray(vector, dtype=np.float32) / np.linalg.norm(vector)
+        self.total = unit if self.total is None else self.decay * self.total + unit
+        self.messages += 1
+
+    def reset(self):
+        self.total = None
+        self.messages = 0
+
+    def query_vector(self, scale=1.0):
+        """The centroid as a query vector, scaled to the norm of the model's own query vectors."""
+        return self.total * (scale / np.linalg.norm(self.total))
+
+
+def cosine(a, b):
+    return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)))
+
+
+def relevance(distance):
+    """
+    Relevance score of a search distance in Chroma's default L2 space, which every store here
+    uses: what similarity_search_with_relevance_scores gives for Chroma and the repo's stores alike.
+    """
+    return 1.0 - distance / math.sqrt(2)
+
+
+def search_by_vector(store, vector, k=4, **search_kwargs):
+    """
+    Top-k (Document, relevance score) for an already embedded query, the same scores
+    similarity_search_with_relevance_scores gives for its text.
+    """
+    if hasattr(store, "similarity_search_by_vector_with_score"):
+        # The NumPy, serving and sharded stores
+        results = store.similarity_search_by_vector_with_score(vector, k, **search_kwargs)
+    else:
+        # langchain_chroma: despite the name, these are distances
+        results = store.similarity_search_by_vector_with_relevance_scores(np.asarray(vector).tolist(), k, **search_kwargs)
+    return [(document, relevance(distance)) for document, distance in results]
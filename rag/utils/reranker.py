@@ -0,0 +1,62 @@
+import os
+import time
+
+# Read from the environment by the knowledge base app
+RETRIEVAL_STANDARD = "standard"  # A fixed number of chunks straight from retrieval
+RETRIEVAL_RERANK = "rerank"  # Over-fetch, rerank with a cross-encoder and keep the chunks above a score
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", RETRIEVAL_STANDARD)
+RERANKER_MODEL = os.getenv("RERANKER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_MIN_SCORE = float(os.getenv("RERANK_MIN_SCORE", "0.5"))  # Relevance probability a chunk needs to be sent
+
+RERANK_CANDIDATES = 30  # Chunks retrieved for the reranker to choose from
+RERANK_BATCH_SIZE = 16  # (question, chunk) pairs scored at once
+RERANK_MIN_K = 1  # Chunks sent even when none reaches the minimum score
+RERANK_MAX_K = 8  # Chunks sent at most, however many reach it
+RERANK_MAX_LENGTH = 512  # Tokens of question plus chunk the cross-encoder reads
+
+
+class Reranker:
+    """
+    Local cross-encoder scoring how well each retrieved chunk answers the question, read
+    together rather than compared as two separate embeddings. Scores are probabilities
+    (sigmoid of the model's logit), so one cutoff works across questions.
+    Args:
+        model_name (str): HuggingFace cross-encoder
+        batch_size (int): Pairs scored per forward pass
+        max_length (int): Tokens of each pair the model reads; longer chunks are truncated
+    """
+
+    def __init__(self, model_name=RERANKER_MODEL, batch_size=RERANK_BATCH_SIZE, max_length=RERANK_MAX_LENGTH):
+        import torch
+        from sentence_transformers import CrossEncoder
+
+        self.model = CrossEncoder(model_name, max_length=max_length, activation_fn=torch.nn.Sigmoid())
+        self.batch_size = batch_size
+        self.last_seconds = 0.0  # Time the last rerank call took, reported apart from retrieval
+
+    def rerank(self, query, results):
+        """
+        Reorder retrieved (Document, score) pairs by cross-encoder score.
+        Returns:
+            list: (Document, relevance probability) pairs, best first
+        """
+        started = time.perf_counter()
+        if not results:
+            self.last_seconds = 0.0
+            return []
+        documents = [document for document, _ in results]
+        scores = self.model.predict(
+            [(query, document.page_content) for document in documents], batch_size=self.batch_size, show_progress_bar=False
+        )
+        ranked = sorted(zip(documents, (float(score) for score in scores)), key=lambda pair: pair[1], reverse=True)
+        self.last_seconds = time.perf_counter() - started
+        return ranked
+
+
+def select_chunks(ranked, min_score=RERANK_MIN_SCORE, min_k=RERANK_MIN_K, max_k=RERANK_MAX_K):
+    """
+    How many reranked chunks to send: those reaching min_score, at least min_k and at most
+    max_k. A simple question with one clear answer sends one chunk; a broad one sends more.
+    """
+    selected = [pair for pair in ranked[:max_k] if pair[1] >= min_score]
+    return selected if len(selected) >= min_k else ranked[:min_k]
@@ -0,0 +1,230 @@
+import hashlib
+import heapq
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+VECTOR_STORE_SHARDED = "sharded"  # One Chroma collection per source (or group of sources)
+
+# Selected through the environment by the knowledge base app
+SHARD_GROUPS_PATH = os.getenv("SHARD_GROUPS_PATH", "databases/shardgroups.json")
+
+SHARD_PREFIX = "shard-"
+SEARCH_THREADS = min(8, os.cpu_count() or 1)  # Shards searched at the same time
+SHARD_REFRESH_SECONDS = 30.0  # How often the shard list is re-read, to see shards added by ingestion
+
+
+def load_shard_groups(path=SHARD_GROUPS_PATH):
+    """
+    Read the optional groups file, {"group name": ["source", ...]}, and return a mapping
+    from source to group. Sources in no group get a shard of their own.
+    """
+    if not path or not Path(path).exists():
+        return {}
+    groups = json.loads(Path(path).read_text(encoding="utf-8"))
+    return {source: group for group, sources in groups.items() for source in sources}
+
+
+def shard_name(key):
+    """
+    Chroma collection name of a shard: readable, within Chroma's naming rules (3-512
+    characters from [a-zA-Z0-9._-]) and unique through a hash of the full key.
+    """
+    slug = re.sub(r"[^a-zA-Z0-9._-]+", "-", key).strip("-._")[:48]
+    return f"{SHARD_PREFIX}{slug}-{hashlib.sha1(key.encode('utf-8')).hexdigest()[:8]}"
+
+
+class ShardedVectorStore(VectorStore):
+    """
+    Chunks split over one Chroma collection per source document, or per group of sources
+    listed in the groups file. A query is embedded once and searched in the selected shards
+    (all of them by default) in parallel; the shards' results are merged by distance into one
+    top-k, which is comparable across shards since they share the embedding model and space.
+    Also offers the collection-style upsert/get/delete/count calls the ingestion uses.
+    Args:
+        path (str): Chroma persist directory
+        embedding_function (Embeddings): Used to embed queries and add_texts
+        groups_path (str): Optional JSON file grouping sources into shared shards
+        threads (int): Shards searched at the same time
+    """
+
+    def __init__(self, path, embedding_function=None, groups_path=SHARD_GROUPS_PATH, threads=SEARCH_THREADS):
+        import chromadb
+
+        self.client = chromadb.PersistentClient(path=str(path))
+        self.embedding_function = embedding_function
+        self.groups = load_shard_groups(groups_path)
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="shard-search")
+        self.lock = threading.Lock()
+        self.shards = {}  # Shard key -> collection
+        self.refreshed_at = 0.0
+        self._refresh(force=True)
+
+    def max_batch_size(self):
+        return self.client.get_max_batch_size()
+
+    # Shards
+
+    def shard_key(self, metadata):
+        source = (metadata or {}).get("source", "Unknown")
+        return self.groups.get(source, source)
+
+    def _refresh(self, force=False):
+        now = time.monotonic()
+        if not force and now - self.refreshed_at < SHARD_REFRESH_SECONDS:
+            return
+        with self.lock:
+            for collection in self.client.list_collections():
+                if collection.name.startswith(SHARD_PREFIX) and collection.metadata:
+                    self.shards.setdefault(collection.metadata["shard"], collection)
+            self.refreshed_at = now
+
+    def _shard(self, key):
+        """The collection of a shard, created on first use."""
+        collection = self.shards.get(key)
+        if collection is None:
+            with self.lock:
+                collection = self.client.get_or_create_collection(shard_name(key), metadata={"shard": key})
+                self.shards[key] = collection
+        return collection
+
+    def shard_of(self, source):
+        """The collection holding source's chunks, or None if it has none yet."""
+        self._refresh()
+        return self.shards.get(self.groups.get(source, source))
+
+    def sources(self):
+        """Sources that can be searched, for scoping a query to some books."""
+        self._refresh()
+        grouped = set(self.groups.values())
+        return sorted(
+            {key for key in self.shards if key not in grouped}
+            | {source for source, group in self.groups.items() if group in self.shards}
+        )
+
+    def _map(self, function, collections):
+        return list(self.executor.map(function, collections))
+
+    # Collection-style API, as used by population/createvectordatabase.py
+
+    def upsert(self, ids, embeddings, documents=None, metadatas=None):
+        metadatas = metadatas or [None] * len(ids)
+        documents = documents or [None] * len(ids)
+        routed = {}
+        for index, metadata in enumerate(metadatas):
+            routed.setdefault(self.shard_key(metadata), []).append(index)
+        for key, indices in routed.items():
+            self._shard(key).upsert(
+                ids=[ids[i] for i in indices],
+                embeddings=[embeddings[i] for i in indices],
+                documents=[documents[i] for i in indices],
+                metadatas=[metadatas[i] for i in indices],
+            )
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=("documents", "metadatas")):
+        """
+        Chroma-style get over every shard; limit and offset apply to each shard. Lookups about
+        one source are cheaper on its own shard, see shard_of.
+        """
+        self._refresh()
+        results = self._map(
+            lambda collection: collection.get(ids=ids, where=where, limit=limit, offset=offset, include=list(include)),
+            list(self.shards.values()),
+        )
+        merged = {"ids": [chunk_id for result in results for chunk_id in result["ids"]]}
+        for field in include:
+            merged[field] = [value for result in results for value in result[field]]
+        return merged
+
+    def delete(self, ids=None, where=None, **kwargs):
+        if ids is None and not where:
+            return
+        self._refresh()
+        self._map(lambda collection: collection.delete(ids=ids, where=where), list(self.shards.values()))
+
+    def count(self):
+        self._refresh()
+        return sum(self._map(lambda collection: collection.count(), list(self.shards.values())))
+
+    # Search
+
+    def _search(self, vector, k, filter=None, sources=None):
+        """
+        Top-k chunks as (Document, distance) over the shards of the given sources (all
+        shards if None), searched in parallel.
+        """
+        self._refresh()
+        if sources is None:
+            collections = list(self.shards.values())
+        else:
+            keys = {self.groups.get(source, source) for source in sources}
+            collections = [self.shards[key] for key in keys if key in self.shards]
+            if any(key in self.groups.values() for key in keys):
+                # A group's shard also holds books outside the selection
+                scope = {"source": {"$in": list(sources)}}
+                filter = {"$and": [filter, scope]} if filter else scope
+        if not collections:
+            return []
+
+        def query(collection):
+            result = collection.query(
+                query_embeddings=[vector], n_results=k, where=filter, include=["documents", "metadatas", "distances"]
+            )
+            return zip(result["ids"][0], result["documents"][0], result["metadatas"][0], result["distances"][0])
+
+        hits = [hit for result in self._map(query, collections) for hit in result]
+        return [
+            (Document(id=chunk_id, page_content=document or "", metadata=metadata or {}), distance)
+            for chunk_id, document, metadata, distance in heapq.nsmallest(k, hits, key=lambda hit: hit[3])
+        ]
+
+    # LangChain VectorStore API
+
+    @property
+    def embeddings(self):
+        return self.embedding_function
+
+    def _select_relevance_score_fn(self):
+        return self._euclidean_relevance_score_fn
+
+    def similarity_search_with_score(self, query, k=4, filter=None, sources=None, **kwargs):
+        return self._search(self.embedding_function.embed_query(query), k, filter, sources)
+
+    def similarity_search(self, query, k=4, filter=None, sources=None, **kwargs):
+        return [document for document, _ in self.similarity_search_with_score(query, k, filter, sources)]
+
+    def similarity_search_by_vector(self, embedding, k=4, filter=None, sources=None, **kwargs):
+        return [document for document, _ in self._search(embedding, k, filter, sources)]
+
+    def similarity_search_by_vector_with_score(self, embedding, k=4, filter=None, sources=None, **kwargs):
+        return self._search(embedding, k, filter, sources)
+
+    def get_by_ids(self, ids):
+        found = self.get(ids=list(ids))
+        return [
+            Document(id=chunk_id, page_content=document or "", metadata=metadata or {})
+            for chunk_id, document, metadata in zip(found["ids"], found["documents"], found["metadatas"])
+        ]
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        texts = list(texts)
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+        self.upsert(ids, self.embedding_function.embed_documents(texts), texts, metadatas)
+        return ids
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, ids=None, path="databases/chroma", **kwargs):
+        store = cls(path, embedding, **kwargs)
+        store.add_texts(texts, metadatas, ids)
+        return store
+
+    def close(self):
+        self.executor.shutdown(wait=False)
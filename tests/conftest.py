@@ -0,0 +1,49 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+# The scripts import their siblings and rag/utils the way they do when run from the repository root
+sys.path[:0] = [str(ROOT / "population"), str(ROOT / "rag")]
+
+# Enough word pieces for the test sentences to be more than [UNK]
+VOCABULARY = (
+    ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"]
+    + [chr(code) for code in range(ord("a"), ord("z") + 1)]
+    + ["##" + chr(code) for code in range(ord("a"), ord("z") + 1)]
+    + ["the", "a", "of", "and", "to", "in", "is", "what", "how", "network", "war", "data"]
+)
+
+
+@pytest.fixture(scope="session")
+def tiny_model(tmp_path_factory):
+    """A small randomly initialised sentence-transformers model, saved locally: no download."""
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.models import Normalize, Pooling, Transformer
+    from transformers import BertConfig, BertModel, BertTokenizerFast
+
+    folder = tmp_path_factory.mktemp("tiny-model")
+    bert = folder / "bert"
+    bert.mkdir()
+    (bert / "vocab.txt").write_text("\n".join(VOCABULARY), encoding="utf-8")
+    BertTokenizerFast(str(bert / "vocab.txt")).save_pretrained(bert)
+    torch.manual_seed(0)
+    config = BertConfig(
+        vocab_size=len(VOCABULARY), hidden_size=32, num_hidden_layers=2, num_attention_heads=2,
+        intermediate_size=64, max_position_embeddings=128,
+    )
+    BertModel(config).save_pretrained(bert)
+
+    transformer = Transformer(str(bert), max_seq_length=64)
+    model = SentenceTransformer(
+        modules=[transformer, Pooling(transformer.get_word_embedding_dimension(), "mean"), Normalize()], device="cpu"
+    )
+    model.save(str(folder / "model"))
+    return str(folder / "model")
+
+
+@pytest.fixture(scope="session")
+def texts():
+    return [f"what is the network {index} of a war and the data in it" * (index % 4 + 1) for index in range(24)]
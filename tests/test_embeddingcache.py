@@ -0,0 +1,35 @@
+import sqlite3
+
+import numpy as np
+
+from utils.embeddingcache import EmbeddingCache
+
+
+def vectors(keys):
+    return [(key, np.full(4, index, dtype=np.float32)) for index, key in enumerate(keys)]
+
+
+def test_count_follows_writes_from_other_connections(tmp_path):
+    path = tmp_path / "cache.sqlite3"
+    ingestion, app = EmbeddingCache(path, max_entries=10), EmbeddingCache(path, max_entries=10)
+
+    ingestion.put_many(vectors([f"a{i}" for i in range(6)]))
+    app.put_many(vectors([f"b{i}" for i in range(3)]))
+    assert ingestion.stats()["entries"] == app.stats()["entries"] == 9
+
+    # Past the limit, the writer evicts what all connections together added
+    ingestion.put_many(vectors([f"c{i}" for i in range(4)]))
+    rows = sqlite3.connect(path).execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+    assert rows == 10
+    assert ingestion.stats()["entries"] == app.stats()["entries"] == 10
+    assert ingestion.stats()["evictions"] == 3
+
+
+def test_count_of_an_existing_cache(tmp_path):
+    path = tmp_path / "cache.sqlite3"
+    EmbeddingCache(path).put_many(vectors(["x", "y"]))
+    # Rows already cached are not counted again
+    cache = EmbeddingCache(path)
+    cache.put_many(vectors(["y", "z"]))
+
+    assert cache.stats()["entries"] == 3
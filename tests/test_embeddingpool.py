@@ -0,0 +1,86 @@
+import os
+from argparse import Namespace
+
+import numpy as np
+import pytest
+
+from embeddingpool import EmbeddingWorkerPool
+from exportonnxmodel import export_model
+from utils.embeddingbackend import BACKEND_ONNX, BACKEND_TORCH, load_embeddings
+
+
+@pytest.fixture(scope="module")
+def onnx_model(tiny_model, tmp_path_factory):
+    """The tiny model exported with population/exportonnxmodel.py, float32 so it matches torch closely."""
+    output = tmp_path_factory.mktemp("onnx") / "tiny-onnx"
+    config = Namespace(
+        model=tiny_model, output=str(output), no_quantize=True, min_cosine=0.999, samples=0,
+        chroma_path=str(output.parent / "no-chroma"), collection="langchain",
+    )
+    assert export_model(config)
+    return str(output)
+
+
+@pytest.fixture(scope="module")
+def reference(tiny_model, texts):
+    return np.array(load_embeddings(BACKEND_TORCH, tiny_model).embed_documents(texts))
+
+
+def test_onnx_matches_torch(onnx_model, texts, reference):
+    vectors = np.array(load_embeddings(BACKEND_ONNX, onnx_path=onnx_model, batch_size=5).embed_documents(texts))
+
+    assert vectors.shape == reference.shape
+    assert np.allclose(vectors, reference, atol=1e-4)
+
+
+def test_onnx_query_matches_documents(onnx_model, texts):
+    embeddings = load_embeddings(BACKEND_ONNX, onnx_path=onnx_model)
+
+    assert np.allclose(embeddings.embed_query(texts[3]), embeddings.embed_documents(texts)[3], atol=1e-5)
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_pool_returns_vectors_in_input_order(tiny_model, texts, reference, workers):
+    pool = EmbeddingWorkerPool(tiny_model, workers, threads=1, batch_size=4)
+    try:
+        vectors = np.array(pool.embed_documents(texts))
+        query = np.array(pool.embed_query(texts[5]))
+    finally:
+        pool.close()
+
+    assert vectors.shape == reference.shape
+    assert np.allclose(vectors, reference, atol=1e-5)
+    assert np.allclose(query, reference[5], atol=1e-5)
+
+
+def test_pool_onnx_backend(onnx_model, texts, reference):
+    pool = EmbeddingWorkerPool(None, 2, threads=1, backend=BACKEND_ONNX, onnx_path=onnx_model)
+    try:
+        vectors = np.array(pool.embed_documents(texts))
+    finally:
+        pool.close()
+
+    assert np.allclose(vectors, reference, atol=1e-4)
+
+
+def test_pool_with_fewer_texts_than_workers(tiny_model, texts, reference):
+    pool = EmbeddingWorkerPool(tiny_model, 4, threads=1)
+    try:
+        assert pool.embed_documents([]) == []
+        assert np.allclose(pool.embed_documents(texts[:2]), reference[:2], atol=1e-5)
+    finally:
+        pool.close()
+
+
+def test_fresh_worker_is_spawned(tiny_model, texts, reference):
+    import torch
+
+    # torch has already run in this process; the workers must still start cleanly with their own capped threads
+    load_embeddings(BACKEND_TORCH, tiny_model).embed_query(texts[0])
+    pool = EmbeddingWorkerPool(tiny_model, 2, threads=1)
+    try:
+        assert pool.pool.apply(os.getpid) != os.getpid()
+        assert pool.pool.apply(torch.get_num_threads) == 1
+        assert np.allclose(pool.embed_query(texts[0]), reference[0], atol=1e-5)
+    finally:
+        pool.close()
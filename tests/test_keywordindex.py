@@ -0,0 +1,77 @@
+import pytest
+
+from utils.keywordindex import MAX_SEGMENTS, KeywordIndex, KeywordIndexWriter, build_keyword_index, current_keyword_index
+
+WORDS = ["network", "war", "data", "x86-64", "supply", "chain", "river", "bridge", "model", "index"]
+
+
+def chunk(number):
+    text = " ".join(WORDS[(number * index) % len(WORDS)] for index in range(1, number % 7 + 3))
+    return f"id-{number}", text, {"source": f"book-{number % 3}"}
+
+
+def rebuilt(tmp_path, chunks):
+    build_keyword_index(chunks, tmp_path / "rebuilt")
+    return current_keyword_index(tmp_path / "rebuilt")
+
+
+def assert_same_results(index, expected):
+    assert len(index) == len(expected)
+    for query in ["network data", "x86-64 river", "bridge", "war chain model"]:
+        for sources in (None, ["book-1"]):
+            got, want = index.search(query, 10, sources), expected.search(query, 10, sources)
+            assert {chunk_id: round(score, 4) for chunk_id, score in got} == {chunk_id: round(score, 4) for chunk_id, score in want}
+
+
+def test_updates_score_like_a_rebuild(tmp_path):
+    chunks = {chunk_id: (text, metadata) for chunk_id, text, metadata in map(chunk, range(40))}
+    root = tmp_path / "index"
+    build_keyword_index([(chunk_id, *entry) for chunk_id, entry in chunks.items()], root)
+
+    writer = KeywordIndexWriter(root)
+    writer.delete([f"id-{number}" for number in range(5)])
+    writer.add([chunk(number) for number in range(40, 50)])
+    for number in range(5):
+        del chunks[f"id-{number}"]
+    chunks.update({chunk_id: (text, metadata) for chunk_id, text, metadata in map(chunk, range(40, 50))})
+    assert writer.commit(len(chunks), lambda: pytest.fail("rebuilt")) is not None
+    assert not writer.rebuilt and (writer.chunks_added, writer.chunks_deleted) == (10, 5)
+
+    index = current_keyword_index(root)
+    assert len(index.segments) == 2
+    assert_same_results(index, rebuilt(tmp_path, [(chunk_id, *entry) for chunk_id, entry in chunks.items()]))
+
+    # Nothing recorded and nothing missing: no new generation
+    assert KeywordIndexWriter(root).commit(len(chunks), lambda: pytest.fail("rebuilt")) is None
+
+
+def test_segments_are_merged(tmp_path):
+    root = tmp_path / "index"
+    build_keyword_index(map(chunk, range(100)), root)
+    for start in range(100, 100 + 10 * (MAX_SEGMENTS + 1), 10):
+        writer = KeywordIndexWriter(root)
+        writer.add(map(chunk, range(start, start + 10)))
+        writer.commit(start + 10, lambda: pytest.fail("rebuilt"))
+    total = 100 + 10 * (MAX_SEGMENTS + 1)
+    assert len(current_keyword_index(root).segments) <= MAX_SEGMENTS
+
+    # Deleting a large share of the chunks merges everything into one segment without them
+    writer = KeywordIndexWriter(root)
+    writer.delete([f"id-{number}" for number in range(0, total, 2)])
+    writer.commit(total // 2, lambda: pytest.fail("rebuilt"))
+    index = current_keyword_index(root)
+    assert len(index.segments) == 1 and not any(mask is not None for mask in index.deleted)
+    assert_same_results(index, rebuilt(tmp_path, [chunk(number) for number in range(1, total, 2)]))
+    # Only the segments of the kept generations stay on disk
+    kept = {name for generation in (root / "generations").iterdir() for name in KeywordIndex(generation).info["segments"]}
+    assert {path.name for path in (root / "segments").iterdir()} == kept
+
+
+def test_rebuilds_when_out_of_step(tmp_path):
+    root = tmp_path / "index"
+    build_keyword_index(map(chunk, range(10)), root)
+    writer = KeywordIndexWriter(root)
+    writer.add([chunk(10)])
+    # The vector store holds chunks the index never saw, e.g. from an interrupted run
+    assert writer.commit(12, lambda: map(chunk, range(12))) is not None
+    assert writer.rebuilt and len(current_keyword_index(root)) == 12
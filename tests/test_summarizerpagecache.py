@@ -0,0 +1,40 @@
+import hashlib
+
+import fitz
+import pytest
+
+from functionalities.summingupbookarticle import BookPages
+from utils.pagecache import PageCache
+
+
+@pytest.fixture
+def book(tmp_path):
+    path = tmp_path / "book.pdf"
+    with fitz.open() as doc:
+        for number in range(4):
+            doc.new_page().insert_text((72, 72), f"Page {number + 1} of the book")
+        doc.save(path)
+    return path
+
+
+def sha256_of(path):
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def test_second_summary_reads_the_page_cache(book, tmp_path, monkeypatch):
+    cache = PageCache(tmp_path / "pagecache.sqlite3")
+    with fitz.open(book) as doc:
+        first = BookPages(doc, sha256_of(book), cache)
+        assert not first.from_cache
+        chapter = first.chapter_text(1, 2)
+        first.save()
+    assert "Page 2" in chapter and "Page 3" in chapter
+
+    # Nothing is extracted again: every page, including those no chapter covered, comes from the cache
+    monkeypatch.setattr(fitz.Page, "get_text", lambda *args, **kwargs: pytest.fail("page extracted again"))
+    with fitz.open(book) as doc:
+        second = BookPages(doc, sha256_of(book), cache)
+        assert second.from_cache
+        assert second.chapter_text(1, 2) == chapter
+        assert "Page 4" in second.chapter_text(3, 10)
+    assert cache.hits == 1